@@ -3,6 +3,7 @@ import contextlib
 from importlib.metadata import PackageNotFoundError, version
 
 from .dgp import *
+from .experiment import *
 from .diagnostics import *
 from .diagnostics_panel import *
 from .diagnostics_sp import *
@@ -10,7 +10,7 @@ __author__ = "Luc Anselin lanselin@gmail.com,\
 import numpy as np
 import math
 import libpysal
-from scipy.linalg import expm
+from scipy.sparse.linalg import expm_multiply
 from .utils import inverse_prod
 
 
@@ -33,11 +33,12 @@ __all__ = [
     "dgp_probit",
     "make_bin",
     "make_heterror",
-    "make_vmult"
+    "make_vmult",
+    "make_chunks"
 ]
     
     
-def make_error(rng,n,mu=0,varu=1,method='normal'):
+def make_error(rng,n,mu=0,varu=1,method='normal',r=1):
     """
     make_error: generate error term for a given distribution
     
@@ -49,10 +50,12 @@ def make_error(rng,n,mu=0,varu=1,method='normal'):
     varu:     variance (when needed)
     method:   type of distribution, one of
               normal, laplace, cauchy, lognormal
+    r:        number of replications, default = 1
     
     Returns:
     --------
-    u:        nx1 vector of random errors
+    u:        nxr matrix of random errors, one column per replication;
+              column j equals the (j+1)-th of r successive calls with r=1
 
     Examples
     --------
@@ -66,29 +69,32 @@ def make_error(rng,n,mu=0,varu=1,method='normal'):
            [-0.87066174],
            [-0.25917323],
            [-0.07534331]])
+    >>> make_error(rng,5,r=2).shape
+    (5, 2)
 
     """
+    # draws are (r,n) so that the replications follow the sequential stream
     # normal - standard normal is default
     if method == 'normal':
         sdu = math.sqrt(varu)
-        u = rng.normal(loc=mu,scale=sdu,size=n).reshape(n,1)
+        u = rng.normal(loc=mu,scale=sdu,size=(r,n)).T
     # laplace with thicker tails
     elif method == 'laplace':
         sdu = math.sqrt(varu/2.0)
-        u = rng.laplace(loc=mu,scale=sdu,size=n).reshape(n,1)
+        u = rng.laplace(loc=mu,scale=sdu,size=(r,n)).T
     # cauchy, ill-behaved, no mean or variance defined
     elif method == 'cauchy':
-        u = rng.standard_cauchy(size=n).reshape(n,1)
+        u = rng.standard_cauchy(size=(r,n)).T
     elif method == 'lognormal':
         sdu = math.sqrt(varu)
-        u = rng.lognormal(mean=mu,sigma=sdu,size=n).reshape(n,1)
+        u = rng.lognormal(mean=mu,sigma=sdu,size=(r,n)).T
     # all other yield warning
     else:
         print('Warning: Unsupported distribution')
         u = None
     return u
 
-def make_x(rng,n,mu=[0],varu=[1],cor=0,method='uniform'):
+def make_x(rng,n,mu=[0],varu=[1],cor=0,method='uniform',r=None):
     """
     make_x: generate a matrix of k columns of x for a given distribution  
     
@@ -101,10 +107,12 @@ def make_x(rng,n,mu=[0],varu=[1],cor=0,method='uniform'):
     cor:      correlation as a float (for bivariate normal only)
     method:   type of distribution, one of
               uniform, normal, bivnormal (bivariate normal)
+    r:        number of replications, default = None for a single draw
     
     Returns:
     --------
-    x:        nxk matrix of x variables
+    x:        nxk matrix of x variables, or nxkxr array with one nxk
+              matrix per replication when r is given
     
     Note:
     -----
@@ -123,8 +131,16 @@ def make_x(rng,n,mu=[0],varu=[1],cor=0,method='uniform'):
            [2.76215497, 1.29373239],
            [2.3426149 , 4.6609906 ],
            [1.35484323, 6.52500165]])
+    >>> make_x(rng,5,mu=[0,1],varu=[1,4],r=3).shape
+    (5, 2, 3)
 
     """
+    if r is not None:
+        # replications drawn one after the other, as in a loop of single draws
+        xs = [make_x(rng,n,mu=mu,varu=varu,cor=cor,method=method) for i in range(r)]
+        if any(xi is None for xi in xs):
+            return None
+        return np.stack(xs,axis=2)
     # check on k dimension
     k = len(mu)
     if k == len(varu):
@@ -168,13 +184,14 @@ def make_wx(x,w,o=1):
     
     Arguments:
     ----------
-    x:        x matrix - no constant
+    x:        x matrix - no constant, or nxkxr array of replications
     w:        row-standardized spatial weights in spreg format
     o:        order of contiguity, default o=1
     
     Returns:
     --------
     wx:       nx(kxo) matrix of spatially lagged x variables
+              (nx(kxo)xr for replications)
 
     Examples
     --------
@@ -197,13 +214,14 @@ def make_wx(x,w,o=1):
     if w.n != x.shape[0]:
         print("Error: incompatible weights dimensions")
         return None
-    w1x = libpysal.weights.lag_spatial(w,x)
+    n = x.shape[0]
+    w1x = libpysal.weights.lag_spatial(w,x.reshape(n,-1)).reshape(x.shape)
     wx = w1x
     if o > 1:
         for i in range(1,o):
-            whx = libpysal.weights.lag_spatial(w,w1x)
+            whx = libpysal.weights.lag_spatial(w,w1x.reshape(n,-1)).reshape(x.shape)
             w1x = whx
-            wx = np.hstack((wx,whx))
+            wx = np.concatenate((wx,whx),axis=1)
     return wx
         
 
@@ -214,12 +232,13 @@ def make_xb(x,beta):
     
     Arguments:
     ----------
-    x:        n x (k-1) matrix for x variables
+    x:        n x (k-1) matrix for x variables, or n x (k-1) x r array
+              of replications
     beta:     k length list of regression coefficients
     
     Returns:
     --------
-    xb:        nx1 vector of x times beta
+    xb:        nx1 vector of x times beta (nxr for replications)
 
     Examples
     --------
@@ -241,6 +260,9 @@ def make_xb(x,beta):
         print("Error: Incompatible dimensions")
         return None
     else:
+        if x.ndim == 3:
+            b = np.array(beta,dtype=float)
+            return b[0] + np.einsum('nkr,k->nr',x,b[1:])
         b = np.array(beta)[:,np.newaxis]
         x1=np.hstack((np.ones((n,1)),x)) # include constant
         xb = np.dot(x1,b)
@@ -253,12 +275,13 @@ def make_wxg(wx,gamma):
     
     Arguments:
     ----------
-    wx:       n x ((k-1)xo) matrix for spatially lagged x variables of all orders
+    wx:       n x ((k-1)xo) matrix for spatially lagged x variables of all orders,
+              or n x ((k-1)xo) x r array of replications
     gamma:    (k-1)*o length list of regression coefficients for spatially lagged x
     
     Returns:
     --------
-    wxg:      nx1 vector of wx times gamma
+    wxg:      nx1 vector of wx times gamma (nxr for replications)
 
     Examples
     --------
@@ -282,6 +305,12 @@ def make_wxg(wx,gamma):
 
     """
     k = wx.shape[1]
+    if wx.ndim == 3:
+        g = np.array(gamma,dtype=float).flatten()
+        if k != len(g):
+            print("Error: Incompatible dimensions")
+            return None
+        return np.einsum('nkr,k->nr',wx,g)
     if (k > 1): 
         if k != len(gamma):
             print("Error: Incompatible dimensions")
@@ -303,7 +332,8 @@ def dgp_errproc(u,w,lam=0.5,model='sar',imethod='power_exp'):
     w:      spatial weights object
     lam:    spatial autoregressive parameter
     model:  type of process ('sar' or 'ma')
-    imethod: method for inverse transformation, default = 'power_exp'
+    imethod: method for inverse transformation, default = 'power_exp';
+             'lu' reuses a sparse LU factorization cached with w
 
     Returns:
     --------
@@ -437,12 +467,13 @@ def dgp_sperror(u,xb,w,lam=0.5,model='sar',imethod='power_exp',ybin=False):
     
     Arguments:
     ----------
-    u:       random error
+    u:       random error (nx1, or nxr for r replications)
     xb:      vector of xb
     w:       spatial weights
     lam:     spatial coefficient
     model:   type of process ('sar' or 'ma')
-    imethod: method for inverse transformation, default = 'power_exp'
+    imethod: method for inverse transformation, default = 'power_exp';
+             'lu' reuses a sparse LU factorization cached with w
     ybin:    flag for binary dependent variable
     
     Returns:
@@ -496,13 +527,14 @@ def dgp_slxerror(u,xb,wxg,w,lam=0.5,model='sar',imethod='power_exp',ybin=False):
     
     Arguments:
     ----------
-    u:       random error
+    u:       random error (nx1, or nxr for r replications)
     xb:      vector of xb
     wxg:     vector of wxg
     w:       spatial weights
     lam:     spatial coefficient
     model:   type of process ('sar' or 'ma')
-    imethod: method for inverse transformation, default = 'power_exp'
+    imethod: method for inverse transformation, default = 'power_exp';
+             'lu' reuses a sparse LU factorization cached with w
     ybin:    flag for binary 0-1 dependent variable
     
     Returns:
@@ -563,11 +595,12 @@ def dgp_lag(u,xb,w,rho=0.5,imethod='power_exp',ybin=False):
     
     Arguments:
     ----------
-    u:       random error
+    u:       random error (nx1, or nxr for r replications)
     xb:      vector of xb
     w:       spatial weights
     rho:     spatial coefficient
-    imethod: method for inverse transformation, default = 'power_exp'
+    imethod: method for inverse transformation, default = 'power_exp';
+             'lu' reuses a sparse LU factorization cached with w
     ybin:    flag for binary dependent variable
     
     Returns:
@@ -615,12 +648,13 @@ def dgp_spdurbin(u,xb,wxg,w,rho=0.5,imethod='power_exp',ybin=False):
     
     Arguments:
     ----------
-    u:       random error
+    u:       random error (nx1, or nxr for r replications)
     xb:      vector of xb
     wxg:     vector of wxg
     w:       spatial weights
     rho:     spatial coefficient
-    imethod: method for inverse transformation, default = 'power_exp'
+    imethod: method for inverse transformation, default = 'power_exp';
+             'lu' reuses a sparse LU factorization cached with w
     ybin:    flag for binary 0-1 dependent variable
     
     Returns:
@@ -675,13 +709,14 @@ def dgp_lagerr(u,xb,w,rho=0.5,lam=0.2,model='sar',imethod='power_exp',ybin=False
     
     Arguments:
     ----------
-    u:       random error
+    u:       random error (nx1, or nxr for r replications)
     xb:      vector of xb
     w:       spatial weights
     rho:     spatial coefficient for lag
     lam:     spatial coefficient for error
     model:   spatial process for error
-    imethod: method for inverse transformation, default = 'power_exp'
+    imethod: method for inverse transformation, default = 'power_exp';
+             'lu' reuses a sparse LU factorization cached with w
     ybin:    flag for binary 0-1 dependent variable
     
     Returns:
@@ -738,14 +773,15 @@ def dgp_gns(u,xb,wxg,w,rho=0.5,lam=0.2,model='sar',imethod='power_exp',ybin=Fals
     
     Arguments:
     ----------
-    u:       random error
+    u:       random error (nx1, or nxr for r replications)
     xb:      vector of xb
     wxg:     vector of wxg
     w:       spatial weights
     rho:     spatial coefficient for lag
     lam:     spatial coefficient for error
     model:   spatial process for error
-    imethod: method for inverse transformation, default = 'power_exp'
+    imethod: method for inverse transformation, default = 'power_exp';
+             'lu' reuses a sparse LU factorization cached with w
     ybin:    flag for binary 0-1 dependent variable
     
     Returns:
@@ -805,10 +841,15 @@ def dgp_mess(u,xb,w,rho=0.5):
     
     Arguments:
     ----------
-    u:       random error
+    u:       random error (nx1, or nxr for r replications)
     xb:      vector of xb
     w:       spatial weights
     rho:     spatial coefficient (converted into alpha)
+
+    Note:
+    -----
+    The action of the matrix exponential on xb + u is computed with sparse W
+    (Al-Mohy and Higham, 2011), without forming expm(-alpha W)
     
     Returns:
     ----------
@@ -841,11 +882,10 @@ def dgp_mess(u,xb,w,rho=0.5):
     if w.n != n1:
         print("Error: incompatible weights dimensions")
         return None
-    bigw = libpysal.weights.full(w)[0]
     alpha=np.log(1-rho) #convert between rho and alpha
-    aw=-alpha*bigw      # inverse exponential is -alpha
+    aw=-alpha*w.sparse.tocsr()      # inverse exponential is -alpha
     xbu = xb + u
-    y = np.dot(expm(aw),xbu)
+    y = expm_multiply(aw,xbu)
     return y
 
 def dgp_probit(u,xb):
@@ -887,7 +927,7 @@ def dgp_probit(u,xb):
         print("Error: dimension mismatch")
         return None
     yy = xb + u
-    mm = yy.mean()
+    mm = yy.mean(axis=0)
     y = (yy > mm) * 1
     return y
 
@@ -923,7 +963,7 @@ def make_bin(yy):
            [1]])
 
     """
-    mm = yy.mean()
+    mm = yy.mean(axis=0)
     y = (yy > mm)
     return y * 1
 
@@ -1008,6 +1048,47 @@ def make_vmult(n,method="linear",vlow=[1],vup=[4],rng=None):
         v = None
     return v
 
+def make_chunks(r,chunk=1000,seed=12345):
+    """
+    make_chunks: splits r replications into chunks with independent random
+                 number objects, so that large simulations can be generated
+                 and processed one block of replications at a time
+    
+    Arguments:
+    ----------
+    r:        total number of replications
+    chunk:    maximum number of replications in a chunk, default = 1000
+    seed:     seed for the sequence of random number objects
+    
+    Returns:
+    --------
+    generator of tuples (start, size, rng) with the index of the first
+    replication in the chunk, the number of replications in the chunk and
+    a random number object seeded from seed and the chunk index
+
+    Examples
+    --------
+
+    >>> import numpy as np
+    >>> import libpysal
+    >>> from spreg import make_chunks, make_error, make_x, make_xb, dgp_lag
+    >>> w  = libpysal.weights.lat2W(5, 5)
+    >>> w.transform = "r"
+    >>> xb = make_xb(make_x(np.random.default_rng(1),25),[1,2])
+    >>> for start, size, rng in make_chunks(250,chunk=100):
+    ...     u = make_error(rng,25,r=size)
+    ...     y = dgp_lag(u,xb,w,rho=0.5,imethod='lu')
+    ...     print(start, y.shape)
+    0 (25, 100)
+    100 (25, 100)
+    200 (25, 50)
+
+    """
+    children = np.random.SeedSequence(seed).spawn(math.ceil(r/chunk))
+    for i, child in enumerate(children):
+        start = i*chunk
+        yield start, min(chunk,r-start), np.random.default_rng(child)
+
 def _test():
     import doctest
 
@@ -6,14 +6,13 @@ __author__ = "Wei Kang weikang9009@gmail.com, \
               Pedro Amaral pedroamaral@cedeplar.ufmg.br, \
               Pablo Estrada pabloestradace@gmail.com"
 
-import numpy as np
 import numpy.linalg as la
-from scipy import sparse as sp
 from . import user_output as USER
 from .ols import OLS
 from .utils import spdot
+from .sputils import sptrace_wtw_ww
 from scipy import stats
-from .panel_utils import check_panel
+from .panel_utils import check_panel, panel_lag
 
 chisqprob = lambda chisq, df: stats.chi2.sf(chisq, df)
 
@@ -26,6 +25,43 @@ __all__ = [
 ]
 
 
+def _panel_lm_parts(y, x, w):
+    """
+    Common building blocks of the panel LM tests.
+
+    Only sparse products with W and projections of the form
+    x (X'X)^-1 x'v are used, so memory is O(ntk) rather than O((nt)^2).
+
+    Returns
+    -------
+    ols          : OLS
+                   Pooled OLS regression instance
+    t            : integer
+                   Number of time periods
+    trw          : float
+                   tr(WW) + tr(W'W)
+    num2         : float
+                   (WXb)'M(WXb), with M the OLS annihilator matrix
+    utwy         : float
+                   u'(I_T kron W)y
+    utwu         : float
+                   u'(I_T kron W)u
+    """
+    y, x, name_y, name_x, warn = check_panel(y, x, w, None, None)
+    x, name_x, warn = USER.check_constant(x, name_x)
+    ols = OLS(y, x)
+    n = w.n
+    t = y.shape[0] // n
+    Ws = w.sparse.tocsr()
+    trw = sptrace_wtw_ww(w)
+    wxb = panel_lag(Ws, ols.predy, n, t)
+    mwxb = wxb - spdot(x, spdot(ols.xtxi, spdot(x.T, wxb)))
+    num2 = spdot(wxb.T, mwxb)
+    utwy = spdot(ols.u.T, panel_lag(Ws, y, n, t))
+    utwu = spdot(ols.u.T, panel_lag(Ws, ols.u, n, t))
+    return ols, t, trw, num2, utwy, utwu
+
+
 def panel_LMlag(y, x, w):
     """
     Lagrange Multiplier test on lag spatial autocorrelation in panel data.
@@ -46,22 +82,9 @@ def panel_LMlag(y, x, w):
     lme          : tuple
                    Pair of statistic and p-value for the LM lag test.
     """
-    y, x, name_y, name_x, warn = check_panel(y, x, w, None, None)
-    x, name_x, warn = USER.check_constant(x, name_x)
-    ols = OLS(y, x)
-    n = w.n
-    t = y.shape[0] // n
-    W = w.full()[0]
-    Wsp_nt = sp.kron(sp.identity(t), w.sparse, format="csr")
-    wxb = spdot(Wsp_nt, ols.predy)
-    ww = spdot(W, W)
-    wTw = spdot(W.T, W)
-    trw = ww.diagonal().sum() + wTw.diagonal().sum()
-    num1 = np.asarray(sp.identity(t * n) - spdot(x, spdot(ols.xtxi, x.T)))
-    num2 = spdot(wxb.T, spdot(num1, wxb))
+    ols, t, trw, num2, utwy, utwu = _panel_lm_parts(y, x, w)
     num = num2 + (trw * trw * ols.sig2)
     J = num / ols.sig2
-    utwy = spdot(ols.u.T, spdot(Wsp_nt, y))
     lm = utwy**2 / (ols.sig2**2 * J)
     pval = chisqprob(lm, 1)
     return (lm[0][0], pval[0][0])
@@ -92,12 +115,9 @@ def panel_LMerror(y, x, w):
     ols = OLS(y, x)
     n = w.n
     t = y.shape[0] // n
-    W = w.full()[0]
-    Wsp_nt = sp.kron(sp.identity(t), w.sparse, format="csr")
-    ww = spdot(W, W)
-    wTw = spdot(W.T, W)
-    trw = ww.diagonal().sum() + wTw.diagonal().sum()
-    utwu = spdot(ols.u.T, spdot(Wsp_nt, ols.u))
+    Ws = w.sparse.tocsr()
+    trw = sptrace_wtw_ww(w)
+    utwu = spdot(ols.u.T, panel_lag(Ws, ols.u, n, t))
     lm = utwu**2 / (ols.sig2**2 * t * trw)
     pval = chisqprob(lm, 1)
     return (lm[0][0], pval[0][0])
@@ -123,23 +143,9 @@ def panel_rLMlag(y, x, w):
     lme          : tuple
                    Pair of statistic and p-value for the Robust LM lag test.
     """
-    y, x, name_y, name_x, warn = check_panel(y, x, w, None, None)
-    x, name_x, warn = USER.check_constant(x, name_x)
-    ols = OLS(y, x)
-    n = w.n
-    t = y.shape[0] // n
-    W = w.full()[0]
-    Wsp_nt = sp.kron(sp.identity(t), w.sparse, format="csr")
-    wxb = spdot(Wsp_nt, ols.predy)
-    ww = spdot(W, W)
-    wTw = spdot(W.T, W)
-    trw = ww.diagonal().sum() + wTw.diagonal().sum()
-    utwu = spdot(ols.u.T, spdot(Wsp_nt, ols.u))
-    num1 = np.asarray(sp.identity(t * n) - spdot(x, spdot(ols.xtxi, x.T)))
-    num2 = spdot(wxb.T, spdot(num1, wxb))
+    ols, t, trw, num2, utwy, utwu = _panel_lm_parts(y, x, w)
     num = num2 + (t * trw * ols.sig2)
     J = num / ols.sig2
-    utwy = spdot(ols.u.T, spdot(Wsp_nt, y))
     lm = (utwy / ols.sig2 - utwu / ols.sig2) ** 2 / (J - t * trw)
     pval = chisqprob(lm, 1)
     return (lm[0][0], pval[0][0])
@@ -165,23 +171,9 @@ def panel_rLMerror(y, x, w):
     lme          : tuple
                    Pair of statistic and p-value for the Robust LM error test.
     """
-    y, x, name_y, name_x, warn = check_panel(y, x, w, None, None)
-    x, name_x, warn = USER.check_constant(x, name_x)
-    ols = OLS(y, x)
-    n = w.n
-    t = y.shape[0] // n
-    W = w.full()[0]
-    Wsp_nt = sp.kron(sp.identity(t), w.sparse, format="csr")
-    wxb = spdot(Wsp_nt, ols.predy)
-    ww = spdot(W, W)
-    wTw = spdot(W.T, W)
-    trw = ww.diagonal().sum() + wTw.diagonal().sum()
-    utwu = spdot(ols.u.T, spdot(Wsp_nt, ols.u))
-    num1 = np.asarray(sp.identity(t * n) - spdot(x, spdot(ols.xtxi, x.T)))
-    num2 = spdot(wxb.T, spdot(num1, wxb))
+    ols, t, trw, num2, utwy, utwu = _panel_lm_parts(y, x, w)
     num = num2 + (t * trw * ols.sig2)
     J = num / ols.sig2
-    utwy = spdot(ols.u.T, spdot(Wsp_nt, y))
     lm = (utwu / ols.sig2 - t * trw / J * utwy / ols.sig2) ** 2 / (
         t * trw * (1 - t * trw / J)
     )
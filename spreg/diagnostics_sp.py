@@ -3,7 +3,8 @@ Spatial diagnostics module
 """
 __author__ = "Luc Anselin lanselin@gmail.com, Daniel Arribas-Bel darribas@asu.edu, Pedro Amaral pedrovma@gmail.com"
 
-from .sputils import spdot
+from itertools import combinations
+from .sputils import spdot, sptrace_wtw_ww
 
 # from scipy.stats.stats import chisqprob
 from scipy import stats
@@ -14,7 +15,7 @@ from scipy.stats import norm
 import numpy as np
 import numpy.linalg as la
 
-__all__ = ["LMtests", "MoranRes", "AKtest"]
+__all__ = ["LMtests", "MoranRes", "AKtest", "KBtests"]
 
 
 class LMtests:
@@ -177,9 +178,9 @@ class LMtests:
             self.sarma = lmSarma(ols, w, cache)
         #if any(test in ["lmwx", "rlmdurlag", "lmslxerr"] for test in tests):
         if any(test in ["lmwx", "rlmdurlag","lmslxerr"] for test in tests):
-            self.lmwx = lm_wx(ols, w)
+            self.lmwx = lm_wx(ols, w, cache)
         if any(test in ["lmspdurbin", "rlmdurlag", "rlmwx"] for test in tests):
-            self.lmspdurbin = lm_spdurbin(ols, w)
+            self.lmspdurbin = lm_spdurbin(ols, w, cache)
         if "rlmwx" in tests:
             self.rlmwx = rlm_wx(ols, self.lmspdurbin, self.lml)
         if "rlmdurlag" in tests:
@@ -472,6 +473,12 @@ class spDcache:
                   :math:` T = tr[(W' + W) W]`
     trA         : float
                   Trace of A as in Cliff & Ord (1981)
+    wx          : array
+                  nxk array (or sparse matrix) with the spatial lag of X
+    wtx         : array
+                  nxk array (or sparse matrix) with W'X
+    wtu         : array
+                  nx1 array with W'u
 
     """
 
@@ -515,14 +522,76 @@ class spDcache:
     @property
     def t(self):
         if "t" not in self._cache:
-            prod = (self.w.sparse.T + self.w.sparse) * self.w.sparse
-            self._cache["t"] = np.sum(prod.diagonal())
+            self._cache["t"] = sptrace_wtw_ww(self.w)
         return self._cache["t"]
 
+    @property
+    def wx(self):
+        if "wx" not in self._cache:
+            self._cache["wx"] = spdot(self.w.sparse, self.reg.x, array_out=False)
+        return self._cache["wx"]
+
+    @property
+    def wtx(self):
+        if "wtx" not in self._cache:
+            self._cache["wtx"] = spdot(self.w.sparse.T, self.reg.x, array_out=False)
+        return self._cache["wtx"]
+
+    @property
+    def wtu(self):
+        if "wtu" not in self._cache:
+            self._cache["wtu"] = self.w.sparse.T * self.reg.u
+        return self._cache["wtu"]
+
+    @property
+    def xmask(self):
+        if "xmask" not in self._cache:
+            try:
+                var_type = self.reg.output["var_type"]
+            except (AttributeError, KeyError):
+                var_type = self.reg._var_type
+            self._cache["xmask"] = np.asarray(var_type == "x", dtype=bool)
+        return self._cache["xmask"]
+
+    @property
+    def wxx(self):
+        if "wxx" not in self._cache:
+            wxx = self.wx[:, np.nonzero(self.xmask)[0]]
+            if not isinstance(wxx, np.ndarray):
+                wxx = wxx.toarray()
+            self._cache["wxx"] = wxx
+        return self._cache["wxx"]
+
+    @property
+    def wxb(self):
+        if "wxb" not in self._cache:
+            self._cache["wxb"] = self.w.sparse * self.reg.predy
+        return self._cache["wxb"]
+
+    @property
+    def kb(self):
+        """
+        Cross-products with WX (X excluding the constant) used by the
+        Koley-Bera tests: X1'WX, (WX)'WX, (WX)'u, (WX1b)'WX, (WX1b)'WX1b
+        and (Wy)'u.
+        """
+        if "kb" not in self._cache:
+            wxx = self.wxx
+            wxb = self.wxb
+            self._cache["kb"] = {
+                "x1twx": spdot(self.reg.x.T, wxx),
+                "wxtwx": np.dot(wxx.T, wxx),
+                "wxtu": np.dot(wxx.T, self.reg.u),
+                "wxbtwx": np.dot(wxb.T, wxx),
+                "wxbtwxb": np.dot(wxb.T, wxb),
+                "wytu": np.dot((self.w.sparse * self.reg.y).T, self.reg.u),
+            }
+        return self._cache["kb"]
+
     @property
     def trA(self):
         if "trA" not in self._cache:
-            xtwx = spdot(self.reg.x.T, spdot(self.w.sparse, self.reg.x))
+            xtwx = spdot(self.reg.x.T, self.wx)
             mw = np.dot(self.reg.xtxi, xtwx)
             self._cache["trA"] = np.sum(mw.diagonal())
         return self._cache["trA"]
@@ -531,12 +600,15 @@ class spDcache:
     def AB(self):
         """
         Computes A and B matrices as in Cliff-Ord 1981, p. 203
+
+        U = (W + W')/2 is never formed: UX is obtained from the cached WX
+        and W'X products.
         """
         if "AB" not in self._cache:
-            U = (self.w.sparse + self.w.sparse.T) / 2.0
-            z = spdot(U, self.reg.x, array_out=False)
-            c1 = spdot(self.reg.x.T, z, array_out=False)
-            c2 = spdot(z.T, z, array_out=False)
+            xtwx = spdot(self.reg.x.T, self.wx)
+            c1 = (xtwx + xtwx.T) / 2.0
+            z = (self.wx + self.wtx) / 2.0
+            c2 = spdot(z.T, z)
             G = self.reg.xtxi
             A = spdot(G, c1)
             B = spdot(G, c2)
@@ -677,7 +749,7 @@ def lmSarma(ols, w, spDcache):
     pval = chisqprob(lm, 2)
     return (lm[0][0], pval[0][0])
 
-def lm_wx(reg, w):
+def lm_wx(reg, w, cache=None):
     """
     LM test for WX. Implemented as presented in Koley & Bera (2024) :cite:`KoleyBera2024`.
 
@@ -687,6 +759,9 @@ def lm_wx(reg, w):
                   Instance from an OLS regression
     w           : W
                   Spatial weights instance
+    cache       : spDcache
+                  Instance of spDcache class (optional). If None, a new
+                  one is created for reg and w.
 
     Returns
     -------
@@ -694,34 +769,15 @@ def lm_wx(reg, w):
                   Pair of statistic and p-value for the LM test for WX.
 
     """
-
-    # preliminaries
-    # set up X1 (constant) and X (no constant) as x1 and xx
-    x1 = reg.x
-    try:
-        xx = reg.x[:, reg.output["var_type"] == 'x']
-    except KeyError:
-        xx = reg.x[:, reg._var_type == 'x']
-    # WX
-    wx = w.sparse * xx
-    # end of preliminaries
-    # X'W'u
-    xtwtu = wx.T @ reg.u
-    # X'W'X1(X1'X1)-1X1WX
-    mx1 = wx.T @ x1
-    mx = (mx1 @ reg.xtxi) @ mx1.T
-    xwwx = wx.T @ wx
-    xqx = xwwx - mx
-    xqxi = la.inv(xqx)
-    # RSgamma: (X'W'u)'(X'Q1X)-1(X'W'u) / sig2n
-    xpwpu = wx.T @ reg.u
-    rsg1 = (xpwpu.T @ xqxi) @ xpwpu
-    rsgam = rsg1[0][0] / reg.sig2n
+    if cache is None:
+        cache = spDcache(reg, w)
+    m = np.ones(cache.wxx.shape[1], dtype=bool)
+    rsgam = _kb_lmwx(reg, cache, m)
     pval = chisqprob(rsgam, (reg.k - 1))
     rsgamma = (rsgam,pval)
     return(rsgamma)
 
-def lm_spdurbin(reg,w):
+def lm_spdurbin(reg, w, cache=None):
     """
     Joint test for SDM. Implemented as presented in Koley & Bera (2024) :cite:`KoleyBera2024`.
 
@@ -731,6 +787,9 @@ def lm_spdurbin(reg,w):
                   Instance from an OLS regression
     w           : W
                   Spatial weights instance
+    cache       : spDcache
+                  Instance of spDcache class (optional). If None, a new
+                  one is created for reg and w.
 
     Returns
     -------
@@ -738,60 +797,187 @@ def lm_spdurbin(reg,w):
                   Pair of statistic and p-value for the Joint test for SDM.
 
     """
+    if cache is None:
+        cache = spDcache(reg, w)
+    m = np.ones(cache.wxx.shape[1], dtype=bool)
+    rsjoint = _kb_lmspdurbin(reg, cache, m)
+    pval = chisqprob(rsjoint, reg.x.shape[1])
+    rsrhogam = (rsjoint, pval)
+    return(rsrhogam)
+
+def _kb_lmwx(reg, cache, m):
+    """
+    LM WX statistic for the columns of X selected by the boolean mask m,
+    computed from the blocks stored in cache.kb.
+    """
+    kb = cache.kb
+    # X'W'u and X'W'X1 for the selected columns
+    xpwpu = kb["wxtu"][m]
+    mx1 = kb["x1twx"][:, m].T
+    # X'W'X - X'W'X1(X1'X1)-1X1WX
+    xqx = kb["wxtwx"][np.ix_(m, m)] - (mx1 @ reg.xtxi) @ mx1.T
+    # RSgamma: (X'W'u)'(X'Q1X)-1(X'W'u) / sig2n
+    rsg1 = xpwpu.T @ la.solve(xqx, xpwpu)
+    return rsg1[0][0] / reg.sig2n
 
-    # preliminaries
-    # set up X1 (constant) and X (no constant) as x1 and xx
-    x1 = reg.x
-    try:
-        xx = reg.x[:, reg.output["var_type"] == 'x']
-    except KeyError:
-        xx = reg.x[:, reg._var_type == 'x']
-    k = x1.shape[1]
-    # WX
-    wx = w.sparse * xx
-    # X1b
-    xb = reg.predy
-    # WX1b
-    wxb = w.sparse * xb
-    # Wy
-    wy = w.sparse * reg.y
-    # y'W'e / sig2n
-    drho = (wy.T @ reg.u) / reg.sig2n
-    # X'W'e / sign2n
-    dgam = (wx.T @ reg.u) / reg.sig2n
-    # P = T = tr(W2 + W'W)
-    pp = w.trcWtW_WW
-    # end of preliminaries
+def _kb_lmspdurbin(reg, cache, m):
+    """
+    Joint SDM statistic for the columns of X selected by the boolean mask
+    m, computed from the blocks stored in cache.kb.
+    """
+    kb = cache.kb
+    k = reg.x.shape[1]
+    # y'W'e / sig2n and X'W'e / sign2n
+    drho = kb["wytu"] / reg.sig2n
+    dgam = kb["wxtu"][m] / reg.sig2n
     # J_11: block matrix with X1'X1 and n/2sig2n
     jj1a = np.hstack((reg.xtx,np.zeros((k,1))))
     jj1b = np.hstack((np.zeros((1,k)),np.array([reg.n/(2.0*reg.sig2n)]).reshape(1,1)))
     jj11 = np.vstack((jj1a,jj1b))
     # J_12: matrix with k-1 rows X1'WX1b and X1'WX, and 1 row of zeros
-    jj12a = np.hstack((x1.T @ wxb, spdot(x1.T, wx, array_out=True)))
+    jj12a = np.hstack((spdot(reg.x.T, cache.wxb), kb["x1twx"][:, m]))
     jj12 = np.vstack((jj12a,np.zeros((1,jj12a.shape[1]))))
     # J_22 matrix with diagonal elements b'X1'W'WX1b + T.sig2n and X'W'WX
     # and off-diagonal element b'X1'W'WX
-    jj22a = wxb.T @ wxb + pp * reg.sig2n
-    jj22a = jj22a.reshape(1,1)
-    wxbtwx = (wxb.T @ wx).reshape(1,xx.shape[1])
+    jj22a = (kb["wxbtwxb"] + cache.t * reg.sig2n).reshape(1,1)
+    wxbtwx = kb["wxbtwx"][:, m]
     jj22b = np.hstack((jj22a,wxbtwx))
-    wxtwx = spdot(wx.T,wx, array_out=True)
-    jj22c = np.hstack((wxbtwx.T,wxtwx))
+    jj22c = np.hstack((wxbtwx.T,kb["wxtwx"][np.ix_(m, m)]))
     jj22 = np.vstack((jj22b,jj22c))
     # J^22 (the inverse) from J^22 = (J_22 - J_21.J_11^-1.J_12)^-1
     jj11i = la.inv(jj11)
     j121121 = (jj12.T @ jj11i) @ jj12
     jj22i1 = jj22 - j121121
-    jj22i = la.inv(jj22i1)
-    # rescale by sig2n
-    jj22i = jj22i * reg.sig2n
-    # statistic
+    # statistic, rescaled by sig2n
     dd = np.vstack((drho,dgam))
-    rsjoint = (dd.T @ jj22i) @ dd
-    rsjoint = rsjoint[0][0]
-    pval = chisqprob(rsjoint, k)
-    rsrhogam = (rsjoint, pval)
-    return(rsrhogam)
+    rsjoint = (dd.T @ la.solve(jj22i1, dd)) * reg.sig2n
+    return rsjoint[0][0]
+
+class KBtests:
+    """
+    Koley-Bera LM tests on subsets of spatially lagged explanatory
+    variables :cite:`KoleyBera2024`.
+
+    The spatial lag WX and all its cross-products with X, y, the residuals
+    and the predicted values are computed once for a given OLS regression
+    and W. Each subset of lagged variables is then evaluated by selecting
+    rows and columns of those blocks, which makes it cheap to screen many
+    candidate ``slx_vars`` specifications.
+
+    Parameters
+    ----------
+    reg         : OLS
+                  Instance from an OLS regression with slx_lags=0
+    w           : W
+                  Spatial weights instance
+    cache       : spDcache
+                  Instance of spDcache class (optional)
+
+    Attributes
+    ----------
+    lml         : tuple
+                  Pair of statistic and p-value for the LM lag test
+    lme         : tuple
+                  Pair of statistic and p-value for the LM error test
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> import libpysal
+    >>> from spreg import OLS, KBtests
+    >>> db = libpysal.io.open(libpysal.examples.get_path("columbus.dbf"), "r")
+    >>> y = np.array(db.by_col("HOVAL")).reshape(-1, 1)
+    >>> x = np.array([db.by_col("INC"), db.by_col("CRIME")]).T
+    >>> w = libpysal.weights.Queen.from_shapefile(libpysal.examples.get_path("columbus.shp"))
+    >>> w.transform = 'r'
+    >>> kb = KBtests(OLS(y, x), w)
+    >>> res = kb.test([True, False])
+    >>> print(round(res["lmwx"][0], 4), round(res["lmspdurbin"][0], 4))
+    0.5144 2.6893
+    """
+
+    def __init__(self, reg, w, cache=None):
+        self.reg = reg
+        self.w = w
+        if cache is None:
+            cache = spDcache(reg, w)
+        self.cache = cache
+        self.lml = lmLag(reg, w, cache)
+        self.lme = lmErr(reg, w, cache)
+        self.kx = cache.wxx.shape[1]
+
+    def _mask(self, slx_vars):
+        if isinstance(slx_vars, str) and slx_vars == "All":
+            return np.ones(self.kx, dtype=bool)
+        m = np.asarray(slx_vars, dtype=bool)
+        if m.shape != (self.kx,):
+            raise Exception("slx_vars incompatible with x column dimensions")
+        if not m.any():
+            raise Exception("slx_vars must select at least one variable")
+        return m
+
+    def test(self, slx_vars="All"):
+        """
+        Evaluates the LM WX test, the joint test for SDM and their robust
+        variants for one subset of lagged variables.
+
+        Parameters
+        ----------
+        slx_vars    : either "All" (default) or list of booleans to select
+                      the x variables (excluding the constant) to be lagged
+
+        Returns
+        -------
+        tests       : dictionary
+                      Pairs of statistic and p-value with keys 'lmwx',
+                      'lmspdurbin', 'rlmwx', 'rlmdurlag' and 'lmslxerr'
+        """
+        m = self._mask(slx_vars)
+        p = int(m.sum())
+        rsgam = _kb_lmwx(self.reg, self.cache, m)
+        rsjoint = _kb_lmspdurbin(self.reg, self.cache, m)
+        rsgams = rsjoint - self.lml[0]
+        rsrhos = rsjoint - rsgam
+        rslamgam = self.lme[0] + rsgam
+        return {
+            "lmwx": (rsgam, chisqprob(rsgam, p)),
+            "lmspdurbin": (rsjoint, chisqprob(rsjoint, p + 1)),
+            "rlmwx": (rsgams, chisqprob(rsgams, p)),
+            "rlmdurlag": (rsrhos, chisqprob(rsrhos, 1)),
+            "lmslxerr": (rslamgam, chisqprob(rslamgam, p + 1)),
+        }
+
+    def screen(self, max_vars=None, min_vars=1):
+        """
+        Evaluates the tests for every subset of lagged variables.
+
+        Parameters
+        ----------
+        max_vars    : integer
+                      Largest number of lagged variables in a subset. If
+                      None (default), all variables.
+        min_vars    : integer
+                      Smallest number of lagged variables in a subset
+                      (default 1)
+
+        Returns
+        -------
+        results     : list
+                      List of (slx_vars, tests) pairs, where slx_vars is a
+                      list of booleans and tests the dictionary returned by
+                      test(), ordered by subset size and then
+                      lexicographically by the positions of the variables
+        """
+        if max_vars is None:
+            max_vars = self.kx
+        results = []
+        for size in range(max(min_vars, 1), min(max_vars, self.kx) + 1):
+            for cols in combinations(range(self.kx), size):
+                slx_vars = [False] * self.kx
+                for c in cols:
+                    slx_vars[c] = True
+                results.append((slx_vars, self.test(slx_vars)))
+        return results
 
 def rlm_wx(reg,lmspdurbin,lmlag):
     """
@@ -951,7 +1137,7 @@ def akTest(iv, w, spDcache):
     """
     mi = get_mI(iv, w, spDcache)
     # Phi2
-    etwz = spdot(iv.u.T, spdot(w.sparse, iv.z))
+    etwz = spdot(iv.z.T, spDcache.wtu).T
     a = np.dot(etwz, np.dot(iv.varb, etwz.T))
     s12 = (w.s0 / w.n) ** 2
     phi2 = (spDcache.t + (4.0 / iv.sig2n) * a) / (s12 * w.n)
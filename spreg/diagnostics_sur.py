@@ -10,11 +10,20 @@ __author__ = "Luc Anselin lanselin@gmail.com,    \
 import numpy as np
 import scipy.stats as stats
 import numpy.linalg as la
-from .sur_utils import sur_dict2mat, sur_mat2dict, sur_corr, spdot
+from .sur_utils import sur_dict2mat, sur_mat2dict, sur_corr, sur_stack, spdot
 from .regimes import buildR1var, wald_test
+from .sputils import sptrace_wtw_ww
 
 
-__all__ = ["sur_setp", "sur_lrtest", "sur_lmtest", "lam_setp", "surLMe", "surLMlag"]
+__all__ = [
+    "sur_setp",
+    "sur_lrtest",
+    "sur_lmtest",
+    "lam_setp",
+    "surLMe",
+    "surLMlag",
+    "surLMtests",
+]
 
 
 def sur_setp(bigB, varb):
@@ -137,7 +146,52 @@ def sur_lmtest(n, n_eq, sig):
     return (lmtest, int(M), pvalue)
 
 
-def surLMe(n_eq, WS, bigE, sig):
+def surLMtests(n_eq, w, bigy, bigX, bigE, bigYP, sig, varb):
+    """
+    Lagrange Multiplier tests on error and lag spatial autocorrelation in
+    SUR, sharing the spatial lags of residuals, dependent variables and
+    predicted values, computed in one sparse product, and the traces of W
+
+    Parameters
+    ----------
+    n_eq       : int
+                 number of equations
+    w          : PySAL W object or spatial weights matrix in sparse form
+    bigy       : dictionary
+                 with y values
+    bigX       : dictionary
+                 with X values
+    bigE       : array
+                 n x n_eq matrix of residuals by equation
+    bigYP      : array
+                 n x n_eq matrix of predicted values by equation
+    sig        : array
+                 cross-equation error covariance matrix
+    varb       : array
+                 variance-covariance matrix for b coefficients (inverse of Ibb)
+
+    Returns
+    -------
+    (lmEtest,lmlagtest) : tuple
+                          with the tuples (test, df, p-value) of surLMe
+                          and surLMlag
+
+    """
+    WS = w.sparse if hasattr(w, "sparse") else w
+    Y = sur_stack(bigy)
+    WEYP = WS * np.hstack((bigE, Y, bigYP))
+    cache = {
+        "trWW_WtW": sptrace_wtw_ww(w, separate=True),
+        "WbigE": WEYP[:, :n_eq],
+        "WY": WEYP[:, n_eq : 2 * n_eq],
+        "WbigYP": WEYP[:, 2 * n_eq :],
+    }
+    lmEtest = surLMe(n_eq, WS, bigE, sig, cache=cache)
+    lmlagtest = surLMlag(n_eq, WS, bigy, bigX, bigE, bigYP, sig, varb, cache=cache)
+    return lmEtest, lmlagtest
+
+
+def surLMe(n_eq, WS, bigE, sig, cache=None):
     """
     Lagrange Multiplier test on error spatial autocorrelation in SUR
 
@@ -151,6 +205,9 @@ def surLMe(n_eq, WS, bigE, sig):
                  n x n_eq matrix of residuals by equation
     sig        : array
                  cross-equation error covariance matrix
+    cache      : dictionary
+                 optional, with the traces and spatial lags shared with
+                 other tests (see surLMtests)
 
     Returns
     -------
@@ -159,8 +216,12 @@ def surLMe(n_eq, WS, bigE, sig):
                         of freedom (n_eq) and p-value
 
     """
+    if cache is None:
+        cache = {}
     # spatially lagged residuals
-    WbigE = WS * bigE
+    if "WbigE" not in cache:
+        cache["WbigE"] = WS * bigE
+    WbigE = cache["WbigE"]
     # score
     EWE = np.dot(bigE.T, WbigE)
     sigi = la.inv(sig)
@@ -173,10 +234,9 @@ def surLMe(n_eq, WS, bigE, sig):
     score.resize(1, n_eq)
 
     # trace terms
-    WW = WS * WS
-    trWW = np.sum(WW.diagonal())
-    WTW = WS.T * WS
-    trWtW = np.sum(WTW.diagonal())
+    if "trWW_WtW" not in cache:
+        cache["trWW_WtW"] = sptrace_wtw_ww(WS, separate=True)
+    trWW, trWtW = cache["trWW_WtW"]
     # denominator
     SiS = sigi * sig
     Tii = trWW * np.identity(n_eq)
@@ -191,7 +251,7 @@ def surLMe(n_eq, WS, bigE, sig):
     return (LMe, n_eq, pvalue)
 
 
-def surLMlag(n_eq, WS, bigy, bigX, bigE, bigYP, sig, varb):
+def surLMlag(n_eq, WS, bigy, bigX, bigE, bigYP, sig, varb, cache=None):
     """
     Lagrange Multiplier test on lag spatial autocorrelation in SUR
 
@@ -212,6 +272,9 @@ def surLMlag(n_eq, WS, bigy, bigX, bigE, bigYP, sig, varb):
                  cross-equation error covariance matrix
     varb       : array
                  variance-covariance matrix for b coefficients (inverse of Ibb)
+    cache      : dictionary
+                 optional, with the traces and spatial lags shared with
+                 other tests (see surLMtests)
 
     Returns
     -------
@@ -220,9 +283,12 @@ def surLMlag(n_eq, WS, bigy, bigX, bigE, bigYP, sig, varb):
                           of freedom (n_eq) and p-value
 
     """
+    if cache is None:
+        cache = {}
     # Score
-    Y = np.hstack([bigy[r] for r in range(n_eq)])
-    WY = WS * Y
+    if "WY" not in cache:
+        cache["WY"] = WS * sur_stack(bigy)
+    WY = cache["WY"]
     EWY = np.dot(bigE.T, WY)
     sigi = la.inv(sig)
     SEWE = sigi * EWY
@@ -231,28 +297,27 @@ def surLMlag(n_eq, WS, bigy, bigX, bigE, bigYP, sig, varb):
 
     # I(rho,rho) as partitioned inverse, eq 72
     # trace terms
-    WW = WS * WS
-    trWW = np.sum(WW.diagonal())  # T1
-    WTW = WS.T * WS
-    trWtW = np.sum(WTW.diagonal())  # T2
+    if "trWW_WtW" not in cache:
+        cache["trWW_WtW"] = sptrace_wtw_ww(WS, separate=True)
+    trWW, trWtW = cache["trWW_WtW"]  # T1, T2
 
     # I(rho,rho)
     SiS = sigi * sig
     Tii = trWW * np.identity(n_eq)  # T1It
     tSiS = trWtW * SiS
     firstHalf = Tii + tSiS
-    WbigYP = WS * bigYP
+    if "WbigYP" not in cache:
+        cache["WbigYP"] = WS * bigYP
+    WbigYP = cache["WbigYP"]
     inner = np.dot(WbigYP.T, WbigYP)
     secondHalf = sigi * inner
     Ipp = firstHalf + secondHalf  # eq. 75
 
     # I(b,b) inverse is varb
 
-    # I(b,rho)
-    bp = sigi[0,] * spdot(bigX[0].T, WbigYP)  # initialize
-    for r in range(1, n_eq):
-        bpwork = sigi[r,] * spdot(bigX[r].T, WbigYP)
-        bp = np.vstack((bp, bpwork))
+    # I(b,rho), block r is sigi[r,] * X_r'WYP
+    bigK = [bigX[r].shape[1] for r in range(n_eq)]
+    bp = np.repeat(sigi, bigK, axis=0) * spdot(sur_stack(bigX).T, WbigYP)
     # partitioned part
     i_inner = Ipp - np.dot(np.dot(bp.T, varb), bp)
     # partitioned inverse of information matrix
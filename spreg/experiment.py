@@ -0,0 +1,407 @@
+"""
+Monte Carlo experiments for spatial regression estimators
+
+"""
+
+import os
+import inspect
+import importlib
+import itertools
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from scipy.stats import norm
+from . import dgp as DGP
+
+
+__all__ = ["design_grid", "run_experiment"]
+
+# weights shared by all the tasks run in a worker process, so that the LU
+# factorizations the dgp functions cache on them are computed once per worker
+_WORKER_W = {}
+
+
+def design_grid(design):
+    """
+    design_grid: expands a design into the list of its cells
+
+    Arguments:
+    ----------
+    design:   dictionary with a list of values for each design factor;
+              the keys "w" (name of the weights) and "dgp" (name of a
+              function in spreg.dgp) are required, all other keys are
+              passed to the dgp function (e.g., rho, lam, model) or, for
+              "gamma", used for the spatially lagged x
+
+    Returns:
+    --------
+    cells:    list of dictionaries, one for each combination of values
+
+    Examples
+    --------
+
+    >>> from spreg import design_grid
+    >>> cells = design_grid({"w": ["lat"], "dgp": ["dgp_lag"], "rho": [0.0, 0.5]})
+    >>> cells[1]
+    {'w': 'lat', 'dgp': 'dgp_lag', 'rho': 0.5}
+
+    """
+    keys = list(design.keys())
+    values = [v if isinstance(v, (list, tuple)) else [v] for v in design.values()]
+    return [dict(zip(keys, combo)) for combo in itertools.product(*values)]
+
+
+def _init_worker(weights):
+    _WORKER_W.clear()
+    _WORKER_W.update(weights)
+
+
+def _cell_x(cell, c, w, beta, x_kwargs, seed):
+    """
+    Exogenous part of the model for a cell: x, xb and wxg, fixed over the
+    replications and seeded from the seed and the cell index.
+    """
+    rng = np.random.default_rng([seed, c, 0])
+    k = len(beta) - 1
+    kwargs = {"mu": [0] * k, "varu": [1] * k}
+    kwargs.update(x_kwargs)
+    x = DGP.make_x(rng, w.n, **kwargs)
+    xb = DGP.make_xb(x, beta)
+    wxg = None
+    if "gamma" in cell:
+        wxg = DGP.make_wxg(DGP.make_wx(x, w), cell["gamma"])
+    return x, xb, wxg
+
+
+def _estimate(est, y, x, w):
+    """
+    Coefficients, standard errors and variable types (as in the output of
+    the regression) of one estimator for one replication; a failure gives
+    missing values and the exception raised.
+    """
+    name, kwargs = est
+    model = getattr(importlib.import_module(__package__), name)
+    try:
+        reg = model(y, x, w=w, **kwargs)
+        betas = np.asarray(reg.betas, dtype=float).flatten()
+        se = np.full(betas.shape, np.nan)
+        std_err = np.asarray(reg.std_err, dtype=float).flatten()
+        se[: std_err.shape[0]] = std_err[: betas.shape[0]]
+        var_type = getattr(reg, "_var_type", None)
+        var_type = None if var_type is None else list(var_type)
+    except Exception as e:
+        return None, None, None, e
+    return betas, se, var_type, None
+
+
+def _run_chunk(task):
+    """
+    Generates one chunk of replications for a cell and estimates all the
+    models on it, so that the estimators share the same draws.
+    """
+    c, cell, start, size, beta, x_kwargs, error_kwargs, estimators, seed = task
+    w = _WORKER_W[cell["w"]]
+    x, xb, wxg = _cell_x(cell, c, w, beta, x_kwargs, seed)
+    rng = np.random.default_rng([seed, c, 1, start])
+    u = DGP.make_error(rng, w.n, r=size, **error_kwargs)
+    dgp = getattr(DGP, cell["dgp"])
+    params = inspect.signature(dgp).parameters
+    kwargs = {key: v for key, v in cell.items() if key in params and key not in ("w", "u", "xb", "wxg")}
+    if "w" in params:
+        kwargs["w"] = w
+    if "imethod" in params and "imethod" not in kwargs:
+        kwargs["imethod"] = "lu"
+    if "wxg" in params:
+        kwargs["wxg"] = wxg if wxg is not None else np.zeros((w.n, 1))
+    y = dgp(u, xb, **kwargs)
+    results = []
+    for est in estimators:
+        betas, ses = [], []
+        var_type = error = None
+        for j in range(size):
+            b, s, vt, e = _estimate(est, y[:, j : j + 1], x, w)
+            betas.append(b)
+            ses.append(s)
+            if var_type is None:
+                var_type = vt
+            if e is not None:
+                error = e
+        kb = max([b.shape[0] for b in betas if b is not None], default=0)
+        bb = np.full((kb, size), np.nan)
+        ss = np.full((kb, size), np.nan)
+        for j in range(size):
+            if betas[j] is not None:
+                bb[:, j], ss[:, j] = betas[j], ses[j]
+        nfail = sum(b is None for b in betas)
+        results.append((bb, ss, var_type, nfail, error))
+    return c, start, size, results
+
+
+class _RunningStats:
+    """
+    Sums over the replications from which bias, RMSE and rejection
+    frequencies are obtained, updated one chunk at a time.
+    """
+
+    def __init__(self, true, zcrit):
+        self.true = true
+        self.zcrit = zcrit
+        k = true.shape[0]
+        self.count = np.zeros(k)
+        self.sum = np.zeros(k)
+        self.sum_err2 = np.zeros(k)
+        self.ntest = np.zeros(k)
+        self.ntrue = np.zeros(k)
+        self.reject = np.zeros(k)
+        self.reject0 = np.zeros(k)
+
+    def update(self, b, se):
+        ok = ~np.isnan(b)
+        err = np.where(ok, b - self.true[:, None], 0.0)
+        self.count += ok.sum(axis=1)
+        self.sum += np.where(ok, b, 0.0).sum(axis=1)
+        self.sum_err2 += (err**2).sum(axis=1)
+        okse = ok & ~np.isnan(se) & (se > 0)
+        # no size test without a true value
+        oktrue = okse & ~np.isnan(self.true)[:, None]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = np.where(oktrue, err / se, 0.0)
+            z0 = np.where(okse, b / se, 0.0)
+        self.ntest += okse.sum(axis=1)
+        self.ntrue += oktrue.sum(axis=1)
+        self.reject += (np.abs(z) > self.zcrit).sum(axis=1)
+        self.reject0 += (np.abs(z0) > self.zcrit).sum(axis=1)
+
+    def summary(self):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = self.sum / self.count
+            return {
+                "nrep": self.count,
+                "true": self.true,
+                "mean": mean,
+                "bias": mean - self.true,
+                "rmse": np.sqrt(self.sum_err2 / self.count),
+                "size": self.reject / self.ntrue,
+                "power": self.reject0 / self.ntest,
+            }
+
+
+def _dgp_params(cell):
+    """
+    Spatial parameters of the dgp of a cell: rho, lam and gamma, taken from
+    the cell or from the defaults of the dgp function. Parameters the dgp
+    does not have are zero; those that are not a spatial autoregressive
+    coefficient (rho of dgp_mess, lam of a moving average error) are
+    missing values.
+    """
+    params = inspect.signature(getattr(DGP, cell["dgp"])).parameters
+
+    def value(key):
+        if key not in params:
+            return 0.0
+        return float(cell.get(key, params[key].default))
+
+    rho = np.nan if cell["dgp"] == "dgp_mess" else value("rho")
+    lam = value("lam")
+    if "lam" in params and cell.get("model", params["model"].default) != "sar":
+        lam = np.nan
+    gamma = None
+    if "wxg" in params and "gamma" in cell:
+        gamma = list(np.atleast_1d(cell["gamma"]))
+    return rho, lam, gamma
+
+
+def _true_values(cell, beta, var_type, k):
+    """
+    True coefficients in the order of an estimator's betas, following the
+    variable types of its output: beta for the constant and the x
+    variables, gamma for the first order spatially lagged x when the dgp
+    has them (zero otherwise and for higher orders), and the rho and lam
+    of the dgp for the 'rho' and 'lambda' coefficients. Other coefficients
+    are missing values.
+    """
+    rho, lam, gamma = _dgp_params(cell)
+    out = np.full(k, np.nan)
+    if var_type is None:
+        out[: min(k, len(beta))] = list(beta)[:k]
+        return out
+    if gamma is not None and len(gamma) == 1:
+        gamma = gamma * (len(beta) - 1)
+    gamma = gamma if gamma is not None else []
+    nb = nwx = 0
+    for j, vt in enumerate(var_type[:k]):
+        if vt in ("o", "x") and nb < len(beta):
+            out[j] = beta[nb]
+            nb += 1
+        elif vt in ("x", "wx"):
+            # WX terms follow the x variables; some estimators label them x
+            out[j] = gamma[nwx] if nwx < len(gamma) else 0.0
+            nwx += 1
+        elif vt == "rho":
+            out[j] = rho
+        elif vt == "lambda":
+            out[j] = lam
+    return out
+
+
+def run_experiment(
+    design,
+    weights,
+    estimators,
+    r=1000,
+    beta=[1, 1],
+    outdir=None,
+    chunk=100,
+    nworkers=None,
+    alpha=0.05,
+    seed=12345,
+    x_kwargs={},
+    error_kwargs={},
+):
+    """
+    run_experiment: Monte Carlo simulation over a design grid
+
+    Replications are generated in chunks with the batched generators in
+    spreg.dgp (one nxr block and one cached factorization per chunk) and
+    every estimator is applied to the same draws. Chunks are executed in a
+    process pool; each worker receives the weights once and keeps them, so
+    the LU factorizations the dgp functions cache on a weights object are
+    shared by all the chunks run in that worker. Coefficients and standard
+    errors are streamed to disk as they arrive and the summary statistics
+    are accumulated chunk by chunk. Replications in which an estimator
+    fails are counted and left out; if an estimator fails in every
+    replication of a cell, its exception is raised.
+
+    Arguments:
+    ----------
+    design:       dictionary of lists with the design factors (see
+                  design_grid) or list of cells
+    weights:      dictionary with the PySAL weights objects referred to by
+                  name in the design
+    estimators:   list of spreg model names (e.g., "GM_Lag") or of tuples
+                  with a model name and a dictionary of keyword arguments;
+                  each is called as model(y, x, w=w, **kwargs)
+    r:            number of replications per cell
+    beta:         list of coefficients for the constant and the x variables
+    outdir:       directory for the output files, default None keeps no
+                  replication-level output; for each cell and estimator a
+                  file cell<c>_<estimator>_betas.npy and a matching _se.npy
+                  are written, with one row of r values per coefficient
+    chunk:        maximum number of replications in a chunk
+    nworkers:     number of worker processes; default None uses all
+                  processors, 1 runs in the current process
+    alpha:        significance level for size and power
+    seed:         seed for the x variables and the errors; results do not
+                  depend on nworkers
+    x_kwargs:     dictionary of keyword arguments for make_x
+    error_kwargs: dictionary of keyword arguments for make_error
+
+    Returns:
+    --------
+    summary:      pandas DataFrame with one row for each cell, estimator and
+                  coefficient with the design factors, the true value
+                  (the spatial parameters of the cell's dgp placed where
+                  the estimator has them, zero where the dgp has none), the
+                  number of replications, mean, bias, RMSE, size (rejection
+                  frequency of the true value, missing without one), power
+                  (rejection frequency of zero) and the number of
+                  replications in which the estimator failed (nfail)
+
+    Examples
+    --------
+
+    >>> import libpysal
+    >>> from spreg import run_experiment
+    >>> w = libpysal.weights.lat2W(10, 10)
+    >>> w.transform = "r"
+    >>> design = {"w": ["lat"], "dgp": ["dgp_lag"], "rho": [0.5]}
+    >>> res = run_experiment(design, {"lat": w}, ["GM_Lag"], r=20, nworkers=1)
+    >>> res[["coefficient", "true", "nrep"]]
+       coefficient  true  nrep
+    0            0   1.0  20.0
+    1            1   1.0  20.0
+    2            2   0.5  20.0
+
+    """
+    cells = design_grid(design) if isinstance(design, dict) else list(design)
+    estimators = [(e, {}) if isinstance(e, str) else tuple(e) for e in estimators]
+    names = [e[0] for e in estimators]
+    tasks = [
+        (c, cell, start, min(chunk, r - start), beta, x_kwargs, error_kwargs, estimators, seed)
+        for c, cell in enumerate(cells)
+        for start in range(0, r, chunk)
+    ]
+    zcrit = norm.ppf(1 - alpha / 2.0)
+    stats = {}
+    files = {}
+    nfail = {}
+    errors = {}
+    if outdir is not None:
+        os.makedirs(outdir, exist_ok=True)
+
+    def collect(result):
+        c, start, size, results = result
+        for e, (b, se, var_type, nf, error) in enumerate(results):
+            key = (c, e)
+            nfail[key] = nfail.get(key, 0) + nf
+            if error is not None:
+                errors[key] = error
+            if key not in stats:
+                if b.shape[0] == 0:
+                    continue
+                stats[key] = _RunningStats(
+                    _true_values(cells[c], beta, var_type, b.shape[0]), zcrit
+                )
+                if outdir is not None:
+                    base = os.path.join(outdir, "cell%d_%s" % (c, names[e]))
+                    files[key] = [
+                        np.lib.format.open_memmap(
+                            base + suffix, mode="w+", dtype=float, shape=(b.shape[0], r)
+                        )
+                        for suffix in ("_betas.npy", "_se.npy")
+                    ]
+                    for f in files[key]:
+                        f[:] = np.nan
+            stats[key].update(b, se)
+            if key in files:
+                files[key][0][:, start : start + size] = b
+                files[key][1][:, start : start + size] = se
+
+    if nworkers == 1:
+        _init_worker(weights)
+        for task in tasks:
+            collect(_run_chunk(task))
+    else:
+        with ProcessPoolExecutor(
+            max_workers=nworkers, initializer=_init_worker, initargs=(weights,)
+        ) as pool:
+            for result in pool.map(_run_chunk, tasks):
+                collect(result)
+    for f in files.values():
+        f[0].flush()
+        f[1].flush()
+    for key in sorted(errors):
+        if nfail[key] == r:
+            # every replication failed, most likely a misspecified estimator
+            raise errors[key]
+
+    rows = []
+    for (c, e), st in sorted(stats.items()):
+        summ = st.summary()
+        for j in range(st.true.shape[0]):
+            row = dict(cells[c])
+            row.update({"cell": c, "estimator": names[e], "coefficient": j})
+            row.update({key: v[j] for key, v in summ.items()})
+            row["nfail"] = nfail[(c, e)]
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def _test():
+    import doctest
+
+    doctest.testmod()
+
+
+if __name__ == "__main__":
+    _test()
@@ -350,8 +350,14 @@ class ML_Lag(BaseML_Lag):
     spat_impacts : string or list
                    Include average direct impact (ADI), average indirect impact (AII),
                     and average total impact (ATI) in summary results.
-                    Options are 'simple', 'full', 'power', 'all' or None.
+                    Options are 'simple', 'full', 'power', 'mc', 'all' or None.
                     See sputils.spmultiplier for more information.
+    impacts_nprobe: int
+                    Number of random probe vectors for the traces of the
+                    'mc' impacts (see sputils.sptrace_wpow)
+    impacts_order: int
+                    Highest power of W in the 'mc' impacts; by default it
+                    grows with rho (see sputils.spmultiplier)
     vm           : boolean
                    if True, include variance-covariance matrix in summary
                    results
@@ -430,6 +436,10 @@ class ML_Lag(BaseML_Lag):
                    p-value), where each is a float
     sp_multipliers: dict
                    Dictionary of spatial multipliers (if spat_impacts is not None)             
+    sp_impacts   : dict
+                   Dictionary with a DataFrame of direct, indirect and total
+                   impacts for each method, with their simulated standard
+                   errors and 95% intervals (if spat_impacts is not None)
     name_y       : string
                    Name of dependent variable for use in output
     name_x       : list of strings
@@ -608,6 +618,8 @@ class ML_Lag(BaseML_Lag):
         method="full",
         epsilon=0.0000001,
         spat_impacts="simple",
+        impacts_nprobe=50,
+        impacts_order=None,
         vm=False,
         spat_diag=True,
         name_y=None,
@@ -629,6 +641,8 @@ class ML_Lag(BaseML_Lag):
                 method=method,
                 epsilon=epsilon,
                 spat_impacts=spat_impacts,
+                impacts_nprobe=impacts_nprobe,
+                impacts_order=impacts_order,
                 vm=vm,
                 spat_diag=spat_diag,
                 name_y=name_y,
@@ -693,7 +707,8 @@ class ML_Lag(BaseML_Lag):
             if spat_diag and slx_lags==1:
                 diag_out = _spat_diag_out(self, w, 'yend', ml=True)
             if spat_impacts:
-                self.sp_multipliers, impacts_str = _summary_impacts(self, w, spat_impacts, slx_lags,slx_vars)
+                self.sp_multipliers, impacts_str = _summary_impacts(self, w, spat_impacts, slx_lags,slx_vars,
+                                                                      nprobe=impacts_nprobe, order=impacts_order)
                 try:
                     diag_out += impacts_str
                 except TypeError:
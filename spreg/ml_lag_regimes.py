@@ -68,8 +68,14 @@ class ML_Lag_Regimes(BaseML_Lag, REGI.Regimes_Frame):
     spat_impacts : string or list
                    Include average direct impact (ADI), average indirect impact (AII),
                     and average total impact (ATI) in summary results.
-                    Options are 'simple', 'full', 'power', 'all' or None.
+                    Options are 'simple', 'full', 'power', 'mc', 'all' or None.
                     See sputils.spmultiplier for more information.
+    impacts_nprobe: int
+                    Number of random probe vectors for the traces of the
+                    'mc' impacts (see sputils.sptrace_wpow)
+    impacts_order: int
+                    Highest power of W in the 'mc' impacts; by default it
+                    grows with rho (see sputils.spmultiplier)
     cores        : boolean
                    Specifies if multiprocessing is to be used
                    Default: no multiprocessing, cores = False
@@ -183,6 +189,12 @@ class ML_Lag_Regimes(BaseML_Lag, REGI.Regimes_Frame):
                    Dictionary of spatial multipliers (if spat_impacts is not None)
                    Only available in dictionary 'multi' when multiple regressions
                    (see 'multi' below for details)
+    sp_impacts   : dict
+                   Dictionary with a DataFrame of direct, indirect and total
+                   impacts for each method, with their simulated standard
+                   errors and 95% intervals (if spat_impacts is not None)
+                   Only available in dictionary 'multi' when multiple regressions
+                   (see 'multi' below for details)
     name_y       : string
                    Name of dependent variable for use in output
     name_x       : list of strings
@@ -324,6 +336,8 @@ class ML_Lag_Regimes(BaseML_Lag, REGI.Regimes_Frame):
         cores=False,
         spat_diag=True,
         spat_impacts="simple",
+        impacts_nprobe=50,
+        impacts_order=None,
         vm=False,
         name_y=None,
         name_x=None,
@@ -403,6 +417,8 @@ class ML_Lag_Regimes(BaseML_Lag, REGI.Regimes_Frame):
                 epsilon=epsilon,
                 spat_diag=spat_diag,
                 spat_impacts=spat_impacts,
+                impacts_nprobe=impacts_nprobe,
+                impacts_order=impacts_order,
                 vm=vm,
                 name_y=name_y,
                 name_x=name_x,
@@ -457,7 +473,8 @@ class ML_Lag_Regimes(BaseML_Lag, REGI.Regimes_Frame):
                 self.title = ("MAXIMUM LIKELIHOOD SPATIAL LAG - REGIMES"+ " (METHOD = "+ method+ ")")
                
             if spat_impacts:
-                self.sp_multipliers, impacts_str = _summary_impacts(self, w, spat_impacts, slx_lags, regimes=True)
+                self.sp_multipliers, impacts_str = _summary_impacts(self, w, spat_impacts, slx_lags, regimes=True,
+                                                                      nprobe=impacts_nprobe, order=impacts_order)
                 try:
                     diag_out += impacts_str
                 except TypeError:
@@ -480,6 +497,8 @@ class ML_Lag_Regimes(BaseML_Lag, REGI.Regimes_Frame):
         epsilon,
         spat_diag,
         spat_impacts,
+        impacts_nprobe,
+        impacts_order,
         vm,
         name_y,
         name_x,
@@ -613,7 +632,8 @@ class ML_Lag_Regimes(BaseML_Lag, REGI.Regimes_Frame):
             if spat_diag and slx_lags == 1:
                 results[r].other_mid += _spat_diag_out(results[r], None, 'yend', ml=True)
             if spat_impacts:
-                results[r].sp_multipliers, impacts_str = _summary_impacts(results[r], results[r].w, spat_impacts, slx_lags)
+                results[r].sp_multipliers, impacts_str = _summary_impacts(results[r], results[r].w, spat_impacts, slx_lags,
+                                                                            nprobe=impacts_nprobe, order=impacts_order)
                 results[r].other_mid += impacts_str
             counter += 1
         self.multi = results
@@ -96,9 +96,11 @@ class BaseNSLX(RegressionPropsY):
         g0 = np.vstack((b0,alpha0)) 
         gamma0 = g0.flatten()
         gradflag=0
+        nlbuf = _nlbuffers(w,transform)
 
-        ssmin = minimize(nslxobj,gamma0,
-                         args=(self.y,self.x,self.xw,self.w,self.transform,self.verbose),
+        ssmin = minimize(_nslxobj_jac,gamma0,
+                         args=(self.y,self.x,self.xw,nlbuf,self.verbose),
+                         jac=True,
                          options=self.options)   
 
         self.betas = ssmin.x
@@ -116,7 +118,7 @@ class BaseNSLX(RegressionPropsY):
         b= self.betas[0:-h]
         alpha = self.betas[-h:]
 
-        wx = nlmod(alpha,xw,w,transform,gradflag=0)
+        wx = _nlmod_jac(alpha,xw,nlbuf)[0]
         wxs = np.sum(wx,axis=1).reshape(-1,1)
         xb = x @ b.reshape(-1,1)
         predy = xb + wxs
@@ -436,6 +438,120 @@ def nslxobj(gamma0,y,x,xw,w,transform,verbose):
 
     return res2
 
+def _nslxobj_jac(gamma0,y,x,xw,nlbuf,verbose):
+    '''
+    Objective function for minimize with jac=True, returns the sum of squared
+    residuals in the nonlinear SLX model and its analytical gradient
+
+    Parameters
+    ----------
+    gamma0      : current parameter estimates, consists of beta (for X) and alpha (for WX)
+                  needs to be a flattened array
+    y           : n by 1 vector with observations on the dependent variable
+    x           : n by k matrix with observations on X, must include constant vector
+    xw          : n by h matrix with columns of X that will be spatially lagged
+    nlbuf       : buffers for the transformed weights created by _nlbuffers
+    verbose     : verbose option, whether or not the intermediate parameter values and residual sum
+                  of squares are printed out
+
+    Returns
+    -------
+    res2        : sum of squared residuals
+    grad        : gradient of res2 with respect to beta and alpha
+
+    '''
+    h = xw.shape[1]
+    if verbose:
+        print("gamma0",gamma0)
+    b0 = gamma0[0:-h]
+    alpha0 = gamma0[-h:]
+    wx, dwx = _nlmod_jac(alpha0,xw,nlbuf)
+    res = y[:,0] - x @ b0 - np.sum(wx,axis=1)
+    res2 = res @ res
+    if verbose:
+        print("res2",res2)
+    grad = -2.0 * np.concatenate((x.T @ res, dwx.T @ res))
+    return res2, grad
+
+def _nlbuffers(w,transform):
+    '''
+    Prepares the weights for repeated transformations. Both transformations are
+    written as exp(a * base), with base = log(w) for "power" and base = -w for
+    "exponential", so that the transformed weights and their derivative with
+    respect to a (base * exp(a * base)) are each one pass over the nonzeros.
+    base is computed once, and the two CSR arrays share the structure of w and
+    are overwritten in place at each call of _nlmod_jac.
+
+    Parameters
+    ----------
+    w           : list of CSR sparse arrays with weights, as in nlmod
+    transform   : tuple of transformations, as in nlmod
+
+    Returns
+    -------
+    nlbuf       : list with a tuple (base, walpha, wgrad, zero) for each weights
+                  matrix, where zero flags the zero weights of the power
+                  transformation, transformed as 0 ** a and with derivative zero
+
+    '''
+    if len(transform) != len(w):
+        raise Exception("Incompatible dimensions")
+    nlbuf = []
+    for wi,ti in zip(w,transform):
+        wi = csr_array(wi)
+        if ti.lower() == "power":
+            with np.errstate(divide="ignore"):
+                base = np.log(wi.data)
+        elif ti.lower() == "exponential":
+            base = -wi.data
+        else:
+            raise Exception("Transformation not supported")
+        walpha = csr_array((np.empty_like(base),wi.indices,wi.indptr),shape=wi.shape)
+        wgrad = csr_array((np.empty_like(base),wi.indices,wi.indptr),shape=wi.shape)
+        nlbuf.append((base,walpha,wgrad,np.isinf(base)))
+    return nlbuf
+
+def _nlmod_jac(alpha,xw,nlbuf):
+    '''
+    Matrix of spatially lagged X variables W(a)X and matrix of their derivatives
+    with respect to each alpha, using the buffers created by _nlbuffers
+
+    Parameters
+    ----------
+    alpha       : array with alpha parameters, same number as relevant columns in X
+                  must be flattened (not a vector)
+    xw          : matrix with relevant columns of X to be lagged
+    nlbuf       : buffers for the transformed weights created by _nlbuffers; a single
+                  element list when the same weights are used for all columns
+
+    Returns
+    -------
+    wx          : matrix with spatially lagged X variables
+    dwx         : matrix with the derivatives of wx with respect to alpha
+
+    '''
+    h = len(alpha)
+    if xw.shape[1] != h:
+        raise Exception("Incompatible dimensions")
+    g = len(nlbuf)
+    if g != 1 and g != h:
+        raise Exception("Operation not supported")
+    n = xw.shape[0]
+    wx = np.zeros((n,h))
+    dwx = np.zeros((n,h))
+    for i in range(h):
+        base,walpha,wgrad,zero = nlbuf[0] if g == 1 else nlbuf[i]
+        with np.errstate(invalid="ignore",divide="ignore"):
+            np.multiply(base,alpha[i],out=walpha.data)
+            np.exp(walpha.data,out=walpha.data)
+            np.multiply(walpha.data,base,out=wgrad.data)
+            # exp(a * log(0)) is nan at a = 0, where 0 ** 0 = 1
+            walpha.data[zero] = np.power(0.0,alpha[i])
+        wgrad.data[zero] = 0.0
+        wx[:,i] = walpha @ xw[:,i]
+        dwx[:,i] = wgrad @ xw[:,i]
+    return wx, dwx
+
 def nlmod(alpha,xw,w,transform,gradflag=0):
     '''
     Constructs the matrix of spatially lagged X variables W(a)X (for gradflag = 0) and 
@@ -8,7 +8,7 @@ import pandas as pd
 from . import diagnostics as diagnostics
 from . import diagnostics_tsls as diagnostics_tsls
 from . import diagnostics_sp as diagnostics_sp
-from .sputils import _sp_effects, spmultiplier
+from .sputils import _sp_effects, _sp_effects_draws, spmultiplier
 
 __all__ = []
 
@@ -572,10 +572,12 @@ def _summary_iteration(reg):
 
     return txt
 
-def _summary_impacts(reg, w, spat_impacts, slx_lags=0, slx_vars="All",regimes=False):
+def _summary_impacts(reg, w, spat_impacts, slx_lags=0, slx_vars="All",regimes=False,ndraws=1000,nprobe=50,order=None):
     """
     Spatial direct, indirect and total effects in spatial lag model.
-    Uses multipliers computed by sputils.spmultipliers.
+    Uses multipliers computed by sputils.spmultipliers. Standard errors and
+    95% intervals are simulated from the estimated coefficients with
+    sputils._sp_effects_draws and stored in reg.sp_impacts.
 
     Attributes
     ----------
@@ -586,6 +588,10 @@ def _summary_impacts(reg, w, spat_impacts, slx_lags=0, slx_vars="All",regimes=Fa
     slx_vars : either "All" (default) for all variables lagged, or a list
                of booleans matching the columns of x that will be lagged or not
     regimes: boolean, True if regimes model
+    ndraws: int, number of draws used to simulate the standard errors of
+            the impacts; 0 skips the simulation
+    nprobe: int, number of random probe vectors for the 'mc' traces
+    order: int, highest power of W in the 'mc' series; None lets it grow with rho
 
     Returns
     -------
@@ -618,18 +624,37 @@ def _summary_impacts(reg, w, spat_impacts, slx_lags=0, slx_vars="All",regimes=Fa
         spat_impacts = ["simple", "full", "power"]
 
     sp_multipliers = {}
+    reg.sp_impacts = {}
     for i in spat_impacts:
-        spmult = spmultiplier(w, reg.rho, method=i)   # computes the multipliers, slx_lags not needed
+        spmult = spmultiplier(w, reg.rho, method=i, nprobe=nprobe, order=order)   # computes the multipliers, slx_lags not needed
         
         strSummary += spmult["warn"]
         btot, bdir, bind = _sp_effects(reg, variables, spmult, slx_lags,slx_vars)  # computes the impacts, needs slx_lags
         sp_multipliers[spmult["method"]] = spmult['adi'], spmult['aii'].item(), spmult['ati'].item()
+        sim = None
+        if ndraws:
+            sim = _sp_effects_draws(reg, w, variables, spmult["method"], slx_lags, slx_vars, ndraws=ndraws,
+                                   nprobe=nprobe, order=order)
+
+        impacts = pd.DataFrame({"direct": bdir.flatten(), "indirect": bind.flatten(), "total": btot.flatten()},
+                               index=variables['var_names'].values)
+        if sim is not None:
+            for name, se, q in zip(["total", "direct", "indirect"], sim["se"], sim["quantiles"]):
+                impacts[name + "_se"] = se
+                impacts[name + "_q025"], impacts[name + "_q975"] = q[:, 0], q[:, 1]
+            impacts.attrs["ndraws"] = sim["ndraws"]
+        reg.sp_impacts[spmult["method"]] = impacts
 
         strSummary += "Impacts computed using the '" + spmult["method"] + "' method.\n"
         strSummary += "            Variable         Direct        Indirect          Total\n"
         for i in range(len(variables)):
             strSummary += "%20s   %12.4f    %12.4f    %12.4f\n" % (
             variables['var_names'][variables_index[i]], bdir[i][0], bind[i][0], btot[i][0])
+            if sim is not None:
+                strSummary += "%20s    %12s    %12s    %12s\n" % ("",
+                "(%.4f)" % sim["se"][1][i], "(%.4f)" % sim["se"][2][i], "(%.4f)" % sim["se"][0][i])
+        if sim is not None:
+            strSummary += "Standard errors (in parentheses) simulated from " + str(sim["ndraws"]) + " of " + str(ndraws) + " draws of the coefficients.\n"
 
     return sp_multipliers, strSummary
 
@@ -11,7 +11,7 @@ import numpy.linalg as la
 from scipy import sparse as sp
 from scipy.sparse.linalg import splu as SuperLU
 from .utils import RegressionPropsY, RegressionPropsVM, inverse_prod, set_warn
-from .sputils import spdot, spfill_diagonal, spinv
+from .sputils import spdot, spw_evals, sptrace_d
 from . import diagnostics as DIAG
 from . import user_output as USER
 from . import summary_output as SUMMARY
@@ -23,7 +23,13 @@ try:
 except ImportError:
     minimize_scalar_available = False
 
-from .panel_utils import check_panel, demean_panel
+from .panel_utils import (
+    check_panel,
+    demean_panel,
+    panel_lag,
+    _panel_wide,
+    _panel_long,
+)
 
 __all__ = ["Panel_FE_Lag", "Panel_FE_Error"]
 
@@ -43,6 +49,10 @@ class BasePanel_FE_Lag(RegressionPropsY, RegressionPropsVM):
                 (note: must already include constant term)
     w         : pysal W object
                 Spatial weights matrix
+    method    : string
+                log Jacobian method
+                if 'LU', LU sparse matrix decomposition (default)
+                if 'ord', Ord eigenvalue method
     epsilon   : float
                 tolerance criterion in mimimize_scalar function and
                 inverse_product
@@ -87,21 +97,20 @@ class BasePanel_FE_Lag(RegressionPropsY, RegressionPropsVM):
                    prediction errors using reduced form predicted values
     """
 
-    def __init__(self, y, x, w, epsilon=0.0000001):
+    def __init__(self, y, x, w, method="LU", epsilon=0.0000001):
         # set up main regression variables and spatial filters
         self.n = w.n
         self.t = y.shape[0] // self.n
         self.k = x.shape[1]
         self.epsilon = epsilon
+        self.method = method
         # Demeaned variables
         self.y = demean_panel(y, self.n, self.t)
         self.x = demean_panel(x, self.n, self.t)
-        # Big W matrix
-        W = w.full()[0]
+        # W matrix, applied period by period
         Wsp = w.sparse
-        Wsp_nt = sp.kron(sp.identity(self.t), Wsp, format="csr")
         # lag dependent variable
-        ylag = spdot(Wsp_nt, self.y)
+        ylag = panel_lag(Wsp, self.y, self.n, self.t)
         # b0, b1, e0 and e1
         xtx = spdot(self.x.T, self.x)
         xtxi = la.inv(xtx)
@@ -112,16 +121,30 @@ class BasePanel_FE_Lag(RegressionPropsY, RegressionPropsVM):
         e0 = self.y - spdot(self.x, b0)
         e1 = ylag - spdot(self.x, b1)
 
-        # concentrated Log Likelihood
+        # concentrated Log Likelihood, t*ln|I - rho W| from one nxn operator
         I = sp.identity(self.n)
-        res = minimize_scalar(
-            lag_c_loglik_sp,
-            0.0,
-            bounds=(-1.0, 1.0),
-            args=(self.n, self.t, e0, e1, I, Wsp),
-            method="bounded",
-            options={"xatol": epsilon},
-        )
+        methodML = method.upper()
+        if methodML == "LU":
+            res = minimize_scalar(
+                lag_c_loglik_sp,
+                0.0,
+                bounds=(-1.0, 1.0),
+                args=(self.n, self.t, e0, e1, I, Wsp),
+                method="bounded",
+                options={"xatol": epsilon},
+            )
+        elif methodML == "ORD":
+            evals = spw_evals(w)
+            res = minimize_scalar(
+                lag_c_loglik_ord,
+                0.0,
+                bounds=(-1.0, 1.0),
+                args=(self.n, self.t, e0, e1, evals),
+                method="bounded",
+                options={"xatol": epsilon},
+            )
+        else:
+            raise Exception("{0} is an unsupported method".format(method))
         self.rho = res.x[0][0]
 
         # compute full log-likelihood, including constants
@@ -137,8 +160,16 @@ class BasePanel_FE_Lag(RegressionPropsY, RegressionPropsVM):
 
         xb = spdot(self.x, b)
 
-        self.predy_e = inverse_prod(
-            Wsp_nt, xb, self.rho, inv_method="power_exp", threshold=epsilon
+        self.predy_e = _panel_long(
+            inverse_prod(
+                Wsp,
+                _panel_wide(xb, self.n, self.t),
+                self.rho,
+                inv_method="power_exp",
+                threshold=epsilon,
+            ),
+            self.n,
+            self.t,
         )
         self.e_pred = self.y - self.predy_e
 
@@ -146,26 +177,16 @@ class BasePanel_FE_Lag(RegressionPropsY, RegressionPropsVM):
         self._cache = {}
         self.sig2 = spdot(self.u.T, self.u) / (self.n * self.t)
 
-        # information matrix
-        a = -self.rho * W
-        spfill_diagonal(a, 1.0)
-        ai = spinv(a)
-        wai = spdot(Wsp, ai)
-        tr1 = wai.diagonal().sum()  # same for sparse and dense
-
-        wai2 = spdot(wai, wai)
-        tr2 = wai2.diagonal().sum()
-
-        waiTwai = spdot(wai.T, wai)
-        tr3 = waiTwai.diagonal().sum()
+        # information matrix, traces of W(I - rho W)^-1 from sparse LU solves
+        LU = SuperLU((I - self.rho * Wsp).tocsc())
+        trD, trDD, trDTD = sptrace_d(Wsp, [LU])
+        tr1, tr2, tr3 = trD[0, 0], trDD[0, 0], trDTD[0, 0]
 
-        wai_nt = sp.kron(sp.identity(self.t), wai, format="csr")
-        wpredy = spdot(wai_nt, xb)
+        wpredy = _panel_long(
+            Wsp @ LU.solve(_panel_wide(xb, self.n, self.t)), self.n, self.t
+        )
         xTwpy = spdot(x.T, wpredy)
-
-        waiTwai_nt = sp.kron(sp.identity(self.t), waiTwai, format="csr")
-        wTwpredy = spdot(waiTwai_nt, xb)
-        wpyTwpy = spdot(xb.T, wTwpredy)
+        wpyTwpy = spdot(wpredy.T, wpredy)
 
         # order of variables is beta, rho, sigma2
         v1 = np.vstack((xtx / self.sig2, xTwpy.T / self.sig2, np.zeros((1, self.k))))
@@ -206,6 +227,10 @@ class Panel_FE_Lag(BasePanel_FE_Lag):
                    variables, no constant
     w            : pysal W object
                    Spatial weights object
+    method       : string
+                   log Jacobian method
+                   if 'LU', LU sparse matrix decomposition (default)
+                   if 'ord', Ord eigenvalue method
     epsilon      : float
                    tolerance criterion in mimimize_scalar function and
                    inverse_product
@@ -314,6 +339,7 @@ class Panel_FE_Lag(BasePanel_FE_Lag):
         y,
         x,
         w,
+        method="LU",
         epsilon=0.0000001,
         vm=False,
         name_y=None,
@@ -328,7 +354,9 @@ class Panel_FE_Lag(BasePanel_FE_Lag):
         set_warn(self, warn)
         w = USER.check_weights(w, bigy, w_required=True, time=True)
 
-        BasePanel_FE_Lag.__init__(self, bigy, bigx, w, epsilon=epsilon)
+        BasePanel_FE_Lag.__init__(
+            self, bigy, bigx, w, method=method, epsilon=epsilon
+        )
         # increase by 1 to have correct aic and sc, include rho in count
         self.k += 1
         self.title = "MAXIMUM LIKELIHOOD SPATIAL LAG PANEL" + " - FIXED EFFECTS"
@@ -358,6 +386,10 @@ class BasePanel_FE_Error(RegressionPropsY, RegressionPropsVM):
                 (note: must already include constant term)
     w         : pysal W object
                 Spatial weights matrix
+    method    : string
+                log Jacobian method
+                if 'LU', LU sparse matrix decomposition (default)
+                if 'ord', Ord eigenvalue method
     epsilon   : float
                 tolerance criterion in mimimize_scalar function and
                 inverse_product
@@ -398,33 +430,46 @@ class BasePanel_FE_Error(RegressionPropsY, RegressionPropsVM):
                    maximized log-likelihood (including constant terms)
     """
 
-    def __init__(self, y, x, w, epsilon=0.0000001):
+    def __init__(self, y, x, w, method="LU", epsilon=0.0000001):
         # set up main regression variables and spatial filters
         self.n = w.n
         self.t = y.shape[0] // self.n
         self.k = x.shape[1]
         self.epsilon = epsilon
+        self.method = method
         # Demeaned variables
         self.y = demean_panel(y, self.n, self.t)
         self.x = demean_panel(x, self.n, self.t)
-        # Big W matrix
-        W = w.full()[0]
+        # W matrix, applied period by period
         Wsp = w.sparse
-        Wsp_nt = sp.kron(sp.identity(self.t), Wsp, format="csr")
         # lag dependent variable
-        ylag = spdot(Wsp_nt, self.y)
-        xlag = spdot(Wsp_nt, self.x)
+        ylag = panel_lag(Wsp, self.y, self.n, self.t)
+        xlag = panel_lag(Wsp, self.x, self.n, self.t)
 
-        # concentrated Log Likelihood
+        # concentrated Log Likelihood, t*ln|I - lam W| from one nxn operator
         I = sp.identity(self.n)
-        res = minimize_scalar(
-            err_c_loglik_sp,
-            0.0,
-            bounds=(-1.0, 1.0),
-            args=(self.n, self.t, self.y, ylag, self.x, xlag, I, Wsp),
-            method="bounded",
-            options={"xatol": epsilon},
-        )
+        methodML = method.upper()
+        if methodML == "LU":
+            res = minimize_scalar(
+                err_c_loglik_sp,
+                0.0,
+                bounds=(-1.0, 1.0),
+                args=(self.n, self.t, self.y, ylag, self.x, xlag, I, Wsp),
+                method="bounded",
+                options={"xatol": epsilon},
+            )
+        elif methodML == "ORD":
+            evals = spw_evals(w)
+            res = minimize_scalar(
+                err_c_loglik_ord,
+                0.0,
+                bounds=(-1.0, 1.0),
+                args=(self.n, self.t, self.y, ylag, self.x, xlag, evals),
+                method="bounded",
+                options={"xatol": epsilon},
+            )
+        else:
+            raise Exception("{0} is an unsupported method".format(method))
         self.lam = res.x
 
         # compute full log-likelihood
@@ -447,24 +492,16 @@ class BasePanel_FE_Error(RegressionPropsY, RegressionPropsVM):
         self.predy = self.y - self.u
 
         # residual variance
-        self.e_filtered = self.u - self.lam * spdot(Wsp_nt, self.u)
+        self.e_filtered = self.u - self.lam * panel_lag(Wsp, self.u, self.n, self.t)
         self.sig2 = spdot(self.e_filtered.T, self.e_filtered) / (self.n * self.t)
 
         # variance-covariance matrix betas
         varb = self.sig2 * xsxsi
 
         # variance-covariance matrix lambda, sigma
-        a = -self.lam * W
-        spfill_diagonal(a, 1.0)
-        ai = spinv(a)
-        wai = spdot(Wsp, ai)
-        tr1 = wai.diagonal().sum()
-
-        wai2 = spdot(wai, wai)
-        tr2 = wai2.diagonal().sum()
-
-        waiTwai = spdot(wai.T, wai)
-        tr3 = waiTwai.diagonal().sum()
+        LU = SuperLU((I - self.lam * Wsp).tocsc())
+        trD, trDD, trDTD = sptrace_d(Wsp, [LU])
+        tr1, tr2, tr3 = trD[0, 0], trDD[0, 0], trDTD[0, 0]
 
         v1 = np.vstack((self.t * (tr2 + tr3), self.t * tr1 / self.sig2))
         v2 = np.vstack(
@@ -498,6 +535,10 @@ class Panel_FE_Error(BasePanel_FE_Error):
                    variables, no constant
     w            : pysal W object
                    Spatial weights object
+    method       : string
+                   log Jacobian method
+                   if 'LU', LU sparse matrix decomposition (default)
+                   if 'ord', Ord eigenvalue method
     epsilon      : float
                    tolerance criterion in mimimize_scalar function and
                    inverse_product
@@ -601,6 +642,7 @@ class Panel_FE_Error(BasePanel_FE_Error):
         y,
         x,
         w,
+        method="LU",
         epsilon=0.0000001,
         vm=False,
         name_y=None,
@@ -615,7 +657,9 @@ class Panel_FE_Error(BasePanel_FE_Error):
         set_warn(self, warn)
         w = USER.check_weights(w, bigy, w_required=True, time=True)
 
-        BasePanel_FE_Error.__init__(self, bigy, bigx, w, epsilon=epsilon)
+        BasePanel_FE_Error.__init__(
+            self, bigy, bigx, w, method=method, epsilon=epsilon
+        )
         self.title = "MAXIMUM LIKELIHOOD SPATIAL ERROR PANEL" + " - FIXED EFFECTS"
         self.name_ds = USER.set_name_ds(name_ds)
         self.name_y = USER.set_name_y(name_y)
@@ -642,6 +686,18 @@ def lag_c_loglik_sp(rho, n, t, e0, e1, I, Wsp):
     return clike
 
 
+def lag_c_loglik_ord(rho, n, t, e0, e1, evals):
+    # concentrated log-lik for lag model, no constants, Ord eigenvalue method
+    er = e0 - rho * e1
+    sig2 = spdot(er.T, er)
+    nlsig2 = (n * t / 2.0) * np.log(sig2)
+    jacob = t * np.log(1 - rho * evals).sum()
+    if isinstance(jacob, complex):
+        jacob = jacob.real
+    clike = nlsig2 - jacob
+    return clike
+
+
 def err_c_loglik_sp(lam, n, t, y, ylag, x, xlag, I, Wsp):
     # concentrated log-lik for error model, no constants, LU
     if isinstance(lam, np.ndarray):
@@ -666,6 +722,27 @@ def err_c_loglik_sp(lam, n, t, y, ylag, x, xlag, I, Wsp):
     return clik
 
 
+def err_c_loglik_ord(lam, n, t, y, ylag, x, xlag, evals):
+    # concentrated log-lik for error model, no constants, Ord eigenvalue method
+    ys = y - lam * ylag
+    xs = x - lam * xlag
+    ysys = np.dot(ys.T, ys)
+    xsxs = np.dot(xs.T, xs)
+    xsxsi = la.inv(xsxs)
+    xsys = np.dot(xs.T, ys)
+    x1 = np.dot(xsxsi, xsys)
+    x2 = np.dot(xsys.T, x1)
+    ee = ysys - x2
+    sig2 = ee[0][0]
+    nlsig2 = (n * t / 2.0) * np.log(sig2)
+    jacob = t * np.log(1 - lam * evals).sum()
+    if isinstance(jacob, complex):
+        jacob = jacob.real
+    # this is the negative of the concentrated log lik for minimization
+    clik = nlsig2 - jacob
+    return clik
+
+
 def _test():
     import doctest
 
@@ -11,7 +11,7 @@ import numpy.linalg as la
 from scipy import sparse as sp
 from scipy.sparse.linalg import splu as SuperLU
 from .utils import RegressionPropsY, RegressionPropsVM, inverse_prod, set_warn
-from .sputils import spdot, spfill_diagonal, spinv
+from .sputils import spdot, spfill_diagonal, spw_evals, splogdet_spline, sptrace_d
 from spreg.w_utils import symmetrize
 from . import diagnostics as DIAG
 from . import user_output as USER
@@ -30,7 +30,14 @@ try:
 except ImportError:
     minimize_available = False
 
-from .panel_utils import check_panel, demean_panel
+from .panel_utils import (
+    check_panel,
+    demean_panel,
+    panel_lag,
+    panel_mean,
+    _panel_wide,
+    _panel_long,
+)
 
 __all__ = ["Panel_RE_Lag", "Panel_RE_Error"]
 
@@ -50,6 +57,16 @@ class BasePanel_RE_Lag(RegressionPropsY, RegressionPropsVM):
                 (note: must already include constant term)
     w         : pysal W object
                 Spatial weights matrix
+    method    : string
+                log Jacobian method
+                if 'LU', LU sparse matrix decomposition (default)
+                if 'ord', Ord eigenvalue method
+    joint     : boolean
+                if False (default), alternates searches over phi and rho
+                until phi converges; if True, searches over (rho, phi)
+                jointly with analytic gradients, using the eigenvalues of W
+                (method 'ord') or a cached grid of log determinants
+                (method 'LU') for the log Jacobian
     epsilon   : float
                 tolerance criterion in mimimize_scalar function and
                 inverse_product
@@ -95,31 +112,77 @@ class BasePanel_RE_Lag(RegressionPropsY, RegressionPropsVM):
                    predicted values from reduced form
     e_pred       : array
                    prediction errors using reduced form predicted values
+    niter        : integer
+                   Number of iterations of the search over rho and phi
+    nfev         : integer
+                   Number of evaluations of the concentrated log-likelihood
     """
 
-    def __init__(self, bigy, bigx, w, epsilon=0.0000001):
+    def __init__(
+        self, bigy, bigx, w, method="LU", joint=False, epsilon=0.0000001
+    ):
         # set up main regression variables and spatial filters
         self.n = w.n
         self.t = bigy.shape[0] // self.n
         self.k = bigx.shape[1]
         self.epsilon = epsilon
-        # Big W matrix
-        W = w.full()[0]
+        self.method = method
+        # W matrix, applied period by period
         Wsp = w.sparse
-        Wsp_nt = sp.kron(sp.identity(self.t), Wsp, format="csr")
         # Set up parameters
         converge = 1
         criteria = 0.0000001
         i = 0
         itermax = 100
+        nfev = 0
         self.rho = 0.1
         self.phi = 0.1
         I = sp.identity(self.n)
+        methodML = method.upper()
+        if methodML == "LU":
+            jac_args = (I, Wsp)
+            lag_c_loglik = lag_c_loglik_sp
+        elif methodML == "ORD":
+            # t*ln|I - rho W| from the eigenvalues of W, computed once
+            jac_args = (spw_evals(w),)
+            lag_c_loglik = lag_c_loglik_ord
+        else:
+            raise Exception("{0} is an unsupported method".format(method))
         xtx = spdot(bigx.T, bigx)
         xtxi = la.inv(xtx)
         xty = spdot(bigx.T, bigy)
         b = spdot(xtxi, xty)
 
+        if joint:
+            # rho and phi together, with beta and sigma2 concentrated out.
+            # Partial demeaning changes the cross products of z = [y, Wy, x]
+            # as z*'z* = z'z - (2(1 - phi) - (1 - phi)^2) zm'zm, where zm are
+            # the unit means, so evaluations do not touch the n*t data.
+            z = np.hstack((bigy, panel_lag(Wsp, bigy, self.n, self.t), bigx))
+            zm = panel_mean(z, self.n, self.t)
+            if methodML == "LU":
+                jac_fun, jac_data = _ldet_grid, splogdet_spline(w)
+            else:
+                jac_fun, jac_data = _ldet_ord, jac_args[0]
+            res = minimize(
+                lag_phi_c_loglik,
+                (self.rho, self.phi),
+                jac=True,
+                bounds=((-0.99, 0.99), (epsilon, 1.0)),
+                method="L-BFGS-B",
+                args=(
+                    self.n,
+                    self.t,
+                    spdot(z.T, z),
+                    spdot(zm.T, zm),
+                    jac_fun,
+                    jac_data,
+                ),
+                options={"ftol": epsilon * 1e-3, "gtol": epsilon},
+            )
+            self.rho, self.phi = res.x
+            i, nfev = res.nit, res.nfev
+            converge = 0.0
         # Iterative procedure
         while converge > criteria and i < itermax:
             phiold = self.phi
@@ -127,7 +190,7 @@ class BasePanel_RE_Lag(RegressionPropsY, RegressionPropsVM):
                 phi_c_loglik,
                 0.1,
                 bounds=(0.0, 1.0),
-                args=(self.rho, b, bigy, bigx, self.n, self.t, Wsp_nt),
+                args=(self.rho, b, bigy, bigx, self.n, self.t, Wsp),
                 method="bounded",
                 options={"xatol": epsilon},
             )
@@ -136,7 +199,7 @@ class BasePanel_RE_Lag(RegressionPropsY, RegressionPropsVM):
             self.y = demean_panel(bigy, self.n, self.t, phi=self.phi)
             self.x = demean_panel(bigx, self.n, self.t, phi=self.phi)
             # lag dependent variable
-            ylag = spdot(Wsp_nt, self.y)
+            ylag = panel_lag(Wsp, self.y, self.n, self.t)
             # b0, b1, e0 and e1
             xtx = spdot(self.x.T, self.x)
             xtxi = la.inv(xtx)
@@ -147,21 +210,38 @@ class BasePanel_RE_Lag(RegressionPropsY, RegressionPropsVM):
             e0 = self.y - spdot(self.x, b0)
             e1 = ylag - spdot(self.x, b1)
             res_rho = minimize_scalar(
-                lag_c_loglik_sp,
+                lag_c_loglik,
                 0.0,
                 bounds=(-1.0, 1.0),
-                args=(self.n, self.t, e0, e1, I, Wsp),
+                args=(self.n, self.t, e0, e1) + jac_args,
                 method="bounded",
                 options={"xatol": epsilon},
             )
             self.rho = res_rho.x[0][0]
             b = b0 - self.rho * b1
             i += 1
+            nfev += res_phi.nfev + res_rho.nfev
             converge = np.abs(phiold - self.phi)
+            clik = res_rho.fun
+        self.niter, self.nfev = i, nfev
+
+        if joint:
+            # Demeaned variables and concentrated values at (rho, phi)
+            self.y = demean_panel(bigy, self.n, self.t, phi=self.phi)
+            self.x = demean_panel(bigx, self.n, self.t, phi=self.phi)
+            ylag = panel_lag(Wsp, self.y, self.n, self.t)
+            xtx = spdot(self.x.T, self.x)
+            xtxi = la.inv(xtx)
+            b0 = spdot(xtxi, spdot(self.x.T, self.y))
+            b1 = spdot(xtxi, spdot(self.x.T, ylag))
+            e0 = self.y - spdot(self.x, b0)
+            e1 = ylag - spdot(self.x, b1)
+            b = b0 - self.rho * b1
+            clik = lag_c_loglik(self.rho, self.n, self.t, e0, e1, *jac_args)
 
         # compute full log-likelihood, including constants
         ln2pi = np.log(2.0 * np.pi)
-        llik = -res_rho.fun - (self.n * self.t) / 2.0 * ln2pi - (self.n * self.t) / 2.0
+        llik = -clik - (self.n * self.t) / 2.0 * ln2pi - (self.n * self.t) / 2.0
         self.logll = llik[0][0]
 
         # b, residuals and predicted values
@@ -170,8 +250,16 @@ class BasePanel_RE_Lag(RegressionPropsY, RegressionPropsVM):
         self.predy = self.y - self.u
         xb = spdot(self.x, b)
 
-        self.predy_e = inverse_prod(
-            Wsp_nt, xb, self.rho, inv_method="power_exp", threshold=epsilon
+        self.predy_e = _panel_long(
+            inverse_prod(
+                Wsp,
+                _panel_wide(xb, self.n, self.t),
+                self.rho,
+                inv_method="power_exp",
+                threshold=epsilon,
+            ),
+            self.n,
+            self.t,
         )
         self.e_pred = self.y - self.predy_e
 
@@ -179,26 +267,16 @@ class BasePanel_RE_Lag(RegressionPropsY, RegressionPropsVM):
         self._cache = {}
         self.sig2 = spdot(self.u.T, self.u) / (self.n * self.t)
 
-        # information matrix
-        a = -self.rho * W
-        spfill_diagonal(a, 1.0)
-        ai = spinv(a)
-        wai = spdot(W, ai)
-        tr1 = wai.diagonal().sum()  # same for sparse and dense
-
-        wai2 = spdot(wai, wai)
-        tr2 = wai2.diagonal().sum()
+        # information matrix, traces of W(I - rho W)^-1 from sparse LU solves
+        LU = SuperLU((I - self.rho * Wsp).tocsc())
+        trD, trDD, trDTD = sptrace_d(Wsp, [LU])
+        tr1, tr2, tr3 = trD[0, 0], trDD[0, 0], trDTD[0, 0]
 
-        waiTwai = spdot(wai.T, wai)
-        tr3 = waiTwai.diagonal().sum()
-
-        wai_nt = sp.kron(sp.identity(self.t), wai, format="csr")
-        wpredy = spdot(wai_nt, xb)
+        wpredy = _panel_long(
+            Wsp @ LU.solve(_panel_wide(xb, self.n, self.t)), self.n, self.t
+        )
         xTwpy = spdot(self.x.T, wpredy)
-
-        waiTwai_nt = sp.kron(sp.identity(self.t), waiTwai, format="csr")
-        wTwpredy = spdot(waiTwai_nt, xb)
-        wpyTwpy = spdot(xb.T, wTwpredy)
+        wpyTwpy = spdot(wpredy.T, wpredy)
 
         # order of variables is beta, rho, sigma2
         v1 = np.vstack((xtx / self.sig2, xTwpy.T / self.sig2, np.zeros((2, self.k))))
@@ -249,6 +327,14 @@ class Panel_RE_Lag(BasePanel_RE_Lag):
                    variables, excluding the constant
     w            : pysal W object
                    Spatial weights object
+    method       : string
+                   log Jacobian method
+                   if 'LU', LU sparse matrix decomposition (default)
+                   if 'ord', Ord eigenvalue method
+    joint        : boolean
+                   if False (default), alternates searches over phi and rho
+                   until phi converges; if True, searches over (rho, phi)
+                   jointly with analytic gradients
     epsilon      : float
                    tolerance criterion in mimimize_scalar function and
                    inverse_product
@@ -368,6 +454,8 @@ class Panel_RE_Lag(BasePanel_RE_Lag):
         y,
         x,
         w,
+        method="LU",
+        joint=False,
         epsilon=0.0000001,
         vm=False,
         name_y=None,
@@ -382,7 +470,9 @@ class Panel_RE_Lag(BasePanel_RE_Lag):
         set_warn(self, warn)
         w = USER.check_weights(w, bigy, w_required=True, time=True)
 
-        BasePanel_RE_Lag.__init__(self, bigy, bigx, w, epsilon=epsilon)
+        BasePanel_RE_Lag.__init__(
+            self, bigy, bigx, w, method=method, joint=joint, epsilon=epsilon
+        )
         # increase by 1 to have correct aic and sc, include rho in count
         self.k += 1
         self.title = "MAXIMUM LIKELIHOOD SPATIAL LAG PANEL" + " - RANDOM EFFECTS"
@@ -464,28 +554,26 @@ class BasePanel_RE_Error(RegressionPropsY, RegressionPropsVM):
         # Demeaned variables
         self.y = y
         self.x = x
-        # Big W matrix
-        W = w.full()[0]
+        # W matrix, applied period by period
         Wsp = w.sparse
-        Wsp_nt = sp.kron(sp.identity(self.t), Wsp, format="csr")
         # lag dependent variable
-        ylag = spdot(Wsp_nt, self.y)
-        xlag = spdot(Wsp_nt, self.x)
+        ylag = panel_lag(Wsp, self.y, self.n, self.t)
+        xlag = panel_lag(Wsp, self.x, self.n, self.t)
 
         # concentrated Log Likelihood
-        I = np.identity(self.n)
-        if w.asymmetry(intrinsic=False) == []:
-            ww = symmetrize(w)
-            WW = np.array(ww.todense())
-            evals, evecs = la.eigh(WW)
-            W = WW
+        symmetric = w.asymmetry(intrinsic=False) == []
+        if symmetric:
+            W = symmetrize(w)
+            evals, evecs = la.eigh(W.toarray())
         else:  # need dense here
-            evals, evecs = la.eig(W)
-        one = np.ones((self.t, 1))
-        J = (1 / self.t) * spdot(one, one.T)
-        Q = sp.kron(J, I, format="csr")
-        y_mean = spdot(Q, self.y)
-        x_mean = spdot(Q, self.x)
+            W = Wsp
+            evals, evecs = la.eig(w.full()[0])
+        # the random effects transformation only acts on the unit means,
+        # so their projections on the eigenvectors are computed once
+        z = np.hstack((self.y, self.x))
+        zlag = np.hstack((ylag, xlag))
+        z_mean = panel_mean(z, self.n, self.t)[: self.n]
+        ez_mean = spdot(evecs.T, z_mean)
         res = minimize(
             err_c_loglik_ord,
             (0.0, 0.1),
@@ -493,17 +581,13 @@ class BasePanel_RE_Error(RegressionPropsY, RegressionPropsVM):
             method="L-BFGS-B",
             args=(
                 evals,
-                evecs,
                 self.n,
                 self.t,
-                self.y,
-                self.x,
-                ylag,
-                xlag,
-                y_mean,
-                x_mean,
-                I,
-                Wsp,
+                z,
+                zlag,
+                z_mean,
+                ez_mean,
+                spdot(Wsp, z_mean),
             ),
         )
         self.lam, self.phi = res.x
@@ -515,14 +599,18 @@ class BasePanel_RE_Error(RegressionPropsY, RegressionPropsVM):
         )
 
         # b, residuals and predicted values
-        cvals = self.t * self.phi**2 + 1 / (1 - self.lam * evals) ** 2
-        P = spdot(np.diag(cvals ** (-0.5)), evecs.T)
-        pr = P - (I - self.lam * W)
-        pr_nt = sp.kron(sp.identity(self.t), pr, format="csr")
-        yrand = self.y + spdot(pr_nt, y_mean)
-        xrand = self.x + spdot(pr_nt, x_mean)
-        ys = yrand - self.lam * ylag
-        xs = xrand - self.lam * xlag
+        zs = _re_transform(
+            self.lam,
+            self.phi,
+            evals,
+            self.t,
+            z,
+            zlag,
+            z_mean,
+            ez_mean,
+            spdot(W, z_mean),
+        )
+        ys, xs = zs[:, :1], zs[:, 1:]
         xsxs = spdot(xs.T, xs)
         xsxsi = la.inv(xsxs)
         xsys = spdot(xs.T, ys)
@@ -543,29 +631,47 @@ class BasePanel_RE_Error(RegressionPropsY, RegressionPropsVM):
         self.betas = np.vstack((b, self.lam, self.sig2_u))
 
         # variance-covariance matrix lambda, sigma
-        a = -self.lam * W
-        spfill_diagonal(a, 1.0)
-        aTai = la.inv(spdot(a.T, a))
-        wa_aw = spdot(W.T, a) + spdot(a.T, W)
-        gamma = spdot(wa_aw, aTai)
-        vi = la.inv(self.t * self.phi * I + aTai)
-        sigma = spdot(vi, aTai)
-
-        tr1 = gamma.diagonal().sum()
-        tr2 = vi.diagonal().sum()
-        tr3 = sigma.diagonal().sum()
-
-        sigma_gamma = spdot(sigma, gamma)
-        tr4 = sigma_gamma.diagonal().sum()
-
-        sigma_vi = spdot(sigma, vi)
-        tr5 = sigma_vi.diagonal().sum()
-
-        sigma_gamma_vi = spdot(sigma_gamma, vi)
-        tr6 = sigma_gamma_vi.diagonal().sum()
-
-        sigma_gamma_sigma = spdot(sigma_gamma, sigma)
-        tr7 = sigma_gamma_sigma.diagonal().sum()
+        if symmetric:
+            # all matrices are functions of W = V diag(evals) V', so their
+            # traces are sums over the eigenvalues
+            a = 1 - self.lam * evals
+            aTai = 1 / a**2
+            gamma = 2 * evals / a
+            vi = 1 / (self.t * self.phi + aTai)
+            sigma = vi * aTai
+            tr1 = gamma.sum()
+            tr2 = vi.sum()
+            tr3 = sigma.sum()
+            tr4 = (sigma * gamma).sum()
+            tr5 = (sigma * vi).sum()
+            tr6 = (sigma * gamma * vi).sum()
+            tr7 = (sigma * gamma * sigma).sum()
+        else:
+            W = w.full()[0]
+            I = np.identity(self.n)
+            a = -self.lam * W
+            spfill_diagonal(a, 1.0)
+            aTai = la.inv(spdot(a.T, a))
+            wa_aw = spdot(W.T, a) + spdot(a.T, W)
+            gamma = spdot(wa_aw, aTai)
+            vi = la.inv(self.t * self.phi * I + aTai)
+            sigma = spdot(vi, aTai)
+
+            tr1 = gamma.diagonal().sum()
+            tr2 = vi.diagonal().sum()
+            tr3 = sigma.diagonal().sum()
+
+            sigma_gamma = spdot(sigma, gamma)
+            tr4 = sigma_gamma.diagonal().sum()
+
+            sigma_vi = spdot(sigma, vi)
+            tr5 = sigma_vi.diagonal().sum()
+
+            sigma_gamma_vi = spdot(sigma_gamma, vi)
+            tr6 = sigma_gamma_vi.diagonal().sum()
+
+            sigma_gamma_sigma = spdot(sigma_gamma, sigma)
+            tr7 = sigma_gamma_sigma.diagonal().sum()
 
         v1 = np.vstack(
             (
@@ -775,12 +881,54 @@ def lag_c_loglik_sp(rho, n, t, e0, e1, I, Wsp):
     return clike
 
 
-def phi_c_loglik(phi, rho, beta, bigy, bigx, n, t, W_nt):
+def lag_c_loglik_ord(rho, n, t, e0, e1, evals):
+    # concentrated log-lik for lag model, no constants, Ord eigenvalue method
+    er = e0 - rho * e1
+    sig2 = spdot(er.T, er) / (n * t)
+    nlsig2 = (n * t / 2.0) * np.log(sig2)
+    jacob = t * np.log(1 - rho * evals).sum()
+    if isinstance(jacob, complex):
+        jacob = jacob.real
+    clike = nlsig2 - jacob
+    return clike
+
+
+def lag_phi_c_loglik(rho_phi, n, t, zz, zzm, jac_fun, jac_data):
+    # concentrated log-lik for lag model, no constants, as a joint function
+    # of rho and phi, with its gradient. zz and zzm are the cross products of
+    # z = [y, Wy, x] and of their unit means; by the envelope theorem only
+    # the residuals e = z*d, d = [1, -rho, -b], enter the gradient
+    rho, phi = rho_phi
+    theta = 1 - phi
+    c = zz - (2 * theta - theta**2) * zzm
+    b = la.solve(c[2:, 2:], c[2:, 0] - rho * c[2:, 1])
+    d = np.hstack(([1.0, -rho], -b))
+    ee = d @ c @ d
+    ldet, dldet = jac_fun(rho, jac_data)
+    nt = n * t
+    clik = (nt / 2.0) * np.log(ee / nt) - (n / 2.0) * np.log(phi**2) - t * ldet
+    drho = -nt * (d @ c[:, 1]) / ee - t * dldet
+    dphi = nt * phi * (d @ zzm @ d) / ee - n / phi
+    return clik, np.array([drho, dphi])
+
+
+def _ldet_ord(rho, evals):
+    # log determinant of I - rho W and its derivative, from the eigenvalues
+    a = 1 - rho * evals
+    return np.log(a).sum().real, -(evals / a).sum().real
+
+
+def _ldet_grid(rho, grid):
+    # log determinant of I - rho W and its derivative, from a cubic spline
+    return float(grid(rho)), float(grid(rho, 1))
+
+
+def phi_c_loglik(phi, rho, beta, bigy, bigx, n, t, Wsp):
     # Demeaned variables
     y = demean_panel(bigy, n, t, phi=phi)
     x = demean_panel(bigx, n, t, phi=phi)
     # Lag dependent variable
-    ylag = spdot(W_nt, y)
+    ylag = panel_lag(Wsp, y, n, t)
     er = y - rho * ylag - spdot(x, beta)
     sig2 = spdot(er.T, er)
     nlsig2 = (n * t / 2.0) * np.log(sig2)
@@ -789,20 +937,22 @@ def phi_c_loglik(phi, rho, beta, bigy, bigx, n, t, W_nt):
     return clike
 
 
-def err_c_loglik_ord(
-    lam_phi, evals, evecs, n, t, bigy, bigx, ylag, xlag, y_mean, x_mean, I, Wsp
-):
+def _re_transform(lam, phi, evals, t, z, zlag, z_mean, ez_mean, wz_mean):
+    # random effects spatial error transformation of the n*tx(k+1) data z,
+    # [I_t kron (P - (I - lam W))] applied to the unit means plus the spatial
+    # filter, with P = diag(cvals^-1/2) evecs'. ez_mean and wz_mean are
+    # evecs'z_mean and W z_mean, so no nxn matrix is formed
+    cvals = t * phi**2 + 1 / (1 - lam * evals) ** 2
+    pr_mean = (cvals ** (-0.5))[:, None] * ez_mean - z_mean + lam * wz_mean
+    return z + np.tile(pr_mean, (t, 1)) - lam * zlag
+
+
+def err_c_loglik_ord(lam_phi, evals, n, t, z, zlag, z_mean, ez_mean, wz_mean):
     # concentrated log-lik for error model, no constants, eigenvalues
     lam, phi = lam_phi
-    cvals = t * phi**2 + 1 / (1 - lam * evals) ** 2
-    P = spdot(np.diag(cvals ** (-0.5)), evecs.T)
-    pr = P - (I - lam * Wsp)
-    pr_nt = sp.kron(sp.identity(t), pr, format="csr")
     # Term 1
-    yrand = bigy + spdot(pr_nt, y_mean)
-    xrand = bigx + spdot(pr_nt, x_mean)
-    ys = yrand - lam * ylag
-    xs = xrand - lam * xlag
+    zs = _re_transform(lam, phi, evals, t, z, zlag, z_mean, ez_mean, wz_mean)
+    ys, xs = zs[:, :1], zs[:, 1:]
     ysys = np.dot(ys.T, ys)
     xsxs = np.dot(xs.T, xs)
     xsxsi = la.inv(xsxs)
@@ -11,7 +11,7 @@ import pandas as pd
 from scipy import sparse as sp
 from .sputils import spdot
 
-__all__ = ["check_panel", "demean_panel"]
+__all__ = ["check_panel", "demean_panel", "panel_lag", "panel_mean"]
 
 
 def check_panel(y, x, w, name_y, name_x):
@@ -101,6 +101,105 @@ def check_panel(y, x, w, name_y, name_x):
     return bigy, bigx, name_y, name_x, warn
 
 
+def _panel_wide(arr, n, t):
+    """
+    Reshapes a long-format (n*t)xk array into an nx(t*k) array with one
+    row per cross-sectional unit.
+    """
+    k = arr.shape[1]
+    return np.asarray(arr).reshape((t, n, k)).transpose((1, 0, 2)).reshape((n, t * k))
+
+
+def _panel_long(arr, n, t):
+    """
+    Inverse of _panel_wide: reshapes an nx(t*k) array back into a long-format
+    (n*t)xk array.
+    """
+    k = arr.shape[1] // t
+    return np.asarray(arr).reshape((n, t, k)).transpose((1, 0, 2)).reshape((n * t, k))
+
+
+def panel_lag(w, arr, n, t):
+    """
+    Applies (I_t kron W) to a long-format array without building the
+    Kronecker product.
+
+    Parameters
+    ----------
+    w           : pysal W object, sparse matrix or array
+                  nxn spatial operator (e.g. W, or a dense function of W)
+    arr         : array or sparse matrix
+                  n*txk array
+    n           : integer
+                  Number of observations
+    t           : integer
+                  Number of time periods
+
+    Returns
+    -------
+    arr_lag     : array
+                  n*txk array with the operator applied to each period
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> import libpysal
+    >>> from scipy import sparse as sp
+    >>> from spreg.panel_utils import panel_lag
+    >>> w = libpysal.weights.lat2W(3, 3)
+    >>> y = np.arange(18.0).reshape((18, 1))
+    >>> Wnt = sp.kron(sp.identity(2), w.sparse)
+    >>> np.allclose(panel_lag(w, y, 9, 2), Wnt @ y)
+    True
+    """
+    try:
+        ws = w.sparse
+    except AttributeError:
+        ws = w if sp.issparse(w) else np.asarray(w)
+    if t == 1:
+        return spdot(ws, arr)
+    if sp.issparse(arr):
+        arr = arr.tocsr()
+        return sp.vstack(
+            [
+                spdot(ws, arr[i * n : (i + 1) * n], array_out=False)
+                for i in range(t)
+            ],
+            format="csr",
+        )
+    return _panel_long(spdot(ws, _panel_wide(arr, n, t)), n, t)
+
+
+def panel_mean(arr, n, t):
+    """
+    Applies the between projection (J_t/t kron I_n) to a long-format array,
+    i.e. replaces each observation by the time mean of its unit, using
+    O(n*t) memory.
+
+    Parameters
+    ----------
+    arr         : array or sparse matrix
+                  n*txk array
+    n           : integer
+                  Number of observations
+    t           : integer
+                  Number of time periods
+
+    Returns
+    -------
+    arr_mean    : array
+                  n*txk array of unit means repeated over the t periods
+    """
+    if sp.issparse(arr):
+        arr = arr.tocsr()
+        means = sum(arr[i * n : (i + 1) * n] for i in range(t)) / t
+        return sp.vstack([means] * t, format="csr")
+    arr = np.asarray(arr)
+    k = arr.shape[1]
+    means = arr.reshape((t, n, k)).mean(axis=0)
+    return np.tile(means, (t, 1))
+
+
 def demean_panel(arr, n, t, phi=0):
     """
     Returns demeaned variable.
@@ -124,9 +223,6 @@ def demean_panel(arr, n, t, phi=0):
                   Demeaned variable
     """
 
-    one = np.ones((t, 1))
-    J = sp.identity(t) - (1 - phi) * (1 / t) * spdot(one, one.T)
-    Q = sp.kron(J, sp.identity(n), format="csr")
-    arr_dm = spdot(Q, arr)
+    arr_dm = arr - (1 - phi) * panel_mean(arr, n, t)
 
     return arr_dm
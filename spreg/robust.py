@@ -4,7 +4,7 @@ __author__ = "Luc Anselin lanselin@gmail.com, \
 
 import numpy as np
 import numpy.linalg as la
-from libpysal.weights.spatial_lag import lag_spatial
+from scipy.sparse import issparse, csr_array
 from .utils import spdot, spbroadcast
 from .user_output import check_constant
 
@@ -19,7 +19,7 @@ def robust_vm(reg, gwk=None, sig2n_k=False):
     reg             : Regression object (OLS or TSLS)
                       output instance from a regression model
 
-    gwk             : PySAL weights object
+    gwk             : PySAL weights object, sparse array or KernelOperator
                       Optional. Spatial weights based on kernel functions
                       If provided, returns the HAC variance estimation
     sig2n_k         : boolean
@@ -98,27 +98,216 @@ def robust_vm(reg, gwk=None, sig2n_k=False):
            [-0.02810131, -0.01364908, -0.00318197,  0.00713251]])
 
     """
-    if hasattr(reg, "h"):  # If reg has H, do 2SLS estimator. OLS otherwise.
-        tsls = True
-        xu = spbroadcast(reg.h, reg.u)
-    else:
-        tsls = False
-        xu = spbroadcast(reg.x, reg.u)
+    return robust_vm_multi([reg], gwk=gwk, sig2n_k=sig2n_k)[0]
 
-    if gwk:  # If gwk do HAC. White otherwise.
-        gwkxu = lag_spatial(gwk, xu)
-        psi0 = spdot(xu.T, gwkxu)
-    else:
-        psi0 = spdot(xu.T, xu)
-        if sig2n_k:
-            psi0 = psi0 * (1.0 * reg.n / (reg.n - reg.k))
-    if tsls:
-        psi1 = spdot(reg.varb, reg.zthhthi)
-        psi = spdot(psi1, np.dot(psi0, psi1.T))
+
+def robust_vm_multi(regs, gwk=None, sig2n_k=False):
+    """
+    Robust variance-covariance matrices for several regressions, e.g., the
+    specifications fitted on the same observations. With HAC, the scores of
+    all the regressions are multiplied by the kernel weights in one sparse
+    times dense block product.
+
+    Parameters
+    ----------
+
+    regs            : list of regression objects (OLS or TSLS)
+                      output instances from regression models
+    gwk             : PySAL weights object, sparse array or KernelOperator
+                      Optional. Spatial weights based on kernel functions
+                      If provided, returns the HAC variance estimation
+    sig2n_k         : boolean
+                      If True, then use n-k to rescale the vc matrix.
+                      If False, use n. (White only)
+
+    Returns
+    --------
+
+    psis            : list of kxk arrays
+                      Robust estimation of the variance-covariance for
+                      each regression
+
+    """
+    xus = []
+    for reg in regs:
+        if hasattr(reg, "h"):  # If reg has H, do 2SLS estimator. OLS otherwise.
+            xus.append(spbroadcast(reg.h, reg.u))
+        else:
+            xus.append(spbroadcast(reg.x, reg.u))
+
+    if gwk is not None:  # If gwk do HAC. White otherwise.
+        psi0s = _kernel_operator(gwk).meat(xus)
     else:
-        psi = spdot(reg.xtxi, np.dot(psi0, reg.xtxi))
+        psi0s = []
+        for reg, xu in zip(regs, xus):
+            psi0 = spdot(xu.T, xu)
+            if sig2n_k:
+                psi0 = psi0 * (1.0 * reg.n / (reg.n - reg.k))
+            psi0s.append(psi0)
+    psis = []
+    for reg, psi0 in zip(regs, psi0s):
+        if hasattr(reg, "h"):
+            psi1 = spdot(reg.varb, reg.zthhthi)
+            psis.append(spdot(psi1, np.dot(psi0, psi1.T)))
+        else:
+            psis.append(spdot(reg.xtxi, np.dot(psi0, reg.xtxi)))
+
+    return psis
+
+
+class KernelOperator:
+    """
+    Kernel weights for HAC as a reusable linear operator. The weights are
+    converted once to a CSR array in the working precision, and the HAC
+    meat matrices (X'u)'K(X'u) for many sets of scores, e.g., many residual
+    vectors or many specifications, are obtained from a single sparse times
+    dense block product, processed in blocks of at most maxsize elements.
+
+    A KernelOperator can be passed as gwk to the regression classes. When a
+    PySAL weights object is passed as gwk, its operator is cached on the
+    weights object and reused by all the regressions that use it.
+
+    Parameters
+    ----------
 
-    return psi
+    gwk             : PySAL weights object, sparse array or KernelOperator
+                      Spatial weights based on kernel functions
+    dtype           : numpy dtype
+                      Precision of the products and of their accumulation,
+                      np.float32 halves the memory traffic for large n;
+                      results are returned in double precision
+    maxsize         : int
+                      Maximum number of elements of the dense blocks
+
+    Attributes
+    ----------
+
+    sparse          : CSR sparse array
+                      Kernel weights in the working precision
+    n               : int
+                      Number of observations
+    dtype           : numpy dtype
+                      Working precision
+
+    Examples
+    --------
+
+    >>> import numpy as np
+    >>> import libpysal
+    >>> from spreg.robust import KernelOperator
+    >>> from spreg.utils import make_wk
+    >>> db = libpysal.io.open(libpysal.examples.get_path("columbus.dbf"), "r")
+    >>> coords = np.array([db.by_col("X"), db.by_col("Y")]).T
+    >>> x = np.hstack((np.ones((49, 1)), np.array(db.by_col("INC")).reshape(-1, 1)))
+    >>> u = np.random.default_rng(12345).normal(size=(49, 100))
+    >>> op = KernelOperator(make_wk(coords, k=5, fixed=False))
+    >>> op.meat(x, u).shape
+    (100, 2, 2)
+
+    """
+
+    def __init__(self, gwk, dtype=np.float64, maxsize=2**26):
+        if isinstance(gwk, KernelOperator):
+            gwk = gwk.sparse
+        elif not issparse(gwk):
+            gwk = gwk.sparse
+        self.dtype = np.dtype(dtype)
+        self.sparse = csr_array(gwk, dtype=self.dtype)
+        self.n = self.sparse.shape[0]
+        self.maxsize = maxsize
+
+    def lag(self, z):
+        """
+        Product of the kernel weights and an n x m array z.
+        """
+        if issparse(z):
+            return self.sparse @ z.astype(self.dtype)
+        return self.sparse @ np.asarray(z, dtype=self.dtype)
+
+    def meat(self, x, u=None):
+        """
+        HAC meat matrices.
+
+        Parameters
+        ----------
+
+        x           : array or list of arrays
+                      With u, n x k array of variables; without u, n x k
+                      array of scores (variables times residuals) or list
+                      of such arrays
+        u           : array
+                      Optional. n x m array with m residual vectors
+
+        Returns
+        --------
+
+        psi0        : array or list of arrays
+                      With u, m x k x k array with the meat matrix of each
+                      residual vector; without u, k x k array (or list of
+                      arrays) with the meat matrix of the scores
+        """
+        if u is None:
+            if isinstance(x, (list, tuple)):
+                return self._meat_list(list(x))
+            return self._meat_list([x])[0]
+        n = self.n
+        u = np.asarray(u).reshape(n, -1)
+        m = u.shape[1]
+        if issparse(x):
+            return np.array(
+                self._meat_list([spbroadcast(x, u[:, j : j + 1]) for j in range(m)])
+            )
+        x = np.asarray(x, dtype=self.dtype)
+        k = x.shape[1]
+        psi0 = np.empty((m, k, k))
+        step = max(1, self.maxsize // (n * k))
+        for j in range(0, m, step):
+            mj = min(step, m - j)
+            xu = u[:, j : j + mj].astype(self.dtype)[:, :, None] * x[:, None, :]
+            gxu = (self.sparse @ xu.reshape(n, mj * k)).reshape(n, mj, k)
+            psi0[j : j + mj] = np.matmul(xu.transpose(1, 2, 0), gxu.transpose(1, 0, 2))
+        return psi0
+
+    def _meat_list(self, xus):
+        psi0s = [None] * len(xus)
+        dense = []
+        for i, xu in enumerate(xus):
+            if issparse(xu):
+                psi0s[i] = np.asarray((xu.T @ self.lag(xu)).toarray(), dtype=float)
+            else:
+                dense.append(i)
+        # dense scores are stacked in blocks of columns, one product per block
+        while dense:
+            block, size = [], 0
+            while dense and (
+                not block or size + self.n * xus[dense[0]].shape[1] <= self.maxsize
+            ):
+                size += self.n * xus[dense[0]].shape[1]
+                block.append(dense.pop(0))
+            xu = np.hstack([np.asarray(xus[i], dtype=self.dtype) for i in block])
+            gxu = self.sparse @ xu
+            col = 0
+            for i in block:
+                k = xus[i].shape[1]
+                psi0s[i] = np.asarray(
+                    xu[:, col : col + k].T @ gxu[:, col : col + k], dtype=float
+                )
+                col += k
+        return psi0s
+
+
+def _kernel_operator(gwk):
+    """
+    KernelOperator for gwk, cached on PySAL weights objects.
+    """
+    if isinstance(gwk, KernelOperator):
+        return gwk
+    cache = getattr(gwk, "_cache", None)
+    if cache is None:
+        return KernelOperator(gwk)
+    if "spreg_kernel_op" not in cache:
+        cache["spreg_kernel_op"] = KernelOperator(gwk)
+    return cache["spreg_kernel_op"]
 
 
 def hac_multi(reg, gwk, constant=False):
@@ -131,7 +320,7 @@ def hac_multi(reg, gwk, constant=False):
     reg             : Regression object (OLS or TSLS)
                       output instance from a regression model
 
-    gwk             : PySAL weights object
+    gwk             : PySAL weights object, sparse array or KernelOperator
                       Spatial weights based on kernel functions
 
     Returns
@@ -144,8 +333,7 @@ def hac_multi(reg, gwk, constant=False):
     if not constant:
         reg.hac_var = check_constant(reg.hac_var)
     xu = spbroadcast(reg.hac_var, reg.u)
-    gwkxu = lag_spatial(gwk, xu)
-    psi0 = spdot(xu.T, gwkxu)
+    psi0 = _kernel_operator(gwk).meat(xu)
     counter = 0
     for m in reg.multi:
         reg.multi[m].robust = "hac"
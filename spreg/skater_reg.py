@@ -3,6 +3,7 @@
 __author__ = "Luc Anselin anselin@uchicago.edu, Pedro Amaral pedroamaral@cedeplar.ufmg.br, Levi Wolf levi.john.wolf@bristol.ac.uk"
 
 from scipy.sparse import csgraph as cg
+import scipy.sparse as SP
 from scipy.optimize import OptimizeWarning
 from collections import namedtuple
 from warnings import warn
@@ -10,7 +11,7 @@ from libpysal.weights import w_subset
 from .utils import set_endog
 import time
 import numpy as np
-import copy
+import multiprocessing as mp
 
 try:
     from sklearn.metrics import euclidean_distances
@@ -161,6 +162,7 @@ class Skater_reg(object):
         else:
             metric = dissimilarity
         self.metric = metric
+        self._affinity = affinity
         self.reduction = reduction
         self.center = center
 
@@ -180,6 +182,7 @@ class Skater_reg(object):
         islands="increase",
         verbose=False,
         model_family="spreg",
+        workers=None,
     ):
         """
         Method that fits a model with a particular estimation routine.
@@ -206,6 +209,8 @@ class Skater_reg(object):
                        in terms of print statements or progressbars.
         model_family : string describing the fFamily of estimation method used for the regression.
                        Must be either 'spreg' (default) or 'statsmodels'
+        workers      : int with the number of processes used to score candidate cuts.
+                       Default: None, candidates are scored sequentially.
 
         Returns
         -------
@@ -213,18 +218,20 @@ class Skater_reg(object):
         """
         if trace:
             self._trace = []
-        if data is None:
-            attribute_kernel = np.ones((W.n, W.n))
-            data = np.ones((W.n, 1))
-        else:
-            attribute_kernel = self.metric(data)
         W.transform = "b"
         W = W.sparse
         start = time.time()
 
         super_verbose = verbose > 1
         start_W = time.time()
-        dissim = W.multiply(attribute_kernel)
+        if data is None:
+            data = np.ones((W.shape[0], 1))
+            dissim = W.copy()
+        elif self._affinity is not None:
+            dissim = W.multiply(self.metric(data))
+        else:
+            # only the dissimilarities along the edges of W are needed
+            dissim = _edge_dissimilarity(self.metric, data, W)
         dissim.eliminate_zeros()
         end_W = time.time() - start_W
 
@@ -279,52 +286,64 @@ class Skater_reg(object):
             if super_verbose:
                 print(self._trace[-1])
         trees_scores = None
+        # best cut of each tree, keyed by its root, kept while the tree is not cut
+        cut_cache = {}
         prev_score = np.inf
-        while current_n_subtrees < n_clusters:  # while we don't have enough regions
-            (
-                best_deletion,
-                trees_scores,
-                new_MSF,
-                current_n_subtrees,
-                current_labels,
-            ) = self.find_cut(
-                MSF,
-                data,
-                data_reg,
-                current_n_subtrees,
-                current_labels,
-                quorum=quorum,
-                trees_scores=trees_scores,
-                labels=None,
-                target_label=None,
-                verbose=verbose,
-                model_family=model_family,
-            )
+        # one pool of workers scores the candidate cuts of every step
+        pool = mp.Pool(workers) if workers is not None and workers > 1 else None
+        try:
+            while current_n_subtrees < n_clusters:  # while we don't have enough regions
+                (
+                    best_deletion,
+                    trees_scores,
+                    new_MSF,
+                    current_n_subtrees,
+                    current_labels,
+                ) = self.find_cut(
+                    MSF,
+                    data,
+                    data_reg,
+                    current_n_subtrees,
+                    current_labels,
+                    quorum=quorum,
+                    trees_scores=trees_scores,
+                    labels=None,
+                    target_label=None,
+                    verbose=verbose,
+                    model_family=model_family,
+                    cache=cut_cache,
+                    workers=workers,
+                    pool=pool,
+                )
 
-            if np.isfinite(best_deletion.score):  # if our search succeeds
-                # accept the best move as *the* move
-                if super_verbose:
-                    print("cut made {}...".format(best_deletion))
-                if best_deletion.score > prev_score:
-                    raise ValueError(
-                        ("The score increased with the number of clusters. "
-                            "Please check your data.\nquorum: {}; n_clusters: {}"
-                        ).format(quorum, n_clusters)
+                if np.isfinite(best_deletion.score):  # if our search succeeds
+                    # accept the best move as *the* move
+                    if super_verbose:
+                        print("cut made {}...".format(best_deletion))
+                    if best_deletion.score > prev_score:
+                        raise ValueError(
+                            ("The score increased with the number of clusters. "
+                                "Please check your data.\nquorum: {}; n_clusters: {}"
+                            ).format(quorum, n_clusters)
+                        )
+                    prev_score = best_deletion.score
+                    MSF = new_MSF
+                else:  # otherwise, it means the MSF admits no further cuts
+                    prev_n_subtrees, _ = cg.connected_components(MSF, directed=False)
+                    warn(
+                        "MSF contains no valid moves after finding {} subtrees. "
+                        "Decrease the size of your quorum to find the remaining {} subtrees.".format(
+                            prev_n_subtrees, n_clusters - prev_n_subtrees
+                        ),
+                        OptimizeWarning,
+                        stacklevel=2,
                     )
-                prev_score = best_deletion.score
-                MSF = new_MSF
-            else:  # otherwise, it means the MSF admits no further cuts
-                prev_n_subtrees, _ = cg.connected_components(MSF, directed=False)
-                warn(
-                    "MSF contains no valid moves after finding {} subtrees. "
-                    "Decrease the size of your quorum to find the remaining {} subtrees.".format(
-                        prev_n_subtrees, n_clusters - prev_n_subtrees
-                    ),
-                    OptimizeWarning,
-                    stacklevel=2,
-                )
-            if trace:
-                self._trace.append((current_labels, best_deletion))
+                if trace:
+                    self._trace.append((current_labels, best_deletion))
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
 
         self.current_labels_ = current_labels
         self.minimum_spanning_forest_ = MSF
@@ -551,6 +570,9 @@ class Skater_reg(object):
         make=False,
         verbose=False,
         model_family="spreg",
+        cache=None,
+        workers=None,
+        pool=None,
     ):
         """
         Find the best cut from the MSF.
@@ -576,6 +598,16 @@ class Skater_reg(object):
         make: bool, whether or not to modify the input MSF in order to make the best cut that was found.
         verbose: bool/int, denoting how much output to provide to the user, in terms
                  of print statements or progressbars
+        model_family: string, either 'spreg' (default) or 'statsmodels'.
+        cache: optional dict with the best cut of each tree, keyed by the tree's root (lowest node).
+               Trees found in it are not searched again, and the entry of the tree that is cut is
+               dropped. Only trees whose score is in trees_scores are cached, as otherwise their
+               candidates are not scored relative to the tree alone.
+        workers: int, number of processes used to score the candidate cuts. Default: None, sequential.
+        pool: optional multiprocessing Pool with the workers, reused across calls. If None and workers > 1,
+              a pool is created for this call.
+
+        Ties between candidate cuts are broken in favor of the lowest (in_node, out_node) edge.
 
         Returns a namedtuple with in_node, out_node, and score.
         """
@@ -602,8 +634,6 @@ class Skater_reg(object):
                 return noop
 
         zero_in = (labels is not None) and (target_label is not None)
-        best_deletion = deletion(np.nan, np.nan, np.inf)
-        best_d_score = -np.inf
 
         try:
             if data_reg["reg"].__name__ == "GM_Lag" or data_reg["reg"].__name__ == "BaseGM_Lag":
@@ -615,68 +645,318 @@ class Skater_reg(object):
             old_score = sum(trees_scores.values())
         except:
             pass
-        best_scores = {}
-        current_list = current_labels.tolist()
-        for in_node, out_node in tqdm(
-            np.vstack(MSF.nonzero()).T, desc="finding cut..."
-        ):  # iterate over MSF edges
-            if zero_in:
-                if labels[in_node] != target_label:
-                    continue
-
-            local_MSF = copy.deepcopy(MSF)
-            # delete a candidate edge
-            local_MSF[in_node, out_node] = 0
-            local_MSF.eliminate_zeros()
-            current_tree = current_labels[in_node]
-
-            # get the connected components
-            local_n_subtrees, local_labels = cg.connected_components(
-                local_MSF, directed=False
-            )
-
-            if local_n_subtrees <= current_n_subtrees:
-                raise Exception("Malformed MSF!")
-
-            # compute the score of these components
-            if model_family == "spreg":
-                new_score, new_trees_scores = self.score_spreg(
-                    data, data_reg, local_labels, quorum, current_labels, current_tree
-                )
-            elif model_family == "statsmodels":
-                new_score, new_trees_scores = self.score_stats(
-                    data, data_reg, local_labels, quorum, current_labels, current_tree
-                )
+        if trees_scores is None:
+            trees_scores_ = {}
+        else:
+            trees_scores_ = trees_scores
+        if cache is None:
+            cache = {}
+        forest = _dfs_forest(MSF, current_labels, current_n_subtrees)
+        order, position, size, parent, roots = forest
+        moments = None
+        if (
+            model_family == "spreg"
+            and data_reg is not None
+            and data_reg["reg"].__name__ in {"OLS", "BaseOLS"}
+            and "yend" not in data_reg
+        ):
+            # the OLS fit of any subtree follows from its cross products
+            moments = _ols_moments(data_reg["y"], data_reg["x"], order)
+
+        # candidate edges in (in_node, out_node) order, skipping trees with a cached cut
+        edges = np.vstack(MSF.nonzero()).T
+        edges = edges[np.lexsort((edges[:, 1], edges[:, 0]))]
+        if zero_in:
+            edges = edges[labels[edges[:, 0]] == target_label]
+        cached = np.isin(roots[current_labels[edges[:, 0]]], list(cache))
+        candidates = edges[~cached]
+        args = (
+            data,
+            data_reg,
+            current_labels,
+            quorum,
+            forest,
+            moments,
+            model_family,
+        )
+        if workers is not None and workers > 1 and len(candidates) > 1:
+            if pool is None:
+                with mp.Pool(workers) as pool:
+                    scored = _score_cuts(self, pool, candidates, workers, args)
             else:
-                raise ValueError("Model family must be either spreg or statsmodels.")
+                scored = _score_cuts(self, pool, candidates, workers, args)
+        else:
+            scored = _work_cuts(self, tqdm(candidates, desc="finding cut..."), args)
 
+        # best cut of each searched tree
+        best_cuts = {}
+        for (in_node, out_node), (new_label, new_score, new_trees_scores) in zip(
+            candidates, scored
+        ):
             if np.isfinite(new_score):
-                try:
-                    d_score = trees_scores[current_tree] - new_score
-                    score = old_score - d_score
-                except:
+                current_tree = current_labels[in_node]
+                if current_tree in trees_scores_:
+                    d_score = trees_scores_[current_tree] - new_score
+                else:
                     d_score = -new_score
-                    score = new_score
-                # if the d_score is greater than the best score and quorum is met
-                if d_score > best_d_score:
-                    best_deletion = deletion(in_node, out_node, score)
-                    best_d_score = d_score
-                    try:
-                        for i in set(current_labels):
-                            best_scores[
-                                local_labels[current_list.index(i)]
-                            ] = trees_scores[i]
-                        for i in new_trees_scores:
-                            best_scores[i] = new_trees_scores[i]
-                    except:
-                        best_scores = new_trees_scores
-                    best_MSF = local_MSF
-                    best_labels = local_labels
-        try:
-            return best_deletion, best_scores, best_MSF, local_n_subtrees, best_labels
-        except UnboundLocalError:  # in case no solution is found
+                root = roots[current_tree]
+                if root not in best_cuts or d_score > best_cuts[root][0]:
+                    best_cuts[root] = (
+                        d_score,
+                        in_node,
+                        out_node,
+                        new_label,
+                        new_score,
+                        new_trees_scores,
+                    )
+        for root, cut in best_cuts.items():
+            current_tree = current_labels[root]
+            if current_tree in trees_scores_ and len(cut[5]) == 2:
+                # store the scores of the two new trees by role, as labels shift
+                cache[root] = cut[:5] + (
+                    (cut[5][current_tree], cut[5][cut[3]]),
+                )
+        for root in roots[np.isin(roots, list(cache))]:
+            if root not in best_cuts:
+                d_score, in_node, out_node, _, new_score, halves = cache[root]
+                subtree = _subtree(forest, in_node, out_node)
+                new_label = np.searchsorted(roots, subtree.min())
+                best_cuts[root] = (
+                    d_score,
+                    in_node,
+                    out_node,
+                    new_label,
+                    new_score,
+                    dict(zip((current_labels[root], new_label), halves)),
+                )
+        if not best_cuts:  # in case no solution is found
             return deletion(None, None, np.inf), np.inf, None, np.inf, None
 
+        # best cut overall, ties broken by the lowest edge
+        d_score, in_node, out_node, _, new_score, new_trees_scores = min(
+            best_cuts.values(), key=lambda cut: (-cut[0], cut[1], cut[2])
+        )
+        current_tree = current_labels[in_node]
+        cache.pop(roots[current_tree], None)
+        if current_tree in trees_scores_:
+            score = old_score - d_score
+        else:
+            score = new_score
+        best_deletion = deletion(in_node, out_node, score)
+        best_labels = _split_labels(
+            current_labels, roots, _subtree(forest, in_node, out_node)
+        )
+        try:
+            best_scores = {
+                best_labels[roots[i]]: trees_scores[i] for i in set(current_labels)
+            }
+            best_scores.update(new_trees_scores)
+        except (TypeError, KeyError):
+            best_scores = new_trees_scores
+        # materialize the forest only for the chosen cut
+        best_MSF = MSF.copy()
+        best_MSF[best_deletion.in_node, best_deletion.out_node] = 0
+        best_MSF.eliminate_zeros()
+        return (
+            best_deletion,
+            best_scores,
+            best_MSF,
+            current_n_subtrees + 1,
+            best_labels,
+        )
+
+
+def _subtree(forest, in_node, out_node):
+    """
+    Nodes detached from their tree by deleting the edge (in_node, out_node),
+    which are the subtree rooted at the edge's child: a contiguous range of
+    the DFS order of the forest.
+    """
+    order, position, size, parent, _ = forest
+    if parent[out_node] == in_node:
+        child = out_node
+    elif parent[in_node] == out_node:
+        child = in_node
+    else:
+        raise Exception("Malformed MSF!")
+    return order[position[child] : position[child] + size[child]]
+
+
+def _score_cuts(skater, pool, candidates, workers, args):
+    """
+    Score the candidate cuts in chunks on the workers of a pool.
+    """
+    results = [
+        pool.apply_async(_work_cuts, args=(skater, chunk, args))
+        for chunk in np.array_split(candidates, workers)
+    ]
+    return [r for result in results for r in result.get()]
+
+
+def _work_cuts(skater, edges, args):
+    """
+    Score the cuts of a sequence of edges. Returns, for each edge, the label
+    of the detached subtree, the score of the two new trees and their scores.
+    """
+    data, data_reg, current_labels, quorum, forest, moments, model_family = args
+    order, position, size, parent, roots = forest
+    scored = []
+    for in_node, out_node in edges:
+        subtree = _subtree(forest, in_node, out_node)
+        child = subtree[0]
+        current_tree = current_labels[in_node]
+        new_label = np.searchsorted(roots, subtree.min())
+        if moments is not None:
+            root = roots[current_tree]
+            new_score, new_trees_scores = _score_ols_split(
+                moments,
+                (position[child], position[child] + size[child]),
+                (position[root], position[root] + size[root]),
+                (current_tree, new_label),
+                quorum,
+            )
+            scored.append((new_label, new_score, new_trees_scores))
+            continue
+        # the regression scores need the labels of every observation
+        local_labels = _split_labels(current_labels, roots, subtree)
+        if model_family == "spreg":
+            new_score, new_trees_scores = skater.score_spreg(
+                data, data_reg, local_labels, quorum, current_labels, current_tree
+            )
+        elif model_family == "statsmodels":
+            new_score, new_trees_scores = skater.score_stats(
+                data, data_reg, local_labels, quorum, current_labels, current_tree
+            )
+        else:
+            raise ValueError("Model family must be either spreg or statsmodels.")
+        scored.append((new_label, new_score, new_trees_scores))
+    return scored
+
+
+def _edge_dissimilarity(metric, data, W, chunk_size=2**16):
+    """
+    Dissimilarity between the attributes of the endpoints of every edge of
+    the binary sparse matrix W, with the sparsity pattern of W.
+
+    The default euclidean metric is evaluated directly on the pairs of
+    endpoints. Other metrics are called on the distinct endpoints of smaller
+    chunks of edges, so at most a few thousand rows and columns of the
+    pairwise dissimilarity are ever held in memory.
+    """
+    W = W.tocoo()
+    rows, cols = W.row, W.col
+    values = np.empty(rows.shape[0])
+    if metric is not euclidean_distances:
+        chunk_size = max(chunk_size // 32, 1)
+    for start in range(0, rows.shape[0], chunk_size):
+        chunk = slice(start, start + chunk_size)
+        i, j = rows[chunk], cols[chunk]
+        if metric is euclidean_distances:
+            values[chunk] = np.sqrt(((data[i] - data[j]) ** 2).sum(axis=1))
+        else:
+            ui, ii = np.unique(i, return_inverse=True)
+            uj, jj = np.unique(j, return_inverse=True)
+            values[chunk] = metric(data[ui], data[uj])[ii, jj]
+    return SP.csr_matrix((values, (rows, cols)), shape=W.shape)
+
+
+def _dfs_forest(MSF, labels, n_subtrees):
+    """
+    Root each tree of a spanning forest at its lowest-indexed node and
+    traverse the forest in depth-first preorder, so that the subtree below
+    any node occupies a contiguous range of the traversal.
+
+    MSF: (N,N) scipy sparse matrix with the edges of the forest.
+    labels: (N,) flat vector with the connected component of each node,
+            numbered as in sparse.csgraph.connected_components.
+    n_subtrees: integer with the number of connected components.
+
+    Returns the preorder of the nodes, the position of each node in it, the
+    size of the subtree rooted at each node, the parent of each node (-1 for
+    roots) and the root of each component.
+    """
+    n = MSF.shape[0]
+    if MSF.nnz != n - n_subtrees:
+        raise Exception("Malformed MSF!")
+    graph = (MSF + MSF.T).tocsr()
+    indptr, indices = graph.indptr.tolist(), graph.indices.tolist()
+    roots = np.unique(labels, return_index=True)[1]
+    parent = [-1] * n
+    visited = [False] * n
+    order = []
+    for root in roots.tolist():
+        stack = [root]
+        visited[root] = True
+        while stack:
+            v = stack.pop()
+            order.append(v)
+            for u in indices[indptr[v] : indptr[v + 1]]:
+                if not visited[u]:
+                    visited[u] = True
+                    parent[u] = v
+                    stack.append(u)
+    size = [1] * n
+    for v in reversed(order):
+        if parent[v] >= 0:
+            size[parent[v]] += size[v]
+    order = np.array(order)
+    position = np.empty(n, dtype=int)
+    position[order] = np.arange(n)
+    return order, position, np.array(size), np.array(parent), roots
+
+
+def _ols_moments(y, x, order):
+    """
+    Prefix sums, along the DFS order of the forest, of the cross products of
+    [1, x, y]. Variables are centered first to limit round-off in the
+    differences of the prefix sums, which leaves the residuals unchanged.
+    """
+    z = np.hstack(
+        (np.ones((x.shape[0], 1)), x - x.mean(axis=0), y - y.mean(axis=0))
+    )[order]
+    moments = np.zeros((z.shape[0] + 1, z.shape[1], z.shape[1]))
+    np.cumsum(z[:, :, None] * z[:, None, :], axis=0, out=moments[1:])
+    return moments
+
+
+def _ols_ssr(zz):
+    """
+    Sum of squared OLS residuals from the cross products of [1, x, y]. Using
+    least squares on X'X handles rank deficient subtrees as dropping their
+    collinear columns does.
+    """
+    xtx, xty, yty = zz[:-1, :-1], zz[:-1, -1], zz[-1, -1]
+    b = np.linalg.lstsq(xtx, xty, rcond=None)[0]
+    return yty - np.dot(xty, b)
+
+
+def _score_ols_split(moments, sub_range, tree_range, tree_labels, quorum):
+    """
+    Score the two trees resulting from detaching the DFS range `sub_range`
+    from the tree spanning `tree_range`, as score_spreg does for OLS.
+    """
+    (a, b), (ta, tb) = sub_range, tree_range
+    if min(b - a, tb - ta - (b - a)) < quorum:
+        return np.inf, None
+    sub = moments[b] - moments[a]
+    rest = moments[tb] - moments[ta] - sub
+    trees_scores = {
+        tree_labels[0]: _ols_ssr(rest),
+        tree_labels[1]: _ols_ssr(sub),
+    }
+    return sum(trees_scores.values()), trees_scores
+
+
+def _split_labels(labels, roots, subtree):
+    """
+    Component labels after detaching `subtree` from its tree, numbered by
+    lowest node as in sparse.csgraph.connected_components.
+    """
+    new_label = np.searchsorted(roots, subtree.min())
+    local_labels = labels + (labels >= new_label)
+    local_labels[subtree] = new_label
+    return local_labels
+
 
 def _const_x(x):
     x = x[:, np.ptp(x, axis=0) != 0]
@@ -14,6 +14,7 @@ from .utils import optim_moments, RegressionPropsY, get_spFilter, spdot, set_war
 from . import user_output as USER
 from . import summary_output as SUMMARY
 from . import regimes as REGI
+from .panel_utils import demean_panel, panel_lag, panel_mean
 
 # import warnings
 
@@ -78,11 +79,9 @@ class BaseGM_KKP(RegressionPropsY):
         T = y.shape[0] // N
         moments, trace_w2 = _moments_kkp(w.sparse, ols.u, 0)
         lambda1, sig_v = optim_moments(moments, all_par=True)
-        Tw = SP.kron(SP.identity(T), w.sparse)
-        ub = Tw.dot(ols.u)
+        ub = panel_lag(w.sparse, ols.u, N, T)
         ulu = ols.u - lambda1 * ub
-        Q1 = SP.kron(np.ones((T, T)) / T, SP.identity(N))
-        sig_1 = float(np.dot(ulu.T, Q1.dot(ulu)) / N)
+        sig_1 = float(np.dot(ulu.T, panel_mean(ulu, N, T)) / N)
         # print('initial_lamb_sig:',lambda1,sig_v,sig_1)
         # print('theta:', 1 - np.sqrt(sig_v)/ np.sqrt(sig_1))
         Xi_a = SP.diags([(sig_v * sig_v) / (T - 1), sig_1 * sig_1])
@@ -100,19 +99,15 @@ class BaseGM_KKP(RegressionPropsY):
         # 2a. reg -->\hat{betas}
         theta = 1 - np.sqrt(sig_vb) / np.sqrt(sig_1b)
         # print('theta:', theta)
-        gls_w = SP.identity(N * T) - theta * Q1
-
-        # With omega
-        xs = gls_w.dot(get_spFilter(w, lambda2, x))
-        ys = gls_w.dot(get_spFilter(w, lambda2, y))
+        # With omega, (I - theta * Q1) applied as a partial demeaning
+        xs = demean_panel(get_spFilter(w, lambda2, x), N, T, phi=1 - theta)
+        ys = demean_panel(get_spFilter(w, lambda2, y), N, T, phi=1 - theta)
         ols_s = OLS.BaseOLS(y=ys, x=xs)
         self.predy = spdot(self.x, ols_s.betas)
         self.u = self.y - self.predy
         self.vm = ols_s.vm  # Check
         self.betas = np.vstack((ols_s.betas, lambda2, sig_vb, sig_1b))
-        self.e_filtered = self.u - lambda2 * SP.kron(SP.identity(T), w.sparse).dot(
-            self.u
-        )
+        self.e_filtered = self.u - lambda2 * panel_lag(w.sparse, self.u, N, T)
         self.t, self.n = T, N
         self._cache = {}
 
@@ -403,16 +398,14 @@ def _moments_kkp(ws, u, i, trace_w2=None):
     """
     N = ws.shape[0]
     T = u.shape[0] // N
+    ub = panel_lag(ws, u, N, T)
+    ubb = panel_lag(ws, ub, N, T)
+    uu = np.hstack((u, ub, ubb))
     if i == 0:
-        Q = SP.kron(SP.identity(T) - np.ones((T, T)) / T, SP.identity(N))
+        Quu = demean_panel(uu, N, T)
     else:
-        Q = SP.kron(np.ones((T, T)) / T, SP.identity(N))
-    Tw = SP.kron(SP.identity(T), ws)
-    ub = Tw.dot(u)
-    ubb = Tw.dot(ub)
-    Qu = Q.dot(u)
-    Qub = Q.dot(ub)
-    Qubb = Q.dot(ubb)
+        Quu = panel_mean(uu, N, T)
+    Qu, Qub, Qubb = np.hsplit(Quu, 3)
     G11 = float(2 * np.dot(u.T, Qub))
     G12 = float(-np.dot(ub.T, Qub))
     G21 = float(2 * np.dot(ubb.T, Qub))
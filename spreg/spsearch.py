@@ -8,21 +8,264 @@ __author__ = "Luc Anselin lanselin@gmail.com,\
      Renan Serenini renan.serenini@uniroma1.it"
 
 import numpy as np
+import multiprocessing as mp
 from . import ols as OLS
 from . import twosls_sp as STSLS
-from .diagnostics_sp import LMtests,AKtest
+from .diagnostics_sp import KBtests,spDcache
+from .diagnostics_sp import lmErr,lmLag,rlmErr,rlmLag,lmSarma,akTest,comfac_test
+from .diagnostics import t_stat
 from . import error_sp as ERROR
+from .error_sp_het import BaseGM_Error_Het, BaseGM_Combo_Het
+from .twosls import BaseTSLS
+from .utils import get_lags
+from . import user_output as USER
 
 
-__all__ = ["stge_classic",
+__all__ = ["SearchContext",
+           "stge_classic",
            "stge_kb",
            "stge_pre",
            "gets_gns",
-           "gets_sdm"]
+           "gets_sdm",
+           "search_batch"]
+
+
+class SearchContext:
+    """
+    Shared computations for the specification search strategies.
+
+    The spatial lags Wy and WX, ..., W^(w_lags+1)X, the instrument sets
+    and the candidate regressions (OLS, SLX, spatial lag, SDM, spatial
+    error, SLX-Error, SARSAR and GNS) are computed at most once for a given
+    y, x and w, and are reused by every strategy that receives the
+    context. Candidate models are estimated with the base classes, with
+    the same defaults as the user classes called by the strategies, so no
+    summary output is formatted.
+
+    Arguments:
+    ----------
+    y        : dependent variable
+    x        : matrix of explanatory variables
+    w        : spatial weights
+    w_lags   : number of lags to be used as instruments in S2SLS
+
+    Attributes:
+    ----------
+    wy       : spatial lag of y
+    lags     : spatial lags of x of orders 1 to w_lags+1, stacked by order
+
+    Example:
+    --------
+    >>> import numpy as np
+    >>> import libpysal
+    >>> from spreg import SearchContext, stge_classic, stge_kb, gets_sdm
+
+    >>> db = libpysal.io.open(libpysal.examples.get_path("columbus.dbf"), "r")
+    >>> y = np.array([db.by_col("CRIME")]).reshape(49, 1)
+    >>> x = np.array([db.by_col(name) for name in ["INC", "HOVAL"]]).T
+    >>> w = libpysal.weights.Rook.from_shapefile(libpysal.examples.get_path("columbus.shp"))
+    >>> w.transform = "r"
+
+    >>> ctx = SearchContext(y, x, w)
+    >>> for search in [stge_classic, stge_kb, gets_sdm]:
+    ...     print(search(y, x, w, context=ctx, mprint=False)[0])
+    LAG
+    OLS
+    OLS
+    >>> print(round(ctx.lag(0).rho[0], 4))
+    0.4193
+
+    """
+
+    def __init__(self, y, x, w, w_lags=2):
+        n = USER.check_arrays(y, x)
+        y, name_y = USER.check_y(y, n)
+        w = USER.check_weights(w, y, w_required=True)
+        x_constant, name_x, warn = USER.check_constant(x)
+        self.y = y
+        self.x = x_constant
+        self.w = w
+        self.w_lags = w_lags
+        self.n = n
+        self.kx = x_constant.shape[1] - 1
+        self.wy = w.sparse * y
+        self.lags = get_lags(w, x_constant[:, 1:], w_lags + 1)
+        self._models = {}
+
+    def __getstate__(self):
+        # fitted models are not shipped to worker processes
+        state = self.__dict__.copy()
+        state["_models"] = {}
+        return state
+
+    def prefetch(self, candidates, workers=None, pool=None):
+        """
+        Estimates candidate models concurrently in a process pool and
+        stores them (or the exceptions they raise) in the context.
+
+        Arguments:
+        ----------
+        candidates : list of (model, slx_lags) tuples, where model is one of
+                     'ols', 'lag', 'error' or 'combo'
+        workers    : number of processes; None uses all available cores
+        pool       : multiprocessing Pool to use instead of creating one
+        """
+        todo = [c for c in candidates if c not in self._models]
+        if not todo:
+            return
+        if pool is None:
+            # the workers are terminated even when a task fails
+            with mp.Pool(workers) as pool:
+                return self.prefetch(todo, pool=pool)
+        results_p = [pool.apply_async(_work_candidate, args=(self, m, slx))
+                     for (m, slx) in todo]
+        for c, res in zip(todo, results_p):
+            self._models[c] = res.get()
+
+    def _x(self, slx_lags):
+        if slx_lags == 0:
+            return self.x
+        return np.hstack((self.x, self.lags[:, : self.kx]))
+
+    def _q(self, slx_lags):
+        return self.lags[:, slx_lags * self.kx : (slx_lags + self.w_lags) * self.kx]
+
+    def _var_type(self, slx_lags, extra=[]):
+        return np.array(["o"] + ["x"] * self.kx + ["wx"] * self.kx * slx_lags + extra)
+
+    def _get(self, key, estimate):
+        if key not in self._models:
+            try:
+                self._models[key] = estimate()
+            except Exception as e:
+                self._models[key] = e
+        model = self._models[key]
+        if isinstance(model, Exception):
+            raise model
+        return model
+
+    def ols(self, slx_lags=0):
+        """
+        OLS (slx_lags=0) or SLX (slx_lags=1) regression with the LM tests
+        of OLS(..., spat_diag=True) as attributes.
+        """
+        def estimate():
+            reg = OLS.BaseOLS(y=self.y, x=self._x(slx_lags))
+            reg._var_type = self._var_type(slx_lags)
+            reg.slx_lags = slx_lags
+            cache = spDcache(reg, self.w)
+            reg.lm_error = lmErr(reg, self.w, cache)
+            reg.lm_lag = lmLag(reg, self.w, cache)
+            reg.rlm_error = rlmErr(reg, self.w, cache)
+            reg.rlm_lag = rlmLag(reg, self.w, cache)
+            reg.lm_sarma = lmSarma(reg, self.w, cache)
+            if slx_lags == 0:
+                try:
+                    kb = KBtests(reg, self.w, cache).test()
+                    reg.lm_wx = kb["lmwx"]
+                    reg.lm_spdurbin = kb["lmspdurbin"]
+                    reg.rlm_wx = kb["rlmwx"]
+                    reg.rlm_durlag = kb["rlmdurlag"]
+                    reg.lm_slxerr = kb["lmslxerr"]
+                except np.linalg.LinAlgError:
+                    # singular cross products when WX is collinear with X;
+                    # the model has no Koley-Bera tests, as in OLS output
+                    pass
+            return reg
+        return self._get(("ols", slx_lags), estimate)
+
+    def lag(self, slx_lags=0):
+        """
+        Spatial lag (slx_lags=0) or spatial Durbin (slx_lags=1) model
+        estimated by S2SLS, with z_stat, ak_test and, for the spatial
+        Durbin model, cfh_test as attributes. Raises an exception when rho
+        is outside the bounds, as GM_Lag(..., hard_bound=True).
+        """
+        def estimate():
+            reg = BaseTSLS(y=self.y, x=self._x(slx_lags), yend=self.wy, q=self._q(slx_lags))
+            reg.rho = reg.betas[-1]
+            if not np.abs(reg.rho) < 1:
+                raise Exception(
+                    "Spatial autoregressive parameter is outside the maximum/minimum bounds."
+                )
+            reg._var_type = self._var_type(slx_lags, ["rho"])
+            reg.slx_lags = slx_lags
+            reg.z_stat = t_stat(reg, z_stat=True)
+            mi, ak, ak_p = akTest(reg, self.w, spDcache(reg, self.w))
+            reg.ak_test = ak, ak_p
+            if slx_lags == 1:
+                kx = self.kx
+                ids = list(range(1, 2 * kx + 1)) + [2 * kx + 1]
+                reg.cfh_test = comfac_test(reg.rho, reg.betas[1 : kx + 1],
+                                           reg.betas[kx + 1 : 2 * kx + 1],
+                                           reg.vm[ids, :][:, ids])
+            return reg
+        return self._get(("lag", slx_lags), estimate)
+
+    def error(self, slx_lags=0):
+        """
+        Spatial error (slx_lags=0) or SLX-Error (slx_lags=1) model
+        estimated as GMM_Error(..., hard_bound=True), with z_stat as
+        attribute.
+        """
+        def estimate():
+            reg = BaseGM_Error_Het(y=self.y, x=self._x(slx_lags), w=self.w.sparse,
+                                   hard_bound=True)
+            reg.slx_lags = slx_lags
+            reg.z_stat = t_stat(reg, z_stat=True)
+            return reg
+        return self._get(("error", slx_lags), estimate)
+
+    def combo(self, slx_lags=0):
+        """
+        SARSAR (slx_lags=0) or GNS (slx_lags=1) model estimated as
+        GMM_Error(..., add_wy=True, hard_bound=True), with z_stat as
+        attribute.
+        """
+        def estimate():
+            reg = BaseGM_Combo_Het(y=self.y, x=self._x(slx_lags), yend=self.wy,
+                                   q=self._q(slx_lags), w=self.w.sparse,
+                                   w_lags=self.w_lags, hard_bound=True)
+            reg.rho = reg.betas[-2]
+            reg.slx_lags = slx_lags
+            reg.z_stat = t_stat(reg, z_stat=True)
+            return reg
+        return self._get(("combo", slx_lags), estimate)
+
+
+def _work_candidate(context, model, slx_lags):
+    try:
+        return getattr(context, model)(slx_lags)
+    except Exception as e:
+        return e
+
+
+def _final_model(model, slx_lags, y, x, w, w_lags, name_y, name_x, name_w,
+                 name_ds, latex, context, mprint):
+    """
+    Returns the final model of a search: the full regression object when it
+    is to be printed, otherwise the base regression object of the context.
+    """
+    if not mprint:
+        return getattr(context, model)(slx_lags)
+    names = dict(name_y=name_y, name_x=name_x, name_w=name_w,
+                 name_ds=name_ds, latex=latex)
+    if model == "ols":
+        return OLS.OLS(y, x, w=w, slx_lags=slx_lags, spat_diag=True, **names)
+    elif model == "lag":
+        return STSLS.GM_Lag(y, x, w=w, slx_lags=slx_lags, w_lags=w_lags,
+                            hard_bound=True, **names)
+    elif model == "error":
+        return ERROR.GMM_Error(y, x, w=w, slx_lags=slx_lags, hard_bound=True,
+                               **names)
+    else:
+        return ERROR.GMM_Error(y, x, w=w, add_wy=True, slx_lags=slx_lags,
+                               w_lags=w_lags, hard_bound=True, **names)
 
 def stge_classic(y,x,w, w_lags=2, robust= None, sig2n_k = True, 
                  name_y= False, name_x= False, name_w=False, name_ds=False, latex=False,
-                 p_value=0.01, finmod=True, mprint=True):
+                 p_value=0.01, finmod=True, mprint=True,
+                 context=None):
     """
     Classic forward specification: Evaluate results from LM-tests and their robust versions from spreg.OLS.
     Estimate lag model with AK test if warranted.
@@ -42,7 +285,13 @@ def stge_classic(y,x,w, w_lags=2, robust= None, sig2n_k = True,
     latex    : flag for latex output
     p_value  : significance threshold
     finmod   : flag for estimation of final model
-    mprint   : flag for regression summary as search result
+    mprint   : flag for regression summary as search result. If False, no
+               summary is formatted and finreg is the base regression
+               object of the search context
+    context  : SearchContext with the computations shared across
+               candidate models (and across strategies). If None, one is
+               created for y, x, w and w_lags; otherwise w_lags is taken
+               from the context
         
     Returns:
     ----------
@@ -116,26 +365,16 @@ def stge_classic(y,x,w, w_lags=2, robust= None, sig2n_k = True,
 
 
     """
-
     finreg = False
     p=p_value
     k=0 # indicator for type of final model 0 = OLS; 1 = Lag; 2 = Error; 3 = SAR-SAR; 4 = LAG from SAR
-    
-    if not(name_y) or not(name_x):
-        
-        model_ols_1 = OLS.OLS(y,x,w=w,slx_lags=0,spat_diag=True,
-                            name_w=name_w,name_ds=name_ds,latex=latex)
-
-        name_y = model_ols_1.name_y
-        name_x = model_ols_1.name_x[1:]
-    
-    else:
-        
-        model_ols_1 = OLS.OLS(y,x,w=w,slx_lags=0,spat_diag=True,
-                            name_y=name_y,name_x=name_x,
-                            name_w=name_w,name_ds=name_ds,latex=latex)
-
+    if context is None:
+        context = SearchContext(y, x, w, w_lags=w_lags)
+    w_lags = context.w_lags
+    final = lambda model, slx: _final_model(model, slx, y, x, w, w_lags, name_y, name_x,
+                                            name_w, name_ds, latex, context, mprint)
 
+    model_ols_1 = context.ols(0)
 
     pvals = [model_ols_1.lm_error[1],model_ols_1.lm_lag[1],
                              model_ols_1.rlm_error[1],model_ols_1.rlm_lag[1],
@@ -166,11 +405,9 @@ def stge_classic(y,x,w, w_lags=2, robust= None, sig2n_k = True,
             elif p_rlag <p and p_rerror<p:
                 # check AK in lag model
                 try:
-                    model_lag = STSLS.GM_Lag(y,x,w=w,slx_lags=0,w_lags=w_lags,hard_bound=True,
-                                            name_y=name_y,name_x=name_x,name_w=name_w,name_ds=name_ds,latex=latex)
+                    model_lag = context.lag(0)
                     
-                    ak_lag = AKtest(model_lag,w,case='gen')
-                    if ak_lag.p <= p:
+                    if model_lag.ak_test[1] <= p:
                         result = 'SARSAR'
                         k = 3
                     elif p_rlag <= p_rerror:
@@ -198,33 +435,27 @@ def stge_classic(y,x,w, w_lags=2, robust= None, sig2n_k = True,
     if finmod:   # pass final regression
         msel = "Model selected by STGE-Classic: "
         if k == 0: # OLS
-            finreg = model_ols_1
+            finreg = final('ols', 0)
    
         elif (k == 1) or (k == 4): # LAG
             try:
-                
-                finreg = STSLS.GM_Lag(y,x,w=w,slx_lags=0,w_lags=w_lags,hard_bound=True,
-                                name_y=name_y,name_x=name_x,name_w=name_w,name_ds=name_ds,latex=latex)
+                finreg = final('lag', 0)
             except:
                 result = result + " -- Exception: GM LAG parameters outside bounds"
                 finreg = False
         elif k == 2: # ERROR
             try:
-                finreg = ERROR.GMM_Error(y,x,w=w,slx_lags=0,hard_bound=True,
-                                name_y=name_y,name_x=name_x,name_w=name_w,name_ds=name_ds,latex=latex)
+                finreg = final('error', 0)
             except:
                 result = result + " -- Exception: GMM Error parameters outside bounds"
                 finreg = False
         elif k == 3: # SARSAR
             try:
-                finreg = ERROR.GMM_Error(y,x,w=w,add_wy=True,w_lags=w_lags,hard_bound=True,
-                                 name_y=name_y,name_x=name_x,name_w=name_w,name_ds=name_ds,latex=latex)
+                finreg = final('combo', 0)
             except:
                 result = result + " -- Exception: SARSAR parameters outside bounds"
                 finreg = False
             
-#        elif k == 4: # LAG already computed
-#            finreg = model_lag
         if mprint:
             print(msel + result)
             if not(finreg == False):   # cannot print when finreg=False
@@ -235,7 +466,8 @@ def stge_classic(y,x,w, w_lags=2, robust= None, sig2n_k = True,
 
 def stge_kb(y,x,w, w_lags=2, robust= None, sig2n_k = True, 
                  name_y= False, name_x= False, name_w=False, name_ds=False,latex=False,
-                 p_value=0.01, finmod=True,mprint=True):
+                 p_value=0.01, finmod=True,mprint=True,
+                 context=None):
     
     """
     Forward specification: Evaluate results from Koley-Bera LM-tests and their robust versions from spreg.OLS.
@@ -255,7 +487,13 @@ def stge_kb(y,x,w, w_lags=2, robust= None, sig2n_k = True,
     latex    : flag for latex output
     p_value  : significance threshold
     finmod   : flag for estimation of final model
-    mprint   : flag for regression summary as search result
+    mprint   : flag for regression summary as search result. If False, no
+               summary is formatted and finreg is the base regression
+               object of the search context
+    context  : SearchContext with the computations shared across
+               candidate models (and across strategies). If None, one is
+               created for y, x, w and w_lags; otherwise w_lags is taken
+               from the context
 
     Returns:
     ----------
@@ -296,20 +534,13 @@ def stge_kb(y,x,w, w_lags=2, robust= None, sig2n_k = True,
     finreg = False
     p=p_value
     k=0 # indicator for type of final model 0 = OLS; 1 = Lag; 2 = SLX; 3 = SDM
+    if context is None:
+        context = SearchContext(y, x, w, w_lags=w_lags)
+    w_lags = context.w_lags
+    final = lambda model, slx: _final_model(model, slx, y, x, w, w_lags, name_y, name_x,
+                                            name_w, name_ds, latex, context, mprint)
 
-    if not(name_y) or not(name_x):
-        
-        model_ols_1 = OLS.OLS(y,x,w=w,slx_lags=0,spat_diag=True,
-                            name_w=name_w,name_ds=name_ds,latex=latex)
-
-        name_y = model_ols_1.name_y
-        name_x = model_ols_1.name_x[1:]
-    
-    else:
-        
-        model_ols_1 = OLS.OLS(y,x,w=w,slx_lags=0,spat_diag=True,
-                            name_y=name_y,name_x=name_x,
-                            name_w=name_w,name_ds=name_ds,latex=latex)
+    model_ols_1 = context.ols(0)
         
     pvals = [model_ols_1.rlm_wx[1],model_ols_1.rlm_durlag[1],
                              model_ols_1.lm_spdurbin[1]]
@@ -337,21 +568,18 @@ def stge_kb(y,x,w, w_lags=2, robust= None, sig2n_k = True,
     if finmod:   # pass final regression
         msel = "Model selected by STGE-KB: "
         if k == 0: # OLS
-            finreg = model_ols_1
+            finreg = final('ols', 0)
         elif k == 1: # LAG
             try:
-                finreg = STSLS.GM_Lag(y,x,w=w,slx_lags=0,w_lags=w_lags,hard_bound=True,
-                                name_y=name_y,name_x=name_x,name_w=name_w,name_ds=name_ds,latex=latex)
+                finreg = final('lag', 0)
             except:
                 result = result + " -- Exception: GM Lag parameters outside bounds"
                 finreg = False
         elif k == 2: # SLX
-            finreg = OLS.OLS(y,x,w=w,slx_lags=1,spat_diag=True,
-                                name_y=name_y,name_x=name_x,name_w=name_w,name_ds=name_ds,latex=latex)
+            finreg = final('ols', 1)
         elif k == 3: # SDM
             try:
-                finreg = STSLS.GM_Lag(y,x,w=w,slx_lags=1,w_lags=w_lags,hard_bound=True,
-                                name_y=name_y,name_x=name_x,name_w=name_w,name_ds=name_ds,latex=latex)
+                finreg = final('lag', 1)
             except:
                 result = result + " -- Exception: SDM parameters outside bounds"
                 finreg = False
@@ -365,7 +593,8 @@ def stge_kb(y,x,w, w_lags=2, robust= None, sig2n_k = True,
 
 def stge_pre(y,x,w, w_lags=2, robust= None, sig2n_k = True, 
                  name_y= False, name_x= False, name_w=False, name_ds=False,latex=False,
-                 p_value=0.01, finmod=True,mprint=True):
+                 p_value=0.01, finmod=True,mprint=True,
+                 context=None):
     
     """
     Forward specification: Evaluate results from Koley-Bera LM-tests to decide on OLS vs SLX then
@@ -386,7 +615,13 @@ def stge_pre(y,x,w, w_lags=2, robust= None, sig2n_k = True,
     latex    : flag for latex output
     p_value  : significance threshold
     finmod   : flag for estimation of final model
-    mprint   : flag for regression summary as search result
+    mprint   : flag for regression summary as search result. If False, no
+               summary is formatted and finreg is the base regression
+               object of the search context
+    context  : SearchContext with the computations shared across
+               candidate models (and across strategies). If None, one is
+               created for y, x, w and w_lags; otherwise w_lags is taken
+               from the context
 
     Returns:
     ----------
@@ -432,20 +667,13 @@ def stge_pre(y,x,w, w_lags=2, robust= None, sig2n_k = True,
         # 4 = SLX; 5 = SDM; 6 = SLX-Err; 7 = GNS
         
     models = ['OLS','LAG','ERROR','SARSAR','SLX','SDM','SLX-ERR','GNS']
+    if context is None:
+        context = SearchContext(y, x, w, w_lags=w_lags)
+    w_lags = context.w_lags
+    final = lambda model, slx: _final_model(model, slx, y, x, w, w_lags, name_y, name_x,
+                                            name_w, name_ds, latex, context, mprint)
 
-    if not(name_y) or not(name_x):
-        
-        model_ols_1 = OLS.OLS(y,x,w=w,slx_lags=0,spat_diag=True,
-                            name_w=name_w,name_ds=name_ds,latex=latex)
-
-        name_y = model_ols_1.name_y
-        name_x = model_ols_1.name_x[1:]
-    
-    else:
-        
-        model_ols_1 = OLS.OLS(y,x,w=w,slx_lags=0,spat_diag=True,
-                            name_y=name_y,name_x=name_x,
-                            name_w=name_w,name_ds=name_ds,latex=latex)
+    model_ols_1 = context.ols(0)
         
     
     pv1 = model_ols_1.lm_wx[1]   # LM test on WX
@@ -454,8 +682,7 @@ def stge_pre(y,x,w, w_lags=2, robust= None, sig2n_k = True,
     # selection of OLS or SLX
     if pv1 < p and pv2 < p:  # proceed with SLX results
         slx=1
-        model_ols_1 = OLS.OLS(y,x,w=w,slx_lags=1,spat_diag=True,
-                            name_y=name_y,name_x=name_x,name_w=name_w,name_ds=name_ds,latex=latex)
+        model_ols_1 = context.ols(1)
     else:  # stay with OLS estimation
         slx=0
         
@@ -495,11 +722,9 @@ def stge_pre(y,x,w, w_lags=2, robust= None, sig2n_k = True,
             elif p_rlag <p and p_rerror<p:
                 # check AK in lag model
                 try:
-                    model_lag = STSLS.GM_Lag(y,x,w=w,slx_lags=slx,w_lags=w_lags,hard_bound=True,
-                                            name_y=name_y,name_x=name_x,name_w=name_w,name_ds=name_ds,latex=latex)
+                    model_lag = context.lag(slx)
                     
-                    ak_lag = AKtest(model_lag,w,case='gen')
-                    if ak_lag.p <= p:
+                    if model_lag.ak_test[1] <= p:
                         k = idv + 3
                         result = models[k]
                         
@@ -534,25 +759,22 @@ def stge_pre(y,x,w, w_lags=2, robust= None, sig2n_k = True,
     if finmod:   # pass final regression
         msel = "Model selected by STGE-Pre: "
         if k == 0 or k == 4:
-            finreg = model_ols_1
+            finreg = final('ols', slx)
         elif k == 1 or k == 5:
             try:
-                finreg = STSLS.GM_Lag(y,x,w=w,slx_lags=slx,w_lags=w_lags,hard_bound=True,
-                                name_y=name_y,name_x=name_x,name_w=name_w,name_ds=name_ds,latex=latex)
+                finreg = final('lag', slx)
             except:
                 result = result + " -- Exception: GM LAG parameters outside bounds"
                 finreg = False
         elif k == 2 or k == 6:
             try:
-                finreg = ERROR.GMM_Error(y,x,w=w,slx_lags=slx,hard_bound=True,
-                                name_y=name_y,name_x=name_x,name_w=name_w,name_ds=name_ds,latex=latex)
+                finreg = final('error', slx)
             except:
                 result = result + " -- Exception: GMM Error parameters outside bounds"
                 finreg = False
         elif k == 3 or k == 7:
             try:
-                finreg = ERROR.GMM_Error(y,x,w=w,slx_lags=slx,add_wy=True,w_lags=w_lags,hard_bound=True,
-                                 name_y=name_y,name_x=name_x,name_w=name_w,name_ds=name_ds,latex=latex)
+                finreg = final('combo', slx)
             except:
                 result = result + " -- Exception: autoregressive parameters outside bounds"
                 finreg = False
@@ -566,7 +788,8 @@ def stge_pre(y,x,w, w_lags=2, robust= None, sig2n_k = True,
     
 def gets_gns(y,x,w, w_lags=2, robust= None, sig2n_k = True, 
                  name_y= False, name_x= False, name_w=False, name_ds=False,latex=False,
-                 p_value=0.01, finmod=True,mprint=True):
+                 p_value=0.01, finmod=True,mprint=True,
+                 context=None, workers=None):
     
     """
     GETS specification starting with GNS model estimation. Estimate simplified model when t-tests are
@@ -587,7 +810,16 @@ def gets_gns(y,x,w, w_lags=2, robust= None, sig2n_k = True,
     latex    : flag for latex output
     p_value  : significance threshold
     finmod   : flag for estimation of final model
-    mprint   : flag for regression summary as search result
+    mprint   : flag for regression summary as search result. If False, no
+               summary is formatted and finreg is the base regression
+               object of the search context
+    context  : SearchContext with the computations shared across
+               candidate models (and across strategies). If None, one is
+               created for y, x, w and w_lags; otherwise w_lags is taken
+               from the context
+    workers  : if larger than 1, number of processes used to estimate the
+               candidate models of the search concurrently before the
+               selection logic is applied; results do not depend on it
 
     Returns:
     ----------
@@ -631,39 +863,28 @@ def gets_gns(y,x,w, w_lags=2, robust= None, sig2n_k = True,
     p=p_value
     
     k = x.shape[1]
-    
-    if not(name_y) or not(name_x):
-        
-        try:
-            model_gns=ERROR.GMM_Error(y,x,w=w,slx_lags=1,
-                                    add_wy=True,w_lags=w_lags,hard_bound=True,
-                                    name_w=name_w,name_ds=name_ds,latex=latex)
-        except:
-            result = 'Exception: GNS parameters out of bounds'
-            print(result)
-            return(result,finreg)
-
-        name_y = model_gns.name_y
-        name_x = model_sdm.name_x[1:k+1]
-
-    
-    else:
-        
-        try:
-            model_gns=ERROR.GMM_Error(y,x,w=w,slx_lags=1,add_wy=True,w_lags=w_lags,hard_bound=True,
-                                name_y=name_y,name_x=name_x,name_w=name_w,name_ds=name_ds,latex=latex)
-        except:
-            result = 'Exception: GNS parameters out of bounds'
-            print(result)
-            return(result,finreg)
+    if context is None:
+        context = SearchContext(y, x, w, w_lags=w_lags)
+    w_lags = context.w_lags
+    final = lambda model, slx: _final_model(model, slx, y, x, w, w_lags, name_y, name_x,
+                                            name_w, name_ds, latex, context, mprint)
+
+    if workers is not None and workers > 1:
+        context.prefetch([("combo", 1), ("lag", 1), ("error", 1), ("combo", 0),
+                          ("error", 0), ("lag", 0), ("ols", 0), ("ols", 1)], workers)
+
+    try:
+        model_gns = context.combo(1)
+    except:
+        result = 'Exception: GNS parameters out of bounds'
+        print(result)
+        return(result,finreg)
         
     pstats = np.array(model_gns.z_stat)[1+k:,1]    # t statistics p-values
     pk = len(pstats)   # number of p-values, last one is p_lam, next to last p_rho, before that p_gam
     
     if pstats.max() < p:   # least significant of three is still significant
         result='GNS'
-        if finmod:
-            finreg = model_gns
         
     elif pstats.min() >= p:  # all non-significant
             result='OLS'
@@ -674,8 +895,7 @@ def gets_gns(y,x,w, w_lags=2, robust= None, sig2n_k = True,
         if cand == (pk-1):    # lambda not significant, but at least one of rho/gamma is
         # go to spatial Durbin - only rho and gam
             try:
-                model_sdm = STSLS.GM_Lag(y,x,w=w,slx_lags=1,w_lags=w_lags,hard_bound=True,
-                                name_y=name_y,name_x=name_x,name_w=name_w,name_ds=name_ds,latex=latex)
+                model_sdm = context.lag(1)
             except:
                 result = 'Exception: SDM parameters out of bounds'
                 print(result)
@@ -687,8 +907,6 @@ def gets_gns(y,x,w, w_lags=2, robust= None, sig2n_k = True,
                 # check on spatial common factor
                 if model_sdm.cfh_test[1] < p:    # rejected - SDM
                     result = 'SDM'
-                    if finmod:
-                        finreg = model_sdm
                 else:   # not reject common factor hypothesis - ERROR
                     result = 'ERROR'
                                         
@@ -706,8 +924,7 @@ def gets_gns(y,x,w, w_lags=2, robust= None, sig2n_k = True,
         elif cand == (pk-2):   # rho not significant, but at least one of lambda/gamma is
             # go to SLX-Error
             try:
-                model_slxerr = ERROR.GMM_Error(y,x,w=w,slx_lags=1,hard_bound=True,
-                                name_y=name_y,name_x=name_x,name_w=name_w,name_ds=name_ds,latex=latex)
+                model_slxerr = context.error(1)
             except:
                 result = 'Exception: SLX Error parameters out of bounds'
                 print(result)
@@ -718,8 +935,6 @@ def gets_gns(y,x,w, w_lags=2, robust= None, sig2n_k = True,
             
             if pstats.max() < p:  # least significant of two is still significant
                 result='SLX-ERR'
-                if finmod:
-                    finreg = model_slxerr
                 
             elif pstats.min() >= p:  # none significant, even bother?
                 result='OLS'
@@ -735,8 +950,7 @@ def gets_gns(y,x,w, w_lags=2, robust= None, sig2n_k = True,
         else:   # gamma not sig, but at least one of rho/lambda is
             # go to SARSAR
             try:
-                model_sarsar = ERROR.GMM_Error(y,x,w=w,add_wy=True,slx_lags=0,w_lags=w_lags,hard_bound=True,
-                                name_y=name_y,name_x=name_x,name_w=name_w,name_ds=name_ds,latex=latex)
+                model_sarsar = context.combo(0)
             except:
                 result = 'Exception: SARSAR parameters out of bounds'
                 print(result)
@@ -747,8 +961,6 @@ def gets_gns(y,x,w, w_lags=2, robust= None, sig2n_k = True,
             pk = len(pstats)
             if pstats.max() < p:  # least significant of two is still significant
                 result='SARSAR'
-                if finmod:
-                    finreg = model_sarsar
             elif pstats.min() >= p:  # none significant, even bother?
                 result='OLS'
                 
@@ -763,23 +975,27 @@ def gets_gns(y,x,w, w_lags=2, robust= None, sig2n_k = True,
                     
     if finmod:   # pass final regression
         msel = "Model selected by GETS-GNS: "
-        if result == 'OLS':
-            finreg = OLS.OLS(y,x,w=w,slx_lags=0,spat_diag=True,
-                            name_y=name_y,name_x=name_x,name_w=name_w,name_ds=name_ds,latex=latex)
+        if result == 'GNS':
+            finreg = final('combo', 1)
+        elif result == 'SDM':
+            finreg = final('lag', 1)
+        elif result == 'SLX-ERR':
+            finreg = final('error', 1)
+        elif result == 'SARSAR':
+            finreg = final('combo', 0)
+        elif result == 'OLS':
+            finreg = final('ols', 0)
         elif result == 'SLX':
-            finreg = OLS.OLS(y,x,w=w,slx_lags=1,spat_diag=True,
-                            name_y=name_y,name_x=name_x,name_w=name_w,name_ds=name_ds,latex=latex)            
+            finreg = final('ols', 1)
         elif result == 'ERROR':
             try:
-                finreg = ERROR.GMM_Error(y,x,w=w,slx_lags=0,hard_bound=True,
-                                name_y=name_y,name_x=name_x,name_w=name_w,name_ds=name_ds,latex=latex)
+                finreg = final('error', 0)
             except:
                 result = result + " -- Exception: GMM Error parameters outside bounds"
                 finreg = False       
         elif result == 'LAG':
             try:
-                finreg = STSLS.GM_Lag(y,x,w=w,slx_lags=0,w_lags=w_lags,hard_bound=True,
-                                name_y=name_y,name_x=name_x,name_w=name_w,name_ds=name_ds,latex=latex)
+                finreg = final('lag', 0)
             except:
                 result = result + " -- Exception: GM LAG parameters outside bounds"
                 finreg = False
@@ -793,7 +1009,8 @@ def gets_gns(y,x,w, w_lags=2, robust= None, sig2n_k = True,
 
 def gets_sdm(y,x,w, w_lags=2, robust= None, sig2n_k = True, 
                  name_y= False, name_x= False, name_w=False, name_ds=False,latex=False,
-                 p_value=0.01, finmod=True,mprint=True):
+                 p_value=0.01, finmod=True,mprint=True,
+                 context=None, workers=None):
     
     """
     Hybrid specification search: Starting from the estimation of the Spatial Durbin model, 
@@ -815,7 +1032,16 @@ def gets_sdm(y,x,w, w_lags=2, robust= None, sig2n_k = True,
     latex    : flag for latex output
     p_value  : significance threshold
     finmod   : flag for estimation of final model
-    mprint   : flag for regression summary as search result
+    mprint   : flag for regression summary as search result. If False, no
+               summary is formatted and finreg is the base regression
+               object of the search context
+    context  : SearchContext with the computations shared across
+               candidate models (and across strategies). If None, one is
+               created for y, x, w and w_lags; otherwise w_lags is taken
+               from the context
+    workers  : if larger than 1, number of processes used to estimate the
+               candidate models of the search concurrently before the
+               selection logic is applied; results do not depend on it
 
     Returns:
     ----------
@@ -859,31 +1085,22 @@ def gets_sdm(y,x,w, w_lags=2, robust= None, sig2n_k = True,
     p=p_value
     
     k = x.shape[1]
-
-    if not(name_y) or not(name_x):
-        
-        try:
-            model_sdm = STSLS.GM_Lag(y,x,w=w,slx_lags=1,w_lags=w_lags,
-                                    hard_bound=True,
-                                    name_w=name_w,name_ds=name_ds,latex=latex)
-        except:
-            result = 'Exception: SDM parameters out of bounds'
-            print(result)
-            return(result,finreg)
-
-        name_y = model_sdm.name_y
-        name_x = model_sdm.name_x[1:k+1]
-    
-    else:
-        
-        try:
-            model_sdm = STSLS.GM_Lag(y,x,w=w,slx_lags=1,w_lags=w_lags,
-                                hard_bound=True,
-                                name_y=name_y,name_x=name_x,name_w=name_w,name_ds=name_ds,latex=latex)
-        except:
-            result = 'Exception: SDM parameters out of bounds'
-            print(result)
-            return(result,finreg)
+    if context is None:
+        context = SearchContext(y, x, w, w_lags=w_lags)
+    w_lags = context.w_lags
+    final = lambda model, slx: _final_model(model, slx, y, x, w, w_lags, name_y, name_x,
+                                            name_w, name_ds, latex, context, mprint)
+
+    if workers is not None and workers > 1:
+        context.prefetch([("lag", 1), ("ols", 0), ("ols", 1), ("lag", 0),
+                          ("error", 0), ("combo", 0), ("error", 1), ("combo", 1)], workers)
+
+    try:
+        model_sdm = context.lag(1)
+    except:
+        result = 'Exception: SDM parameters out of bounds'
+        print(result)
+        return(result,finreg)
 
     
                 
@@ -896,90 +1113,78 @@ def gets_sdm(y,x,w, w_lags=2, robust= None, sig2n_k = True,
             result='ERROR'
             
         else:   # could be GNS
-            ak_sdm = AKtest(model_sdm,w,case='gen')
-            if ak_sdm.p < p:    # remaining error
+            if model_sdm.ak_test[1] < p:    # remaining error
                 result='GNS'
                 
             else:
                 result='SDM'
-                if finmod:
-                    finreg = model_sdm
     
     elif pstats.min() >= p:  # none significant - OLS or SEM
-        model_ols = OLS.OLS(y,x,w=w,spat_diag=True,
-                             name_y=name_y,name_x=name_x,name_w=name_w,name_ds=name_ds,latex=latex)
+        model_ols = context.ols(0)
 
         # check on LM-Error
-        errtest = LMtests(model_ols,w)
-        if errtest.lme[1] < p:   # ERROR
+        if model_ols.lm_error[1] < p:   # ERROR
             result = 'ERROR'
             
         else:        
             result='OLS'
-            if finmod:
-                finreg = model_ols
             
     else:       # one significant and one non-sign spatial parameter
         cand = pstats.argmax()  # non-significant one
         if cand == (pk - 1):   # rho not sig, SLX model
             # check error in SLX
-            model_slx = OLS.OLS(y,x,w=w,slx_lags=1,spat_diag=True,
-                                 name_y=name_y,name_x=name_x,name_w=name_w,name_ds=name_ds,latex=latex)
+            model_slx = context.ols(1)
             
-            errtest = LMtests(model_slx,w)
-            if errtest.lme[1] < p:   # SLX-ERROR
+            if model_slx.lm_error[1] < p:   # SLX-ERROR
                 result = 'SLX-Err'
                 
             else:
                 result = 'SLX'
-                if finmod:
-                    finreg = model_slx
         else:  # gamma not sign, lag model
             try:
-                model_lag = STSLS.GM_Lag(y,x,w=w,slx_lags=0,w_lags=w_lags,hard_bound=True,
-                                        name_y=name_y,name_x=name_x,name_w=name_w,name_ds=name_ds,latex=latex)
+                model_lag = context.lag(0)
             except:
                 result = 'Exception: LAG parameters out of bounds'
                 print(result)
                 return(result,finreg)
-            #print(model_lag.summary)
-            ak_lag = AKtest(model_lag,w,case='gen')
-            if ak_lag.p < p:    # remaining error
+            if model_lag.ak_test[1] < p:    # remaining error
                 result = 'SARSAR'
                 
             else:   # no error
                 result = 'LAG'
-                if finmod:
-                    finreg = model_lag
                 
             
     if finmod:   # pass final regression
         msel = "Model selected by GETS-SDM: "
-        if result == 'ERROR':
+        if result == 'SDM':
+            finreg = final('lag', 1)
+        elif result == 'OLS':
+            finreg = final('ols', 0)
+        elif result == 'SLX':
+            finreg = final('ols', 1)
+        elif result == 'LAG':
+            finreg = final('lag', 0)
+        elif result == 'ERROR':
             try:
-                finreg = ERROR.GMM_Error(y,x,w=w,slx_lags=0,hard_bound=True,
-                                name_y=name_y,name_x=name_x,name_w=name_w,name_ds=name_ds,latex=latex)
+                finreg = final('error', 0)
             except:
                 result = result + " -- Exception: GMM Error parameters outside bounds"
                 finreg = False
         elif result == 'SARSAR':
             try:
-                finreg = ERROR.GMM_Error(y,x,w=w,add_wy=True,slx_lags=0,w_lags=w_lags,hard_bound=True,
-                                name_y=name_y,name_x=name_x,name_w=name_w,name_ds=name_ds,latex=latex)
+                finreg = final('combo', 0)
             except:
                 result = result + ' -- Exception: SARSAR parameters out of bounds'
                 return(result,finreg)
         elif result == 'SLX-Err':
             try:
-                finreg = ERROR.GMM_Error(y,x,w=w,slx_lags=1,hard_bound=True,
-                                name_y=name_y,name_x=name_x,name_w=name_w,name_ds=name_ds,latex=latex)
+                finreg = final('error', 1)
             except:
                 result = result + ' -- Exception: SLX Error parameters out of bounds'
                 return(result,finreg)
         elif result == 'GNS':
             try:
-                finreg=ERROR.GMM_Error(y,x,w=w,slx_lags=1,add_wy=True,w_lags=w_lags,hard_bound=True,
-                                name_y=name_y,name_x=name_x,name_w=name_w,name_ds=name_ds,latex=latex)
+                finreg = final('combo', 1)
             except:
                 result = result + ' -- Exception: GNS parameters out of bounds'   
         if mprint:
@@ -990,6 +1195,63 @@ def gets_sdm(y,x,w, w_lags=2, robust= None, sig2n_k = True,
     return (result,finreg)
 
 
+def _work_search(search, task, kwargs):
+    y, x, w = task[:3]
+    task_kwargs = dict(kwargs)
+    if len(task) > 3:
+        task_kwargs.update(task[3])
+    return search(y, x, w, **task_kwargs)
+
+
+def search_batch(tasks, search="gets_gns", workers=None, **kwargs):
+    """
+    Runs a specification search over many data sets with a shared process
+    pool. Each task is searched in one worker with its own SearchContext.
+
+    Arguments:
+    ----------
+    tasks    : list of (y, x, w) tuples, or (y, x, w, kwargs) tuples where
+               kwargs is a dictionary of task-specific arguments
+    search   : strategy, either one of the functions in this module or its
+               name ('stge_classic', 'stge_kb', 'stge_pre', 'gets_gns',
+               'gets_sdm')
+    workers  : number of processes; None uses all available cores, 1 runs
+               the tasks sequentially in the current process
+    kwargs   : arguments passed to the strategy for every task; mprint
+               defaults to False
+
+    Returns:
+    ----------
+    results  : list of (result, finreg) tuples, in the order of tasks
+
+    Example:
+    --------
+    >>> import numpy as np
+    >>> import libpysal
+    >>> from spreg import search_batch
+
+    >>> db = libpysal.io.open(libpysal.examples.get_path("columbus.dbf"), "r")
+    >>> x = np.array([db.by_col(name) for name in ["INC", "HOVAL"]]).T
+    >>> w = libpysal.weights.Rook.from_shapefile(libpysal.examples.get_path("columbus.shp"))
+    >>> w.transform = "r"
+    >>> tasks = [(np.array(db.by_col(y_var)).reshape(49, 1), x, w)
+    ...          for y_var in ["CRIME", "NSA", "CP"]]
+    >>> [r[0] for r in search_batch(tasks, search="stge_kb", workers=2)]
+    ['OLS', 'LAG', 'LAG']
+
+    """
+    if isinstance(search, str):
+        search = globals()[search]
+    kwargs.setdefault("mprint", False)
+    if workers == 1:
+        return [_work_search(search, task, kwargs) for task in tasks]
+    with mp.Pool(workers) as pool:
+        results_p = [pool.apply_async(_work_search, args=(search, task, kwargs))
+                     for task in tasks]
+        results = [res.get() for res in results_p]
+    return results
+
+
 def _test():
     import doctest
 
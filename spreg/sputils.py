@@ -4,7 +4,10 @@ import scipy.sparse as SP
 import pandas as pd
 import geopandas as gpd
 from scipy.sparse import linalg as SPla
+from scipy.sparse import csgraph
 from itertools import compress
+from warnings import warn
+from scipy.interpolate import CubicSpline
 import libpysal.weights as weights
 from libpysal import graph
 from scipy import sparse
@@ -277,17 +280,389 @@ def spisfinite(a):
     return np.isfinite(a.sum())
 
 
-def spmultiplier(w, rho, method="simple", mtol=0.00000001):
+def sptrace_wtw_ww(w, separate=False):
+    """
+    Compute tr(W'W + WW) from the nonzeros of W, without forming any
+    sparse matrix-matrix product. When w is a PySAL W object both traces
+    are stored in its cache, which PySAL resets whenever the transformation
+    of w changes.
+
+    Parameters
+    ----------
+    w       :   PySAL W object or sparse matrix
+                Spatial weights
+    separate:   boolean
+                If True, return tr(WW) and tr(W'W) separately
+
+    Returns
+    -------
+    trace   :   float or tuple
+                tr(W'W + WW), or (tr(WW), tr(W'W)) if separate is True
+    """
+    cache = getattr(w, "_cache", None)
+    if cache is not None and "spreg_trcWtW_WW" in cache:
+        traces = cache["spreg_trcWtW_WW"]
+    else:
+        ws = w.sparse if hasattr(w, "sparse") else w
+        ws = SP.csr_matrix(ws)
+        traces = (ws.multiply(ws.T).sum(), ws.multiply(ws).sum())
+        if cache is not None:
+            cache["spreg_trcWtW_WW"] = traces
+    if separate:
+        return traces
+    return traces[0] + traces[1]
+
+
+def sptrace_wpow(w, order=100, nprobe=50, seed=12345, maxpow=2):
+    """
+    Estimate tr(W^p) for p = 0, ..., order with Hutchinson's estimator,
+    using a block of Rademacher probe vectors and one sparse matrix-vector
+    product per power (Barry and Pace, 1999). The traces for p <= 2K are
+    computed exactly from the nonzeros of W^(K-1) and W^K, where K is the
+    largest power up to maxpow whose expected number of nonzeros stays
+    within 16 nnz(W), so that the fill-in of the powers of W stays bounded;
+    the higher powers are left to the probes. For a row-stochastic W, the
+    term (1'u)(pi'u), with pi the left eigenvector of the unit eigenvalue, is
+    used as a control variate, which removes most of the variance that the
+    unit eigenvalue adds to every power. When w is a PySAL W object the
+    result is stored in its cache, so it is shared by every value of rho
+    and every model estimated with the same weights.
+
+    Parameters
+    ----------
+    w       :   PySAL W object or sparse matrix
+                Spatial weights
+    order   :   int
+                Highest power of W for which the trace is estimated
+    nprobe  :   int
+                Number of random probe vectors
+    seed    :   int
+                Seed of the random number generator used for the probes
+    maxpow  :   int
+                Highest power of W formed for the exact traces; the
+                higher powers are left to the probes
+
+    Returns
+    -------
+    traces  :   array
+                (order+1, ) array with the (estimated) tr(W^p)
+    """
+    cache = getattr(w, "_cache", None)
+    key = "spreg_trWpow_%d_%d_%s" % (nprobe, seed, maxpow)
+    if cache is not None and key in cache and cache[key].shape[0] > order:
+        return cache[key][: order + 1]
+    ws = w.sparse if hasattr(w, "sparse") else w
+    ws = SP.csr_matrix(ws)
+    n = ws.shape[0]
+    pi = _unit_evals(w)[1]
+    traces = np.zeros(order + 1)
+    control = 0.0
+    rng = np.random.default_rng(seed)
+    chunk = max(1, min(nprobe, 2**22 // n))
+    done = 0
+    while done < nprobe:
+        m = min(chunk, nprobe - done)
+        u = rng.choice([-1.0, 1.0], size=(n, m))
+        v = u
+        for p in range(1, order + 1):
+            v = ws @ v
+            traces[p] += (u * v).sum()
+        if pi is not None:
+            control += (u.sum(axis=0) * (pi @ u)).sum()
+        done += m
+    traces /= nprobe
+    if pi is not None:
+        # E[(1'u)(pi'u)] = pi'1 = 1
+        traces[1:] += 1.0 - control / nprobe
+    traces[0] = n
+    # exact traces from two consecutive powers, tr(W^(2k-1)) as the sum of
+    # W^k * (W^(k-1))' and tr(W^2k) as the sum of W^k * (W^k)'
+    prev, cur = SP.identity(n, format="csr"), ws
+    budget = 16 * ws.nnz
+    k = 1
+    while True:
+        for p, a in ((2 * k - 1, prev), (2 * k, cur)):
+            if p <= order:
+                traces[p] = cur.multiply(a.T).sum()
+        if 2 * k >= order or k == maxpow or cur.nnz ** 2 / prev.nnz > budget:
+            break
+        prev, cur = cur, cur @ ws
+        k += 1
+    if cache is not None:
+        cache[key] = traces
+    return traces
+
+
+def _unit_evals(w):
+    """
+    Unit eigenvalues of a row-stochastic W: their number, one for each
+    closed class of the graph of W, and an approximation of the left
+    eigenvector pi, with pi'W = pi' and pi'1 = 1. The starting value is the
+    exact pi of a row-standardized symmetric binary matrix, refined with
+    lazy power iterations. Returns (0, None) if some row of W does not sum
+    to one. When w is a PySAL W object the result is stored in its cache.
+    """
+    cache = getattr(w, "_cache", None)
+    if cache is not None and "spreg_unit_evals" in cache:
+        return cache["spreg_unit_evals"]
+    ws = SP.csr_matrix(w.sparse if hasattr(w, "sparse") else w)
+    unit, pi = 0, None
+    if np.allclose(np.asarray(ws.sum(axis=1)).flatten(), 1.0):
+        ncomp, labels = csgraph.connected_components(
+            ws, directed=True, connection="strong"
+        )
+        rows, cols = ws.nonzero()
+        leaving = labels[rows] != labels[cols]
+        unit = ncomp - np.unique(labels[rows[leaving]]).size
+        pi = 1.0 / ws.max(axis=1).toarray().flatten()
+        pi /= pi.sum()
+        wt = ws.T.tocsr()
+        for _ in range(100):
+            pi0, pi = pi, 0.5 * (pi + wt @ pi)
+            if np.abs(pi - pi0).sum() < 1e-12:
+                break
+    if cache is not None:
+        cache["spreg_unit_evals"] = (unit, pi)
+    return unit, pi
+
+
+def _mc_adi(w, rho, nprobe=50, order=None, mtol=0.00000001, seed=12345, maxpow=2):
+    """
+    Average direct multiplier tr((I - rho W)^-1) / n for one or more values
+    of rho, from the series sum_p rho^p tr(W^p) / n with the traces of
+    sptrace_wpow. The unit eigenvalues of a row-stochastic W add the same
+    amount to every tr(W^p), so their part of the series is summed in
+    closed form. The series is truncated after two consecutive terms below
+    mtol, since odd traces vanish on bipartite W. By default order grows
+    with rho so that rho^order <= mtol, within 100 and 1000 powers.
+
+    Returns
+    -------
+    adi     :   float or array
+                average direct multipliers
+    pow     :   int or array
+                number of powers used
+    conv    :   bool or array
+                False where the series did not reach mtol within order powers
+    """
+    rho = np.asarray(rho, dtype=float)
+    if order is None:
+        rmax = np.abs(rho).max()
+        order = 100
+        if rmax > 0:
+            order = np.ceil(np.log(mtol) / np.log(min(rmax, 0.9999)))
+            order = int(np.clip(order, 100, 1000))
+    n = w.n if hasattr(w, "n") else w.shape[0]
+    trw = sptrace_wpow(w, order=order, nprobe=nprobe, seed=seed, maxpow=maxpow)
+    unit = _unit_evals(w)[0]
+    r = rho.reshape(-1, 1)
+    terms = r ** np.arange(order + 1) * (trw - unit) / n
+    small = np.abs(terms) <= mtol
+    small = small[:, 2:-1] & small[:, 3:]
+    conv = small.any(axis=1)
+    pow = np.where(conv, small.argmax(axis=1) + 2, order)
+    adi = np.take_along_axis(terms.cumsum(axis=1), pow.reshape(-1, 1), axis=1).flatten()
+    adi += unit / (n * (1.0 - rho.flatten()))
+    if rho.ndim == 0:
+        return adi[0], int(pow[0]), bool(conv[0])
+    return adi, pow, conv
+
+
+def spw_evals(w):
+    """
+    Eigenvalues of W for the Ord log Jacobian, ln|I - rho W| = sum_i
+    ln(1 - rho e_i). When W is symmetric, or row-standardized from a
+    symmetric binary matrix, the eigenvalues are computed from W or from the
+    similar symmetric matrix D^1/2 W D^-1/2. The weights object is not
+    modified; the result is stored in its cache, keyed on the transform.
+
+    Parameters
+    ----------
+    w       :   PySAL W object
+                Spatial weights
+
+    Returns
+    -------
+    evals   :   array
+                n eigenvalues of W, complex if W is not similar to a
+                symmetric matrix
+    """
+    cache = getattr(w, "_cache", None)
+    key = "spreg_evals_%s" % str(getattr(w, "transform", "")).upper()
+    if cache is not None and key in cache:
+        return cache[key]
+    ws = SP.csr_matrix(w.sparse if hasattr(w, "sparse") else w)
+    sym = ws
+    wmax = ws.max(axis=1).toarray().flatten()
+    if str(getattr(w, "transform", "")).upper() == "R" and (wmax > 0).all():
+        # row-standardized binary weights have w_ij = 1 / d_i
+        d = np.sqrt(1.0 / wmax)
+        sym = SP.diags(d) @ ws @ SP.diags(1.0 / d)
+    if abs(sym - sym.T).max() <= 1e-12 * abs(sym).max():
+        evals = la.eigvalsh(sym.toarray())
+    else:
+        evals = la.eigvals(ws.toarray())
+    if cache is not None:
+        cache[key] = evals
+    return evals
+
+
+def splogdet_spline(w, step=0.01):
+    """
+    Cubic spline of ln|I - rho W| on a grid of rho values in (-1, 1), using
+    one sparse LU decomposition by grid point. When w is a PySAL W object
+    the spline is stored in its cache.
+
+    Parameters
+    ----------
+    w       :   PySAL W object or sparse matrix
+                Spatial weights
+    step    :   float
+                Distance between grid points
+
+    Returns
+    -------
+    grid    :   scipy.interpolate.CubicSpline
+                Interpolated log determinant as a function of rho
+    """
+    cache = getattr(w, "_cache", None)
+    key = "spreg_ldet_spline_%s" % step
+    if cache is not None and key in cache:
+        return cache[key]
+    ws = SP.csc_matrix(w.sparse if hasattr(w, "sparse") else w)
+    I = SP.identity(ws.shape[0], format="csc")
+    rhos = np.arange(-1.0 + step, 1.0 - step / 2.0, step)
+    ldets = np.zeros(rhos.shape)
+    for i, rho in enumerate(rhos):
+        LU = SPla.splu((I - ws.multiply(rho)).tocsc())
+        ldets[i] = np.sum(np.log(np.abs(LU.U.diagonal())))
+    grid = CubicSpline(rhos, ldets)
+    if cache is not None:
+        cache[key] = grid
+    return grid
+
+
+def sptrace_d(ws, LUs, ntrace=None, seed=12345):
+    """
+    Traces of D_i, D_i D_i and D_i'D_j, with D_i = W (I - rho_i W)^-1, as
+    sums of z'Az over blocks of unit vectors z, or averages over ntrace
+    Rademacher vectors z. Only sparse LU solves are used, so no inverse is
+    formed.
+
+    Parameters
+    ----------
+    ws      :   sparse matrix
+                Spatial weights
+    LUs     :   list
+                SuperLU factorizations of I - rho_i W, one for each D_i
+    ntrace  :   int
+                Number of random probes; default = None, exact traces
+    seed    :   int
+                Seed for the random probes, only used with ntrace
+
+    Returns
+    -------
+    trD     :   array
+                k x 1 array with tr(D_i)
+    trDD    :   array
+                k x 1 array with tr(D_i D_i)
+    trDTD   :   array
+                k x k array with tr(D_i'D_j)
+    """
+    n = ws.shape[0]
+    k = len(LUs)
+    ws = SP.csr_matrix(ws)
+    wsT = ws.T.tocsr()
+    trD = np.zeros((k, 1))
+    trDD = np.zeros((k, 1))
+    trDTD = np.zeros((k, k))
+    if ntrace is None:
+        # blocks of columns, keeping about 2**22 values of the D_i in memory
+        b = max(1, min(n, 2**22 // (2 * n * k)))
+        probes = (_unit_block(n, c, min(c + b, n)) for c in range(0, n, b))
+        scale = 1.0
+    else:
+        rng = np.random.default_rng(seed)
+        probes = [rng.choice([-1.0, 1.0], size=(n, ntrace))]
+        scale = 1.0 / ntrace
+    for Z in probes:
+        DZ = [ws @ LU.solve(Z) for LU in LUs]  # D_i Z
+        WTZ = wsT @ Z
+        for i in range(k):
+            DTZ = LUs[i].solve(WTZ, trans="T")  # D_i' Z
+            trD[i] += np.sum(Z * DZ[i])
+            trDD[i] += np.sum(DTZ * DZ[i])
+            for j in range(i, k):
+                trDTD[i, j] += np.sum(DZ[i] * DZ[j])
+    trD *= scale
+    trDD *= scale
+    trDTD = np.triu(trDTD) * scale
+    trDTD = trDTD + np.triu(trDTD, 1).T
+    return trD, trDD, trDTD
+
+
+def _unit_block(n, start, stop):
+    # columns start to stop-1 of the n x n identity matrix
+    Z = np.zeros((n, stop - start))
+    Z[np.arange(start, stop), np.arange(stop - start)] = 1.0
+    return Z
+
+
+def _power_traces(w, rho, mtol=0.00000001):
+    """
+    Exact traces of the "power" multiplier: tr(W^p) / n for p = 0, ..., P,
+    with tr(W) taken as zero and P the first power whose term
+    rho^P tr(W^P) / n is not above mtol. The traces are stored in the cache
+    of w, so that the same polynomial is evaluated for other values of rho
+    (e.g., the draws of the impacts) without forming the powers of W again;
+    they are formed only when rho needs more powers than are cached.
+
+    Returns
+    -------
+    trw     :   array
+                (P+1, ) array with tr(W^p) / n
+    """
+    cache = getattr(w, "_cache", None)
+    trw = [1.0, 0.0]
+    if cache is not None and "spreg_trWpow_power" in cache:
+        trw = list(cache["spreg_trWpow_power"])
+    n = w.n
+    ws = ww = None
+    pow = 1
+    while True:
+        pow += 1
+        if pow == len(trw):
+            if ww is None:
+                ws = w.to_sparse(fmt="csr")
+                ww = ws
+                for _ in range(pow - 1):
+                    ww = ww @ ws
+            else:
+                ww = ww @ ws
+            trw.append(ww.diagonal().sum() / n)
+        if rho**pow * trw[pow] <= mtol:
+            break
+    if cache is not None:
+        cache["spreg_trWpow_power"] = trw
+    return np.array(trw[: pow + 1])
+
+
+def spmultiplier(w, rho, method="simple", mtol=0.00000001, nprobe=50, order=None):
     """"
     Spatial Lag Multiplier Calculation
-    Follows Kim, Phipps and Anselin (2003) (simple), and LeSage and Pace (2009) (full, power)
+    Follows Kim, Phipps and Anselin (2003) (simple), and LeSage and Pace (2009) (full, power, mc)
 
     Attributes
     ----------
     w          : PySAL format spatial weights matrix
     rho        : spatial autoregressive coefficient
-    method     : one of "simple" (default), "full" or "power"
+    method     : one of "simple" (default), "full", "power" or "mc";
+                 "mc" uses the Monte Carlo traces of sptrace_wpow, which are
+                 cached with w and avoid forming powers of W
     mtol       : tolerance for power iteration (default=0.00000001)
+    nprobe     : number of random probe vectors for the "mc" traces
+    order      : highest power of W in the "mc" series; default grows with
+                 rho from 100 to 1000 powers (see _mc_adi)
 
     Returns
     -------
@@ -295,7 +670,7 @@ def spmultiplier(w, rho, method="simple", mtol=0.00000001):
                   ati = average total impact multiplier
                   adi = average direct impact multiplier
                   aii = average indirect impact multiplier
-                  pow = powers used in power approximation (otherwise 0)
+                  pow = powers used in power or mc approximation (otherwise 0)
 
     """
     multipliers = {"ati": 1.0, "adi": 1.0, "aii": 1.0, "method": method, "warn": ''}
@@ -312,20 +687,14 @@ def spmultiplier(w, rho, method="simple", mtol=0.00000001):
         adii0 = np.sum(np.diag(invirw0))
         multipliers["adi"] = adii0 / n
     elif method == "power":
-        ws3 = w.to_sparse(fmt='csr')        
-        rhop = rho
-        ww = ws3
-        pow = 1
-        adi = 1.0
-        adidiff = 100.00
-
-        while adidiff > mtol:
-            pow = pow + 1
-            ww = SP.csr_matrix.dot(ww, ws3)
-            trw = ww.diagonal().sum()
-            rhop = rhop * rho
-            adidiff = rhop * trw / n
-            adi = adi + adidiff
+        trw = _power_traces(w, rho, mtol)
+        pow = trw.shape[0] - 1
+        multipliers["adi"] = (rho ** np.arange(pow + 1) * trw).sum().item()
+        multipliers["pow"] = pow
+    elif method == "mc":
+        adi, pow, conv = _mc_adi(w, rho, nprobe=nprobe, order=order, mtol=mtol)
+        if not conv:
+            multipliers["warn"] = "Trace series for spatial impacts did not reach mtol after "+str(pow)+" powers.\n"
         multipliers["adi"] = adi.item()
         multipliers["pow"] = pow
     else:
@@ -334,7 +703,7 @@ def spmultiplier(w, rho, method="simple", mtol=0.00000001):
     multipliers["aii"] = multipliers["ati"] - multipliers["adi"]
     return (multipliers)
 
-def _sp_effects(reg, variables, spmult, slx_lags=0,slx_vars="All"):
+def _sp_effects(reg, variables, spmult, slx_lags=0,slx_vars="All",betas=None):
     """
     Calculate spatial lag, direct and indirect effects
     
@@ -346,6 +715,9 @@ def _sp_effects(reg, variables, spmult, slx_lags=0,slx_vars="All"):
     slx_lags   : number of SLX lags
     slx_vars   : either "All" (default) for all variables lagged, or a list
                  of booleans matching the columns of x that will be lagged or not
+    betas      : coefficients used for the effects, default is reg.betas;
+                 a (k, ndraws) array gives the effects for each column, in
+                 which case the multipliers in spmult are (ndraws, ) arrays
 
     Returns
     -------
@@ -355,22 +727,22 @@ def _sp_effects(reg, variables, spmult, slx_lags=0,slx_vars="All"):
     """
     
     variables_x_index = variables.index
+    if betas is None:
+        betas = reg.betas
 
     m1 = spmult['ati']
-    btot = m1 * reg.betas[variables_x_index]
+    btot = m1 * betas[variables_x_index]
     m2 = spmult['adi']
-    bdir = m2 * reg.betas[variables_x_index]
+    bdir = m2 * betas[variables_x_index]
 
     # Assumes all SLX effects are indirect effects. 
     if slx_lags > 0:
         if reg.output.regime.nunique() > 1:
-            btot_idx = pd.Series(btot.flatten(), index=variables_x_index)   
             wchunk_size = len(variables.query("regime == @reg.output.regime.iloc[0]")) #Number of exogenous variables in each regime
             for i in range(slx_lags):
                 chunk_indices = variables_x_index + (i+1) * wchunk_size
-                bmult = m1 * reg.betas[chunk_indices]
-                btot_idx[variables_x_index] += bmult.flatten()
-                btot = btot_idx.to_numpy().reshape(btot.shape)
+                bmult = m1 * betas[chunk_indices]
+                btot = btot + bmult
 
         else:
             variables_wx = reg.output.query("var_type == 'wx'")
@@ -385,17 +757,168 @@ def _sp_effects(reg, variables, spmult, slx_lags=0,slx_vars="All"):
                 start_idx = i * wchunk_size
                 end_idx = start_idx + wchunk_size
                 chunk_indices = variables_wx_index[start_idx:end_idx]
-                bmult = m1 * reg.betas[chunk_indices]
+                bmult = m1 * betas[chunk_indices]
                 btot[xind] = btot[xind] + bmult
 
         bind = btot - bdir
     else:
         m3 = spmult['aii']
-        bind = m3 * reg.betas[variables_x_index]
+        bind = m3 * betas[variables_x_index]
 
     return btot, bdir, bind
 
-def i_multipliers(w,coef=0.0,model='lag',id=None):
+def _sp_effects_draws(reg, w, variables, method="simple", slx_lags=0, slx_vars="All",
+                      ndraws=1000, quantiles=(0.025, 0.975), seed=12345, nprobe=50, order=None):
+    """
+    Simulated distribution of the spatial lag direct, indirect and total effects,
+    following LeSage and Pace (2009). The coefficients, including rho, are drawn
+    from a normal distribution with mean reg.betas and covariance reg.vm. Draws
+    of rho outside the admissible interval are discarded: (1/lambda_min,
+    1/lambda_max) from the eigenvalues of W for "full", otherwise (-1, 1),
+    which is exact at the upper end for a row-standardized W. The average
+    direct multiplier of every draw follows the method of the point estimate:
+    mean(1 / (1 - rho lambda_i)) for "full", the cached polynomial
+    sum_p rho^p tr(W^p) / n of the point estimate for "power", and the trace
+    series of _mc_adi for "mc", whose draws are also discarded when the
+    series does not converge.
+
+    Attributes
+    ----------
+    reg        : regression object
+    w          : PySAL format spatial weights matrix
+    variables  : chunk of self.output with variables to calculate effects
+    method     : multiplier method; "simple" uses a unit direct multiplier
+    slx_lags   : number of SLX lags
+    slx_vars   : either "All" (default) for all variables lagged, or a list
+                 of booleans matching the columns of x that will be lagged or not
+    ndraws     : number of draws of the coefficients
+    quantiles  : quantiles of the simulated effects to be returned
+    seed       : seed of the random number generator
+    nprobe     : number of random probe vectors for the "mc" traces
+    order      : highest power of W in the "mc" series (see _mc_adi)
+
+    Returns
+    -------
+    effects    : dictionary with the standard errors ("se") and the quantiles
+                 ("quantiles") of the total, direct and indirect effects, each
+                 a list with the (kv, ) arrays for btot, bdir and bind, and the
+                 number of draws used ("ndraws"); None if the model has no
+                 single rho or fewer than two draws are left
+    """
+    rho_index = reg.output.index[reg.output["var_type"] == "rho"]
+    if len(rho_index) != 1:
+        return None
+    k = reg.betas.shape[0]
+    rng = np.random.default_rng(seed)
+    draws = rng.multivariate_normal(reg.betas.flatten(), reg.vm[:k, :k], size=ndraws).T
+    lo, hi = -1.0, 1.0
+    if method == "full":
+        evals = spw_evals(w)
+        evr = np.real(evals[np.abs(np.imag(evals)) < 1e-10])
+        hi = 1.0 / evr.max()
+        if evr.min() < 0:
+            lo = 1.0 / evr.min()
+    draws = draws[:, (draws[rho_index[0]] > lo) & (draws[rho_index[0]] < hi)]
+    rho = draws[rho_index[0]]
+    if method == "full":
+        adi = np.zeros(rho.shape)
+        b = max(1, 2**22 // evals.shape[0])
+        for c in range(0, rho.shape[0], b):
+            adi[c : c + b] = np.real(
+                (1.0 / (1.0 - np.outer(rho[c : c + b], evals))).mean(axis=1)
+            )
+    elif method == "power":
+        trw = _power_traces(w, np.asarray(reg.rho).item())
+        adi = (rho.reshape(-1, 1) ** np.arange(trw.shape[0]) * trw).sum(axis=1)
+    elif method == "mc":
+        adi, pow, conv = _mc_adi(w, rho, nprobe=nprobe, order=order)
+        draws, rho, adi = draws[:, conv], rho[conv], adi[conv]
+    else:
+        adi = np.ones_like(rho)
+    if rho.shape[0] < 2:
+        return None
+    spmult = {"ati": 1.0 / (1.0 - rho), "adi": adi}
+    spmult["aii"] = spmult["ati"] - spmult["adi"]
+    effects = _sp_effects(reg, variables, spmult, slx_lags, slx_vars, betas=draws)
+    return {
+        "se": [e.std(axis=1, ddof=1) for e in effects],
+        "quantiles": [np.quantile(e, quantiles, axis=1).T for e in effects],
+        "ndraws": rho.shape[0],
+    }
+
+
+def _lag_multipliers_lu(ws, coef, nprobe=100, seed=12345, maxpow=5):
+    """
+    Diagonal, row sums and column sums of (I - coef W)^-1 from one sparse LU
+    factorization, without forming the inverse. The row and column sums are
+    exact solves against a vector of ones with A = I - coef W and with A'.
+    The diagonal of the series I + coef W + ... + coef^2K W^2K is computed
+    exactly as the row sums of W^b * (W^a)', from the powers W^k with
+    k <= K; K is the largest power up to maxpow whose expected number of
+    nonzeros stays within max(4 nnz(W), 2^24). Only the diagonal of the
+    remainder coef^(2K+1) W^(2K+1) A^-1 is estimated with Rademacher probe
+    vectors (Bekas, Kokiopoulou and Saad, 2007).
+
+    Parameters
+    ----------
+    ws      :   sparse matrix
+                Spatial weights
+    coef    :   float
+                Spatial autoregressive coefficient
+    nprobe  :   int
+                Number of random probe vectors
+    seed    :   int
+                Seed of the random number generator used for the probes
+    maxpow  :   int
+                Highest power of W formed for the exact part of the diagonal
+
+    Returns
+    -------
+    diag    :   array
+                nx1 array with the diagonal of A^-1
+    rowsum  :   array
+                nx1 array with the row sums of A^-1
+    colsum  :   array
+                nx1 array with the column sums of A^-1
+    """
+    ws = SP.csr_matrix(ws)
+    n = ws.shape[0]
+    a = SP.identity(n, format="csc") - coef * ws.tocsc()
+    LU = SPla.splu(a)
+    ones = np.ones(n)
+    rowsum = LU.solve(ones).reshape(-1, 1)
+    colsum = LU.solve(ones, trans="T").reshape(-1, 1)
+    if coef == 0:
+        return ones.reshape(-1, 1), rowsum, colsum
+
+    wpow = [SP.identity(n, format="csr"), ws]
+    budget = max(4 * ws.nnz, 2**24)
+    while len(wpow) <= maxpow and wpow[-1].nnz ** 2 / wpow[-2].nnz <= budget:
+        wpow.append(wpow[-1] @ ws)
+    order = 2 * (len(wpow) - 1)
+    diag = ones.copy()
+    for p in range(1, order + 1):
+        wa, wb = wpow[p // 2], wpow[p - p // 2]
+        diag += coef ** p * np.asarray(wb.multiply(wa.T).sum(axis=1)).flatten()
+    del wpow
+
+    rng = np.random.default_rng(seed)
+    chunk = max(1, min(nprobe, 2**22 // n))
+    rem = np.zeros(n)
+    done = 0
+    while done < nprobe:
+        m = min(chunk, nprobe - done)
+        u = rng.choice([-1.0, 1.0], size=(n, m))
+        v = LU.solve(u)
+        for _ in range(order + 1):
+            v = ws @ v
+        rem += (u * v).sum(axis=1)
+        done += m
+    diag += coef ** (order + 1) * rem / nprobe
+    return diag.reshape(-1, 1), rowsum, colsum
+
+
+def i_multipliers(w,coef=0.0,model='lag',id=None,method=None,nprobe=None,seed=12345):
     '''
     Creates pandas DataFrame with spatial multipliers with direct effects
     (diagonal), effect of neighbors (row sum) and effect on neighbors
@@ -416,10 +939,53 @@ def i_multipliers(w,coef=0.0,model='lag',id=None):
     id        : pandas Series with ID variable for each observation, default is none,
                 which creates a vector with sequence numbers and assigns variable name
                 "ID"; otherwise variable name is extracted from Series columns.
+    method    : computation of the lag multipliers, either "full" (inverse of the
+                dense I - coef W) or "lu" (sparse LU factorization, see
+                _lag_multipliers_lu); default is None, which uses "full"
+                whenever the dense inverse fits in about 4GB (n <= 11585)
+                and "lu" with a warning otherwise
+    nprobe    : number of random probe vectors for the direct effects with "lu";
+                default is None, which uses 100 probes for abs(coef) <= 0.5 and
+                grows as 50 / (1 - abs(coef)) up to 1000. The highest power of
+                W in the exact part of the direct effects also grows with
+                coef, from 5 to 20
+    seed      : seed of the random number generator for the probe vectors
 
     '''
     
-    if sparse.issparse(w):   # sparse kernel or dist fraction
+    if model == 'lag' and method is None:
+        if sparse.issparse(w):
+            n = w.shape[0]
+        elif isinstance(w, (weights.W, graph.Graph)):
+            n = w.n
+        else:
+            n = np.asarray(w).shape[0]
+        # the dense inverse and its copies take about 32 n^2 bytes
+        method = "full" if 32 * n * n <= 2**32 else "lu"
+        if method == "lu":
+            warn("The direct effects of the "+str(n)+" observations are estimated "
+                 "with random probes (method='lu'); their error grows as abs(coef) "
+                 "approaches 1.")
+
+    if model == 'lag' and method == "full" and sparse.issparse(w):
+        w = w.toarray()
+
+    if model == 'lag' and method == "lu":
+        if isinstance(w, graph.Graph):
+            w = w.to_W()
+        ws = w.sparse if isinstance(w, weights.W) else sparse.csr_matrix(w)
+        n = ws.shape[0]
+        r = abs(coef)
+        if nprobe is None:
+            nprobe = int(100 * max(1.0, 0.5 / max(1.0 - r, 0.05)))
+        maxpow = 5
+        if r > 0.5:
+            maxpow = int(min(20, np.ceil(np.log(0.01) / (2 * np.log(min(r, 0.99))))))
+        edirect, eofNbrs, eonNbrs = _lag_multipliers_lu(ws, coef, nprobe=nprobe, seed=seed, maxpow=maxpow)
+        eofNbrs = eofNbrs - edirect
+        eonNbrs = eonNbrs - edirect
+
+    elif sparse.issparse(w):   # sparse kernel or dist fraction
         n = w.shape[0]
         edirect = np.zeros((n,1))
         ww = w.copy()
@@ -456,7 +1022,8 @@ def i_multipliers(w,coef=0.0,model='lag',id=None):
             ww = wf.copy()
             np.fill_diagonal(ww,0)                  
         elif model == 'lag':
-            
+            if method != "full":
+                raise Exception("Method not supported")
             id0 = np.identity(n)
             irw0 = (id0 - coef * wf)
             invirw0 = np.linalg.inv(irw0)
@@ -466,8 +1033,9 @@ def i_multipliers(w,coef=0.0,model='lag',id=None):
         else:
             raise Exception("Model not supported")
             
-    eofNbrs = ww.sum(axis=1).reshape(-1,1)
-    eonNbrs = ww.sum(axis=0).reshape(-1,1) 
+    if not (model == 'lag' and method == "lu"):
+        eofNbrs = ww.sum(axis=1).reshape(-1,1)
+        eonNbrs = ww.sum(axis=0).reshape(-1,1) 
 
     if (isinstance(id,pd.core.frame.DataFrame)) or (isinstance(id,gpd.geoseries.GeoSeries)):
         pdid = id   # already a data frame
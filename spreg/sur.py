@@ -18,15 +18,19 @@ from .sur_utils import (
     sur_crossprod,
     sur_est,
     sur_resids,
-    sur_predict,
+    sur_stack,
+    sur_mat2dict,
     check_k,
+    _sur_block2dict,
+    _sur_crossprod,
+    _sur_est,
+    _sur_predict,
 )
 from .diagnostics_sur import (
     sur_setp,
     sur_lrtest,
     sur_lmtest,
-    surLMe,
-    surLMlag,
+    surLMtests,
     sur_chow,
 )
 from .sputils import sphstack, spdot
@@ -117,14 +121,16 @@ class BaseSUR:
         self.bigK = np.zeros((self.n_eq, 1), dtype=np.int_)
         for r in range(self.n_eq):
             self.bigK[r] = self.bigX[r].shape[1]
-        self.bigXX, self.bigXy = sur_crossprod(self.bigX, self.bigy)
+        # stacked n x sum(K) explanatory variables and n x n_eq dependent variables
+        X = sur_stack(self.bigX)
+        Y = sur_stack(self.bigy)
+        XX, Xy = _sur_crossprod(self.bigX, self.bigy)
+        self.bigXX, self.bigXy = _sur_block2dict(XX, Xy, self.bigK)
         # OLS regression by equation, sets up initial residuals
         _sur_ols(self)  # creates self.bOLS and self.olsE
         # SUR estimation using OLS residuals - two step estimation
-        self.bSUR, self.varb, self.sig = sur_est(
-            self.bigXX, self.bigXy, self.olsE, self.bigK
-        )
-        resids = sur_resids(self.bigy, self.bigX, self.bSUR)  # matrix of residuals
+        beta, self.varb, self.sig = _sur_est(XX, Xy, self.olsE, self.bigK)
+        resids = Y - _sur_predict(X, beta, self.bigK)  # matrix of residuals
         # Sigma and log det(Sigma) for null model
         self.sig_ols = self.sig
         sols = np.diag(np.diag(self.sig))
@@ -139,20 +145,18 @@ class BaseSUR:
             while np.abs(det1 - det0) > epsilon and n_iter <= maxiter:
                 n_iter += 1
                 det0 = det1
-                self.bSUR, self.varb, self.sig = sur_est(
-                    self.bigXX, self.bigXy, resids, self.bigK
-                )
-                resids = sur_resids(self.bigy, self.bigX, self.bSUR)
+                beta, self.varb, self.sig = _sur_est(XX, Xy, resids, self.bigK)
+                resids = Y - _sur_predict(X, beta, self.bigK)
                 det1 = la.slogdet(self.sig)[1]
                 if verbose:
                     print(n_iter, det0, det1)
-            self.bigE = sur_resids(self.bigy, self.bigX, self.bSUR)
             self.ldetS1 = det1
             self.niter = n_iter
         else:
             self.niter = 1
-            self.bigE = resids
-        self.bigYP = sur_predict(self.bigy, self.bigX, self.bSUR)  # LA added 10/30/16
+        self.bSUR = sur_mat2dict(beta, self.bigK)
+        self.bigE = resids
+        self.bigYP = Y - resids  # LA added 10/30/16
         self.corr = sur_corr(self.sig)
         lik = self.n_eq * (1.0 + np.log(2.0 * np.pi)) + self.ldetS1
         self.llik = -(self.n / 2.0) * lik
@@ -503,13 +507,10 @@ class SUR(BaseSUR, REGI.Regimes_Frame):
         if spat_diag:
             if not w:
                 raise Exception("Error: spatial weights needed")
-            WS = w.sparse
-            # LM test on spatial error autocorrelation
-            self.lmEtest = surLMe(self.n_eq, WS, self.bigE, self.sig)
-            # LM test on spatial lag autocorrelation
-            self.lmlagtest = surLMlag(
+            # LM tests on spatial error and spatial lag autocorrelation
+            self.lmEtest, self.lmlagtest = surLMtests(
                 self.n_eq,
-                WS,
+                w,
                 self.bigy,
                 self.bigX,
                 self.bigE,
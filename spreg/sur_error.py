@@ -18,8 +18,9 @@ from scipy.sparse.linalg import splu as SuperLU
 from scipy.optimize import minimize_scalar, minimize
 from scipy import sparse as sp
 
-from .ml_error import err_c_loglik_sp
+from .ml_error import err_c_loglik_sp, err_c_loglik_ord
 from .utils import optim_moments
+from .sputils import spw_evals, splogdet_spline, sptrace_d
 from .sur_utils import (
     sur_dictxy,
     sur_corr,
@@ -431,6 +432,13 @@ class BaseSURerrorML:
                  with matrices of explanatory variables,
                  one for each equation
     w          : spatial weights object
+    method     : string
+                 log Jacobian method
+                 if 'LU' (default): sparse LU decomposition for each equation
+                 if 'ord' : Ord eigenvalue method, eigenvalues of W computed once
+                 if 'grid' : cubic spline of log det(I - lambda W) over a grid
+                 of lambda values computed once
+                 'ord' and 'grid' use analytic gradients for lambda
     epsilon    : float
                  convergence criterion for ML iterations
                  default 0.0000001
@@ -480,14 +488,17 @@ class BaseSURerrorML:
                  n by n_eq matrix of vectors of residuals for each equation
     cliksurerr : float
                  concentrated log-likelihood from ML SUR Error (no constant)
+    method     : string
+                 log Jacobian method
 
     """
 
-    def __init__(self, bigy, bigX, w, epsilon=0.0000001):
+    def __init__(self, bigy, bigX, w, method="LU", epsilon=0.0000001):
         # setting up constants
         self.n = w.n
         self.n2 = self.n / 2.0
         self.n_eq = len(bigy.keys())
+        self.method = method
         WS = w.sparse
         I = sp.identity(self.n)
         # variables
@@ -506,24 +517,47 @@ class BaseSURerrorML:
         for r in range(self.n_eq):
             self.bigXlag[r] = WS * self.bigX[r]
 
+        # log Jacobian, shared by all equations
+        methodML = method.upper()
+        bounds = (-1.0, 1.0)
+        if methodML == "LU":
+            loglik, jac_args = err_c_loglik_sp, (I, WS)
+        elif methodML == "ORD":
+            evals = spw_evals(w)
+            loglik, jac_args = err_c_loglik_ord, (evals,)
+            jac = jacob_ord
+            # the log Jacobian is finite only for lambda in (1/evmin, 1/evmax);
+            # L-BFGS-B evaluates at the bounds, so keep them strictly inside
+            evr = np.real(evals)
+            bounds = (
+                max(-1.0, 1.0 / evr.min()) * (1.0 - 1e-7),
+                min(1.0, 1.0 / evr.max()) * (1.0 - 1e-7),
+            )
+        elif methodML == "GRID":
+            grid = splogdet_spline(w)
+            bounds = (grid.x[0], grid.x[-1])
+            loglik, jac_args = _err_c_loglik_grid, (grid,)
+            jac = jacob_grid
+        else:
+            raise Exception("{0} is an unsupported method".format(method))
+
         # spatial parameter starting values
         lam = np.zeros((self.n_eq, 1))  # initialize as an array
         fun0 = 0.0
         fun1 = 0.0
         for r in range(self.n_eq):
             res = minimize_scalar(
-                err_c_loglik_sp,
+                loglik,
                 0.0,
-                bounds=(-1.0, 1.0),
+                bounds=bounds,
                 args=(
                     self.n,
                     self.bigy[r],
                     self.bigylag[r],
                     self.bigX[r],
                     self.bigXlag[r],
-                    I,
-                    WS,
-                ),
+                )
+                + jac_args,
                 method="bounded",
                 options={"xatol": epsilon},
             )
@@ -539,7 +573,7 @@ class BaseSURerrorML:
         self.llik = reg0.llik  # as is, includes constant
 
         # iteration
-        lambdabounds = [(-1.0, +1.0) for i in range(self.n_eq)]
+        lambdabounds = [bounds for i in range(self.n_eq)]
         while abs(fun0 - fun1) > epsilon:
             fun0 = fun1
             sply = filter_dict(lam, self.bigy, self.bigylag)
@@ -549,13 +583,23 @@ class BaseSURerrorML:
             splXX, splXy = sur_crossprod(splX, sply)
             b1, varb1, sig1 = sur_est(splXX, splXy, splbigE, self.bigK)
             bigE = sur_resids(self.bigy, self.bigX, b1)
-            res = minimize(
-                clik,
-                np.array(lam).flatten(),
-                args=(self.n, self.n2, self.n_eq, bigE, I, WS),
-                method="L-BFGS-B",
-                bounds=lambdabounds,
-            )
+            if methodML == "LU":
+                res = minimize(
+                    clik,
+                    np.array(lam).flatten(),
+                    args=(self.n, self.n2, self.n_eq, bigE, I, WS),
+                    method="L-BFGS-B",
+                    bounds=lambdabounds,
+                )
+            else:
+                res = minimize(
+                    clik_grad,
+                    np.array(lam).flatten(),
+                    args=(self.n, self.n2, bigE, WS * bigE, jac, jac_args),
+                    method="L-BFGS-B",
+                    jac=True,
+                    bounds=lambdabounds,
+                )
             lam = res.x
             lam.resize((self.n_eq, 1))
             fun1 = res.fun
@@ -588,6 +632,13 @@ class SURerrorML(BaseSURerrorML, REGI.Regimes_Frame):
                    default = None.
                    List of n values with the mapping of each
                    observation to a regime. Assumed to be aligned with 'x'.
+    method       : string
+                   log Jacobian method
+                   if 'LU' (default): sparse LU decomposition for each equation
+                   if 'ord' : Ord eigenvalue method, eigenvalues of W computed once
+                   if 'grid' : cubic spline of log det(I - lambda W) over a grid
+                   of lambda values computed once
+                   'ord' and 'grid' use analytic gradients for lambda
     epsilon      : float
                    convergence criterion for ML iterations.
                    default 0.0000001
@@ -598,6 +649,12 @@ class SURerrorML(BaseSURerrorML, REGI.Regimes_Frame):
     vm           : boolean
                    flag for asymptotic variance for lambda and Sigma,
                    default = False
+    ntrace       : int
+                   number of random probes for the stochastic estimation of
+                   the traces in the asymptotic variance (see surerrvm);
+                   default = None, exact traces
+    seed         : int
+                   seed for the random probes, only used with ntrace
     name_bigy    : dictionary
                    with name of dependent variable for each equation.
                    default = None, but should be specified is done when
@@ -754,7 +811,10 @@ class SURerrorML(BaseSURerrorML, REGI.Regimes_Frame):
         nonspat_diag=True,
         spat_diag=False,
         vm=False,
+        method="LU",
         epsilon=0.0000001,
+        ntrace=None,
+        seed=12345,
         name_bigy=None,
         name_bigX=None,
         name_ds=None,
@@ -822,7 +882,9 @@ class SURerrorML(BaseSURerrorML, REGI.Regimes_Frame):
             self.name_bigX = name_bigX
 
         # moved init here
-        BaseSURerrorML.__init__(self, bigy=bigy, bigX=bigX, w=w, epsilon=epsilon)
+        BaseSURerrorML.__init__(
+            self, bigy=bigy, bigX=bigX, w=w, method=method, epsilon=epsilon
+        )
 
         # inference
         self.sur_inf = sur_setp(self.bSUR, self.varb)
@@ -851,7 +913,9 @@ class SURerrorML(BaseSURerrorML, REGI.Regimes_Frame):
 
         # asymptotic variance for spatial coefficient
         if vm:
-            self.vm = surerrvm(self.n, self.n_eq, w, self.lamsur, self.sig)
+            self.vm = surerrvm(
+                self.n, self.n_eq, w, self.lamsur, self.sig, ntrace=ntrace, seed=seed
+            )
             vlam = self.vm[: self.n_eq, : self.n_eq]
             self.lamsetp = lam_setp(self.lamsur, vlam)
             # test on constancy of lambdas
@@ -937,6 +1001,62 @@ def jacob(lam, n_eq, I, WS):
     return logjac
 
 
+def jacob_ord(lam, evals):
+    """Log-Jacobian for SUR Error model and its gradient,
+    using the eigenvalues of W
+
+    Parameters
+    ----------
+    lam      : array
+               n_eq by 1 array of spatial autoregressive parameters
+    evals    : array
+               eigenvalues of the spatial weights matrix
+
+    Returns
+    -------
+    logjac   : float
+               the log Jacobian
+    dlogjac  : array
+               n_eq array with the derivative of the log Jacobian with
+               respect to each lambda
+
+    """
+    revals = 1.0 - np.outer(np.ravel(lam), evals)
+    logjac = np.log(revals).sum()
+    dlogjac = -(evals / revals).sum(axis=1)
+    return np.real(logjac), np.real(dlogjac)
+
+
+def jacob_grid(lam, grid):
+    """Log-Jacobian for SUR Error model and its gradient,
+    interpolated from a grid of log determinants
+
+    Parameters
+    ----------
+    lam      : array
+               n_eq by 1 array of spatial autoregressive parameters
+    grid     : scipy.interpolate.CubicSpline
+               interpolated log determinant (see sputils.splogdet_spline)
+
+    Returns
+    -------
+    logjac   : float
+               the log Jacobian
+    dlogjac  : array
+               n_eq array with the derivative of the log Jacobian with
+               respect to each lambda
+
+    """
+    lam = np.ravel(lam)
+    return grid(lam).sum(), grid(lam, 1)
+
+
+def _err_c_loglik_grid(lam, n, y, ylag, x, xlag, grid):
+    # concentrated log-lik for error model, no constants, interpolated log-Jacobian
+    # (the Ord version with a single zero eigenvalue leaves out the Jacobian)
+    return err_c_loglik_ord(lam, n, y, ylag, x, xlag, np.zeros(1)) - grid(lam)
+
+
 def clik(lam, n, n2, n_eq, bigE, I, WS):
     """
     Concentrated (negative) log-likelihood for SUR Error model
@@ -973,13 +1093,61 @@ def clik(lam, n, n2, n_eq, bigE, I, WS):
     return -clik  # negative for minimize
 
 
-def surerrvm(n, n_eq, w, lam, sig):
+def clik_grad(lam, n, n2, bigE, WbigE, jac, jac_args):
+    """
+    Concentrated (negative) log-likelihood for SUR Error model and its
+    analytic gradient with respect to the lambdas
+
+    Parameters
+    ----------
+    lam         : array
+                  n_eq x 1 array of spatial autoregressive parameters
+    n           : int
+                  number of observations in each cross-section
+    n2          : int
+                  n/2
+    bigE        : array
+                  n by n_eq matrix with vectors of residuals for
+                  each equation
+    WbigE       : array
+                  n by n_eq matrix with the spatial lag of bigE
+    jac         : function
+                  log-Jacobian and its gradient (jacob_ord or jacob_grid)
+    jac_args    : tuple
+                  additional arguments for jac
+
+    Returns
+    -------
+    -clik       : float
+                  negative (for minimize) of the concentrated
+                  log-likelihood function
+    -dclik      : array
+                  n_eq array with its gradient
+
+    """
+    spfbigE = bigE - WbigE * np.ravel(lam)
+    sig = np.dot(spfbigE.T, spfbigE) / n
+    ldet = la.slogdet(sig)[1]
+    logjac, dlogjac = jac(lam, *jac_args)
+    clik = -n2 * ldet + logjac
+    # d ldet(sig) / d lam_r = -2/n [sig^-1 E_f'WE]_rr
+    dldet = -2.0 / n * np.diag(la.solve(sig, np.dot(spfbigE.T, WbigE)))
+    dclik = -n2 * dldet + dlogjac
+    return -clik, -dclik  # negative for minimize
+
+
+def surerrvm(n, n_eq, w, lam, sig, ntrace=None, seed=12345):
     """
     Asymptotic variance matrix for lambda and Sigma in
     ML SUR Error estimation
 
     Source: Anselin (1988) :cite:`Anselin1988`, Chapter 10.
 
+    The traces of D_i = W (I - lam_i W)^-1 are obtained without inverting
+    I - lam_i W: each equation is factored once by sparse LU and the traces
+    accumulated from solves on blocks of unit vectors (exact) or, when
+    ntrace is given, on random probes (Hutchinson estimator).
+
     Parameters
     ----------
     n         : int
@@ -991,6 +1159,11 @@ def surerrvm(n, n_eq, w, lam, sig):
                 n_eq by 1 vector with spatial autoregressive coefficients
     sig       : array
                 n_eq by n_eq matrix with cross-equation error covariances
+    ntrace    : int
+                number of random probes for stochastic trace estimation;
+                default = None, exact traces
+    seed      : int
+                seed for the random probes, only used with ntrace
 
     Returns
     -------
@@ -1006,35 +1179,10 @@ def surerrvm(n, n_eq, w, lam, sig):
     sisi = sigi * sig
     # elements of Psi_lam,lam
     # trace terms
-    trDi = np.zeros((n_eq, 1))
-    trDDi = np.zeros((n_eq, 1))
-    trDTDi = np.zeros((n_eq, 1))
-    trDTiDj = np.zeros((n_eq, n_eq))
-    WS = w.sparse
-    I = sp.identity(n)
-    for i in range(n_eq):
-        lami = lam[i][0]
-        lamWS = WS.multiply(lami)
-        B = I - lamWS
-        bb = B.todense()
-        Bi = la.inv(bb)
-        D = WS * Bi
-        trDi[i] = np.trace(D)
-        DD = np.dot(D, D)
-        trDDi[i] = np.trace(DD)
-        DD = np.dot(D.T, D)
-        trDTDi[i] = np.trace(DD)
-        for j in range(i + 1, n_eq):
-            lamj = lam[j][0]
-            lamWS = WS.multiply(lamj)
-            B = I - lamWS
-            bb = B.todense()
-            Bi = la.inv(bb)
-            Dj = WS * Bi
-            DD = np.dot(D.T, Dj)
-            trDTiDj[i, j] = np.trace(DD)
-            trDTiDj[j, i] = trDTiDj[i, j]
-    np.fill_diagonal(trDTiDj, trDTDi)
+    WS = w.sparse.tocsc()
+    I = sp.identity(n, format="csc")
+    LUs = [SuperLU((I - WS.multiply(lam[i][0])).tocsc()) for i in range(n_eq)]
+    trDi, trDDi, trDTiDj = sptrace_d(WS, LUs, ntrace, seed)
 
     sisjT = sisi * trDTiDj
     Vll = np.diagflat(trDDi) + sisjT
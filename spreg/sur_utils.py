@@ -8,6 +8,8 @@ __author__ = "Luc Anselin lanselin@gmail.com,    \
 import numpy as np
 import numpy.linalg as la
 import pandas as pd
+import scipy.linalg as sla
+from scipy import sparse as SP
 from .utils import spdot
 
 __all__ = [
@@ -17,6 +19,7 @@ __all__ = [
     "sur_dict2mat",
     "sur_corr",
     "sur_crossprod",
+    "sur_stack",
     "sur_est",
     "sur_resids",
     "filter_dict",
@@ -346,18 +349,68 @@ def sur_crossprod(bigZ, bigy):
     bigZZ      : dictionary
                  of all r,s cross-products of Z_r'Z_s
     """
+    ZZ, Zy = _sur_crossprod(bigZ, bigy)
+    bigK = np.array([[bigZ[r].shape[1]] for r in range(len(bigy.keys()))])
+    return _sur_block2dict(ZZ, Zy, bigK)
+
+
+def _sur_crossprod(bigZ, bigy):
+    """
+    Stacked cross products for SUR and 3SLS: Z'Z, with Z the n x sum(K)
+    matrix of the explanatory variables of all equations side by side, and
+    Z'Y, with Y the n x n_eq matrix of dependent variables. Block (r,s) of
+    Z'Z is Z_r'Z_s and block r of column s of Z'Y is Z_r'y_s.
+    """
+    Z = sur_stack(bigZ)
+    Y = sur_stack(bigy)
+    return _dense(spdot(Z.T, Z)), _dense(spdot(Z.T, Y))
+
+
+def _dense(a):
+    if SP.issparse(a):
+        return a.toarray()
+    return np.asarray(a)
+
+
+def _sur_block2dict(ZZ, Zy, bigK):
+    """
+    Dictionaries of the (r,s) blocks of stacked cross products, as returned
+    by sur_crossprod. The blocks are views on ZZ and Zy.
+    """
+    ke = np.cumsum(bigK.flatten())
+    ki = ke - bigK.flatten()
+    n_eq = len(ke)
     bigZZ = {}
-    n_eq = len(bigy.keys())
-    for r in range(n_eq):
-        for t in range(n_eq):
-            bigZZ[(r, t)] = spdot(bigZ[r].T, bigZ[t])
     bigZy = {}
     for r in range(n_eq):
         for t in range(n_eq):
-            bigZy[(r, t)] = spdot(bigZ[r].T, bigy[t])
+            bigZZ[(r, t)] = ZZ[ki[r] : ke[r], ki[t] : ke[t]]
+            bigZy[(r, t)] = Zy[ki[r] : ke[r], t : t + 1]
     return bigZZ, bigZy
 
 
+def sur_stack(bigZ):
+    """
+    Stack the matrices of a dictionary by equation side by side
+
+    Parameters
+    ----------
+    bigZ     : dictionary
+               of vectors or matrices with the same number of rows,
+               one for each equation
+
+    Returns
+    -------
+    mat      : array
+               n x sum(K) matrix with the columns of all equations,
+               sparse if any of the matrices is sparse
+    """
+    mats = [bigZ[r] for r in range(len(bigZ.keys()))]
+    if any(SP.issparse(m) for m in mats):
+        return SP.hstack(mats, format="csr")
+    return np.hstack(mats)
+
+
 def sur_est(bigXX, bigXy, bigE, bigK):
     """
     Basic SUR estimation equations for both SUR and 3SLS
@@ -367,10 +420,12 @@ def sur_est(bigXX, bigXy, bigE, bigK):
 
     bigXX        : dictionary
                    of cross-product matrices X_t'X_r
-                   (created by sur_crossprod)
+                   (created by sur_crossprod), or the stacked
+                   sum(K) x sum(K) cross products X'X
     bigXy        : dictionary
                    of cross-product matrices X_t'y_r
-                   (created by sur_crossprod)
+                   (created by sur_crossprod), or the stacked
+                   sum(K) x n_eq cross products X'Y
     bigE     : array
                n by n_eq array of residuals
 
@@ -384,30 +439,34 @@ def sur_est(bigXX, bigXy, bigE, bigK):
     sig    : array
              residual covariance matrix (using previous residuals)
 
+    """
+    beta, varb, sig = _sur_est(bigXX, bigXy, bigE, bigK)
+    bSUR = sur_mat2dict(beta, bigK)
+    return bSUR, varb, sig
+
+
+def _sur_est(bigXX, bigXy, bigE, bigK):
+    """
+    SUR estimation on stacked cross products. X'(sig^-1 kron I)X is the
+    elementwise product of X'X with sig^-1 expanded to its blocks, and it is
+    solved with a single Cholesky factorization. Returns the stacked
+    coefficients instead of a dictionary.
     """
     n = bigE.shape[0]
     n_eq = bigE.shape[1]
+    if isinstance(bigXX, dict):
+        bigXX = np.block([[bigXX[(r, t)] for t in range(n_eq)] for r in range(n_eq)])
+        bigXy = np.block([[bigXy[(r, t)] for t in range(n_eq)] for r in range(n_eq)])
     sig = np.dot(bigE.T, bigE) / n
     sigi = la.inv(sig)
-    sigiXX = {}
-    for r in range(n_eq):
-        for t in range(n_eq):
-            sigiXX[(r, t)] = bigXX[(r, t)] * sigi[r, t]
-    sigiXy = {}
-    for r in range(n_eq):
-        sxy = 0.0
-        for t in range(n_eq):
-            sxy = sxy + sigi[r, t] * bigXy[(r, t)]
-        sigiXy[r] = sxy
-    #xsigy = np.vstack((sigiXy[t] for t in range(n_eq)))
-    xsigy = np.vstack(tuple(sigiXy[t] for t in range(n_eq)))
-    #xsigx = np.vstack(((np.hstack(sigiXX[(r, t)] for t in range(n_eq))) for r in range(n_eq)))
-    array_lists = [[sigiXX[(r, t)] for t in range(n_eq)] for r in range(n_eq)]
-    xsigx = np.vstack([np.hstack(arr_list) for arr_list in array_lists])    
-    varb = la.inv(xsigx)
+    kk = bigK.flatten()
+    sigi_r = np.repeat(sigi, kk, axis=0)
+    xsigx = bigXX * np.repeat(sigi_r, kk, axis=1)
+    xsigy = (bigXy * sigi_r).sum(axis=1, keepdims=True)
+    cxsigx = sla.cho_factor(xsigx)
+    varb = sla.cho_solve(cxsigx, np.eye(xsigx.shape[0]))
     beta = np.dot(varb, xsigy)
-    bSUR = sur_mat2dict(beta, bigK)
-    return bSUR, varb, sig
+    return beta, varb, sig
 
 
 def sur_resids(bigy, bigX, beta):
@@ -465,6 +524,18 @@ def sur_predict(bigy, bigX, beta):
     return bigYP
 
 
+def _sur_predict(X, beta, bigK):
+    """
+    Predicted values by equation from the stacked n x sum(K) explanatory
+    variables and stacked coefficients, as an n x n_eq array.
+    """
+    kk = bigK.flatten()
+    # sum(K) x n_eq matrix with the coefficients of equation r in column r
+    B = np.zeros((kk.sum(), len(kk)))
+    B[np.arange(kk.sum()), np.repeat(np.arange(len(kk)), kk)] = beta.flatten()
+    return spdot(X, B)
+
+
 def filter_dict(lam, bigZ, bigZlag):
     """
     Dictionary of spatially filtered variables for use in SUR
@@ -5,7 +5,7 @@ from spreg import diagnostics
 from spreg.ols import OLS as OLS
 from spreg.twosls import TSLS as TSLS
 from spreg.twosls_sp import GM_Lag
-from spreg.diagnostics_sp import LMtests, MoranRes, spDcache, AKtest
+from spreg.diagnostics_sp import LMtests, MoranRes, spDcache, AKtest, KBtests
 from libpysal.common import RTOL
 
 
@@ -52,6 +52,24 @@ class TestLMtests(unittest.TestCase):
         np.testing.assert_allclose(lms.sarma, sarma, RTOL)
 
 
+    def test_kb_all(self):
+        lms = LMtests(self.ols, self.w)
+        kb = KBtests(self.ols, self.w).test()
+        np.testing.assert_allclose(kb["lmwx"], lms.lmwx, RTOL)
+        np.testing.assert_allclose(kb["lmspdurbin"], lms.lmspdurbin, RTOL)
+        np.testing.assert_allclose(kb["rlmwx"], lms.rlmwx, RTOL)
+        np.testing.assert_allclose(kb["rlmdurlag"], lms.rlmdurlag, RTOL)
+        np.testing.assert_allclose(kb["lmslxerr"], lms.lmslxerr, RTOL)
+
+    def test_kb_screen(self):
+        res = KBtests(self.ols, self.w).screen()
+        self.assertEqual([r[0] for r in res], [[True, False], [False, True], [True, True]])
+        lmwx = np.array([0.514356, 0.473259])
+        np.testing.assert_allclose(res[0][1]["lmwx"], lmwx, RTOL)
+        lmspdurbin = np.array([2.689264, 0.260636])
+        np.testing.assert_allclose(res[0][1]["lmspdurbin"], lmspdurbin, RTOL)
+
+
 class TestMoranRes(unittest.TestCase):
     def setUp(self):
         db = libpysal.io.open(libpysal.examples.get_path("columbus.dbf"), "r")
@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+import libpysal
+import numpy as np
+from spreg.experiment import design_grid, run_experiment
+
+
+class Test_Experiment(unittest.TestCase):
+    def setUp(self):
+        self.w = libpysal.weights.lat2W(7, 7)
+        self.w.transform = "r"
+        self.design = {"w": ["lat"], "dgp": ["dgp_lag", "dgp_ols"], "rho": [0.4]}
+
+    def test_design_grid(self):
+        cells = design_grid({"w": ["a", "b"], "dgp": "dgp_lag", "rho": [0.0, 0.5]})
+        self.assertEqual(len(cells), 4)
+        self.assertEqual(cells[3], {"w": "b", "dgp": "dgp_lag", "rho": 0.5})
+
+    def test_run_experiment(self):
+        with tempfile.TemporaryDirectory() as outdir:
+            res = run_experiment(
+                self.design, {"lat": self.w}, ["OLS", "GM_Lag"],
+                r=12, chunk=5, nworkers=1, outdir=outdir,
+            )
+            betas = np.load(os.path.join(outdir, "cell0_GM_Lag_betas.npy"))
+        self.assertEqual(betas.shape, (3, 12))
+        gm = res[(res.cell == 0) & (res.estimator == "GM_Lag")]
+        np.testing.assert_allclose(gm["mean"], betas.mean(axis=1))
+        np.testing.assert_allclose(
+            gm["rmse"], np.sqrt(((betas - np.array([[1], [1], [0.4]])) ** 2).mean(axis=1))
+        )
+        self.assertTrue(((res["size"] >= 0) & (res["size"] <= 1)).all())
+        # the draws do not depend on the other estimators
+        res2 = run_experiment(self.design, {"lat": self.w}, ["GM_Lag"], r=12, chunk=5, nworkers=1)
+        np.testing.assert_allclose(res2["mean"], res[res.estimator == "GM_Lag"]["mean"])
+
+    def test_true_values(self):
+        design = {
+            "w": ["lat"],
+            "dgp": ["dgp_lag", "dgp_sperror", "dgp_slx", "dgp_spdurbin", "dgp_ols"],
+            "rho": [0.4], "lam": [0.3], "gamma": [0.5],
+        }
+        estimators = ["OLS", "GM_Lag", "GM_Error",
+                      ("GM_Lag", {"slx_lags": 1}), ("OLS", {"slx_lags": 1})]
+        res = run_experiment(design, {"lat": self.w}, estimators, r=2, nworkers=1)
+        # OLS, GM_Lag, GM_Error, GM_Lag with WX, OLS with WX
+        expected = {
+            "dgp_lag": [1, 1] + [1, 1, 0.4] + [1, 1, 0] + [1, 1, 0, 0.4] + [1, 1, 0],
+            "dgp_sperror": [1, 1] + [1, 1, 0] + [1, 1, 0.3] + [1, 1, 0, 0] + [1, 1, 0],
+            "dgp_slx": [1, 1] + [1, 1, 0] + [1, 1, 0] + [1, 1, 0.5, 0] + [1, 1, 0.5],
+            "dgp_spdurbin": [1, 1] + [1, 1, 0.4] + [1, 1, 0] + [1, 1, 0.5, 0.4] + [1, 1, 0.5],
+            "dgp_ols": [1, 1] + [1, 1, 0] + [1, 1, 0] + [1, 1, 0, 0] + [1, 1, 0],
+        }
+        for c, cell in enumerate(design_grid(design)):
+            np.testing.assert_allclose(res[res.cell == c]["true"], expected[cell["dgp"]])
+
+    def test_no_true_value(self):
+        design = {"w": ["lat"], "dgp": ["dgp_mess"], "rho": [0.4]}
+        res = run_experiment(design, {"lat": self.w}, ["GM_Lag"], r=4, nworkers=1)
+        self.assertTrue(np.isnan(res["true"].iloc[2]))
+        self.assertTrue(np.isnan(res["size"].iloc[2]))
+        self.assertFalse(res["size"].iloc[:2].isna().any())
+        self.assertTrue((res["nfail"] == 0).all())
+
+    def test_failures(self):
+        design = {"w": ["lat"], "dgp": ["dgp_lag"], "rho": [0.4]}
+        with self.assertRaisesRegex(Exception, "robust"):
+            run_experiment(
+                design, {"lat": self.w}, ["OLS", ("GM_Lag", {"robust": "bogus"})],
+                r=4, nworkers=1,
+            )
+
+    def test_nworkers(self):
+        design = {"w": ["lat"], "dgp": ["dgp_lag", "dgp_sperror"], "rho": [0.4], "lam": [0.3]}
+        args = (design, {"lat": self.w}, ["GM_Lag", "GM_Error"])
+        res1 = run_experiment(*args, r=6, chunk=2, nworkers=1)
+        res2 = run_experiment(*args, r=6, chunk=2, nworkers=2)
+        self.assertEqual(len(res1), len(res2))
+        for col in ("true", "nrep", "mean", "rmse", "size", "power"):
+            np.testing.assert_allclose(res2[col], res1[col])
+
+
+if __name__ == "__main__":
+    unittest.main()
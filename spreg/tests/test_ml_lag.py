@@ -126,6 +126,42 @@ class TestMLError(unittest.TestCase):
     def test_LU(self):
         self._estimate_and_compare(method="LU")
 
+    def test_impacts(self):
+        reg = ML_Lag(self.y, self.x, w=self.w, spat_impacts=["simple", "mc"])
+        simple = reg.sp_impacts["simple"]
+        # unit direct multiplier: the direct effects are the coefficients
+        np.testing.assert_allclose(simple["direct"], reg.betas[1:4, 0], RTOL)
+        np.testing.assert_allclose(simple["direct_se"], reg.std_err[1:4], rtol=0.1)
+        mc = reg.sp_impacts["mc"]
+        adi, aii, ati = reg.sp_multipliers["mc"]
+        np.testing.assert_allclose(mc["total"], ati * reg.betas[1:4, 0], RTOL)
+        self.assertTrue((mc["total_q025"] < mc["total"]).all())
+        self.assertTrue((mc["total_q975"] > mc["total"]).all())
+
+    def test_impacts_mc_options(self):
+        reg = ML_Lag(
+            self.y,
+            self.x,
+            w=self.w,
+            spat_impacts=["full", "mc"],
+            impacts_nprobe=20,
+            impacts_order=150,
+        )
+        np.testing.assert_allclose(
+            reg.sp_multipliers["mc"], reg.sp_multipliers["full"], rtol=0.005
+        )
+        self.assertIn("spreg_trWpow_20_12345_2", self.w._cache)
+
+    def test_impacts_draws(self):
+        reg = ML_Lag(self.y, self.x, w=self.w, spat_impacts=["full", "mc"])
+        full, mc = reg.sp_impacts["full"], reg.sp_impacts["mc"]
+        self.assertEqual(full.attrs["ndraws"], 1000)
+        self.assertEqual(mc.attrs["ndraws"], 1000)
+        # same draws, exact and series multipliers
+        for c in ["direct_se", "indirect_se", "total_se"]:
+            np.testing.assert_allclose(mc[c], full[c], rtol=0.005)
+        self.assertIn("simulated from 1000 of 1000 draws", reg.summary)
+
 
 if __name__ == "__main__":
     unittest.main()
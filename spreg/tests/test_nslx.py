@@ -3,6 +3,8 @@ import numpy as np
 import libpysal
 import spreg
 import geopandas as gpd
+from spreg.utils import make_wnslx
+from spreg.nslx import nlmod, nslxobj, _nlbuffers, _nlmod_jac, _nslxobj_jac
 RTOL = 1e-04
 
 class TestNSLX(unittest.TestCase):
@@ -30,5 +32,53 @@ class TestNSLX(unittest.TestCase):
             3.41278119e-02]])
         np.testing.assert_allclose(reg.vm, vm,RTOL)  
 
+class TestNSLXGradient(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(5)
+        self.coords = rng.random((60, 2))
+        self.xw = rng.normal(size=(60, 2))
+        self.x = np.hstack((np.ones((60, 1)), rng.normal(size=(60, 2))))
+        self.y = rng.normal(size=(60, 1))
+
+    def test_nlmod_jac(self):
+        for transform in ["power", "exponential"]:
+            w = [make_wnslx(self.coords, (6, np.inf, transform))]
+            nlbuf = _nlbuffers(w, (transform,))
+            for alpha in [np.array([0.5, 2.0]), np.array([0.0, 1.0])]:
+                wx, dwx = _nlmod_jac(alpha, self.xw, nlbuf)
+                if alpha.min() > 0:
+                    np.testing.assert_allclose(wx, nlmod(alpha, self.xw, w, (transform,)))
+                else:
+                    # w ** 0 is one for every stored weight, zero weights included
+                    ones = w[0].copy()
+                    ones.data[:] = 1.0
+                    np.testing.assert_allclose(wx[:, 0], ones @ self.xw[:, 0])
+                eps = 1e-6
+                fd = (_nlmod_jac(alpha + eps, self.xw, nlbuf)[0]
+                      - _nlmod_jac(alpha - eps, self.xw, nlbuf)[0]) / (2 * eps)
+                if transform == "exponential" or alpha.min() > 0:
+                    np.testing.assert_allclose(dwx, fd, rtol=1e-5, atol=1e-8)
+
+    def test_nslxobj_jac(self):
+        gamma = np.array([0.5, 1.0, -1.0, 0.8, 1.5])
+        for transform in ["power", "exponential"]:
+            w = [make_wnslx(self.coords, (6, np.inf, transform))]
+            nlbuf = _nlbuffers(w, (transform,))
+            res2, grad = _nslxobj_jac(gamma, self.y, self.x, self.xw, nlbuf, False)
+            np.testing.assert_allclose(
+                res2, nslxobj(gamma, self.y, self.x, self.xw, w, (transform,), False)[0, 0]
+            )
+            eps = 1e-6
+            fd = np.zeros(gamma.shape[0])
+            for j in range(gamma.shape[0]):
+                step = np.zeros(gamma.shape[0])
+                step[j] = eps
+                fd[j] = (
+                    _nslxobj_jac(gamma + step, self.y, self.x, self.xw, nlbuf, False)[0]
+                    - _nslxobj_jac(gamma - step, self.y, self.x, self.xw, nlbuf, False)[0]
+                ) / (2 * eps)
+            np.testing.assert_allclose(grad, fd, rtol=1e-5)
+
+
 if __name__ == '__main__':
     unittest.main()
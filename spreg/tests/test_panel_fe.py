@@ -48,6 +48,13 @@ class Test_Panel_FE_Lag(unittest.TestCase):
         schwarz = 135900.46482786257
         np.testing.assert_allclose(reg.schwarz, schwarz, RTOL)
 
+    def test_Panel_ord(self):
+        reg = Panel_FE_Lag(self.y, self.x, w=self.w)
+        reg_ord = Panel_FE_Lag(self.y, self.x, w=self.w, method="ord")
+        np.testing.assert_allclose(reg_ord.betas, reg.betas, RTOL)
+        np.testing.assert_allclose(reg_ord.vm, reg.vm, RTOL)
+        np.testing.assert_allclose(reg_ord.logll, reg.logll, RTOL)
+
 
 class Test_Panel_FE_Error(unittest.TestCase):
     def setUp(self):
@@ -92,6 +99,13 @@ class Test_Panel_FE_Error(unittest.TestCase):
         schwarz = 135886.27609456133
         np.testing.assert_allclose(reg.schwarz, schwarz, RTOL)
 
+    def test_Panel_ord(self):
+        reg = Panel_FE_Error(self.y, self.x, w=self.w)
+        reg_ord = Panel_FE_Error(self.y, self.x, w=self.w, method="ord")
+        np.testing.assert_allclose(reg_ord.betas, reg.betas, RTOL)
+        np.testing.assert_allclose(reg_ord.vm, reg.vm, RTOL)
+        np.testing.assert_allclose(reg_ord.logll, reg.logll, RTOL)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -69,6 +69,17 @@ class Test_Panel_RE_Lag(unittest.TestCase):
         schwarz = 6283.3755390962015
         np.testing.assert_allclose(reg.schwarz, schwarz, RTOL)
 
+    def test_Panel_joint(self):
+        reg = Panel_RE_Lag(self.y, self.x, w=self.w, method="ord", joint=True)
+        betas = np.array(
+            [[4.44421994], [2.52821717], [2.24768846], [0.25846846], [0.68426639]]
+        )
+        np.testing.assert_allclose(reg.betas, betas, rtol=1e-4)
+        vm = np.array([0.08734092, 0.05232857, 0.05814063, 0.00164801, 0.00086908])
+        np.testing.assert_allclose(reg.vm.diagonal(), vm, rtol=1e-4)
+        self.assertGreater(reg.niter, 0)
+        self.assertGreaterEqual(reg.nfev, reg.niter)
+
 
 class Test_Panel_RE_Error(unittest.TestCase):
     def setUp(self):
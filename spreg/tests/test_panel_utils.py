@@ -0,0 +1,40 @@
+import unittest
+import libpysal
+import numpy as np
+from scipy import sparse as SP
+from spreg.panel_utils import demean_panel, panel_lag, panel_mean
+from libpysal.common import RTOL
+
+
+class Test_Panel_Operators(unittest.TestCase):
+    def setUp(self):
+        self.w = libpysal.io.open(libpysal.examples.get_path("columbus.gal")).read()
+        self.w.transform = "r"
+        self.n, self.t = self.w.n, 3
+        np.random.seed(12345)
+        self.x = np.random.normal(size=(self.n * self.t, 2))
+        self.w_nt = SP.kron(SP.identity(self.t), self.w.sparse)
+        self.q1 = SP.kron(np.ones((self.t, self.t)) / self.t, SP.identity(self.n))
+
+    def test_panel_lag(self):
+        lag = panel_lag(self.w, self.x, self.n, self.t)
+        np.testing.assert_allclose(lag, self.w_nt @ self.x, RTOL)
+        dense = self.w.full()[0]
+        lag = panel_lag(dense, self.x, self.n, self.t)
+        np.testing.assert_allclose(lag, self.w_nt @ self.x, RTOL)
+        lag = panel_lag(self.w, SP.csr_matrix(self.x), self.n, self.t)
+        np.testing.assert_allclose(lag.toarray(), self.w_nt @ self.x, RTOL)
+
+    def test_panel_mean(self):
+        xm = panel_mean(self.x, self.n, self.t)
+        np.testing.assert_allclose(xm, self.q1 @ self.x, RTOL)
+        xm = panel_mean(SP.csr_matrix(self.x), self.n, self.t)
+        np.testing.assert_allclose(xm.toarray(), self.q1 @ self.x, RTOL)
+
+    def test_demean_panel(self):
+        xd = demean_panel(self.x, self.n, self.t, phi=0.25)
+        np.testing.assert_allclose(xd, self.x - 0.75 * (self.q1 @ self.x), RTOL)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+import libpysal
+import numpy as np
+from spreg import OLS, TSLS
+from spreg.robust import KernelOperator, robust_vm, robust_vm_multi
+from libpysal.common import RTOL
+
+
+class Test_Kernel_Operator(unittest.TestCase):
+    def setUp(self):
+        db = libpysal.io.open(libpysal.examples.get_path("columbus.dbf"), "r")
+        self.y = np.array(db.by_col("HOVAL")).reshape(-1, 1)
+        self.X = np.array([db.by_col("INC"), db.by_col("CRIME")]).T
+        self.yd = np.array(db.by_col("CRIME")).reshape(-1, 1)
+        self.q = np.array(db.by_col("DISCBD")).reshape(-1, 1)
+        coords = np.array([db.by_col("X"), db.by_col("Y")]).T
+        self.wk = libpysal.weights.Kernel(
+            coords, k=5, function="triangular", fixed=False, diagonal=True
+        )
+
+    def test_meat(self):
+        reg = OLS(self.y, self.X)
+        u = np.random.default_rng(12345).normal(size=(reg.n, 7))
+        op = KernelOperator(self.wk, maxsize=reg.n * reg.k * 3)
+        psi0 = op.meat(reg.x, u)
+        kw = self.wk.full()[0]
+        for j in range(7):
+            xu = reg.x * u[:, j : j + 1]
+            np.testing.assert_allclose(psi0[j], xu.T @ kw @ xu, RTOL)
+        xus = [reg.x * u[:, j : j + 1] for j in range(7)]
+        for p, q in zip(op.meat(xus), psi0):
+            np.testing.assert_allclose(p, q, RTOL)
+        op32 = KernelOperator(self.wk, dtype=np.float32)
+        np.testing.assert_allclose(op32.meat(reg.x, u), psi0, rtol=1e-4)
+
+    def test_robust_vm_multi(self):
+        reg = OLS(self.y, self.X, robust="hac", gwk=self.wk)
+        tsls = TSLS(self.y, self.X[:, :1], self.yd, self.q, robust="hac", gwk=self.wk)
+        reg2 = OLS(self.y, self.X[:, :1])
+        vms = robust_vm_multi([reg, tsls, reg2], gwk=self.wk)
+        np.testing.assert_allclose(vms[0], reg.vm, RTOL)
+        np.testing.assert_allclose(vms[1], tsls.vm, RTOL)
+        np.testing.assert_allclose(vms[2], robust_vm(reg2, gwk=self.wk), RTOL)
+        self.assertIn("spreg_kernel_op", self.wk._cache)
+        op = KernelOperator(self.wk, dtype=np.float32)
+        reg32 = OLS(self.y, self.X, robust="hac", gwk=op)
+        np.testing.assert_allclose(reg32.vm, reg.vm, rtol=1e-4)
+
+
+if __name__ == "__main__":
+    unittest.main()
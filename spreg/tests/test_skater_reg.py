@@ -0,0 +1,62 @@
+import unittest
+import warnings
+import numpy as np
+import libpysal
+from spreg import OLS, GM_Lag, Skater_reg
+
+# labels of the original, full search implementation of find_cut
+LABELS_OLS = [
+    0, 0, 0, 0, 1, 1, 1, 1, 0, 0, 0, 0, 0, 1, 1, 1, 0, 0, 0, 2, 0, 1, 1, 1,
+    0, 0, 2, 2, 2, 1, 1, 1, 0, 2, 2, 2, 2, 1, 1, 1, 2, 2, 2, 2, 2, 1, 1, 1,
+    2, 2, 2, 2, 2, 1, 1, 1, 2, 2, 2, 2, 2, 1, 1, 1,
+]
+LABELS_NONE = [
+    0, 0, 0, 0, 1, 1, 1, 1, 0, 0, 0, 0, 0, 1, 1, 1, 0, 0, 0, 2, 1, 1, 1, 1,
+    0, 0, 2, 2, 2, 1, 1, 1, 0, 1, 2, 2, 2, 1, 1, 1, 1, 1, 1, 1, 2, 1, 1, 1,
+    1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1,
+]
+LABELS_LAG = [
+    0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 0, 0, 0, 0,
+    0, 0, 1, 1, 1, 0, 0, 0, 0, 2, 1, 1, 1, 0, 0, 0, 2, 2, 1, 1, 1, 0, 0, 0,
+    2, 2, 1, 1, 1, 1, 0, 0, 2, 2, 2, 1, 1, 1, 0, 0,
+]
+
+
+class Test_Skater_reg(unittest.TestCase):
+    def setUp(self):
+        # four regimes with different coefficients on an 8x8 lattice
+        self.w = libpysal.weights.lat2W(8, 8)
+        n = self.w.n
+        rng = np.random.default_rng(3)
+        rows, cols = np.divmod(np.arange(n), 8)
+        regime = (rows >= 4).astype(int) + (cols >= 5).astype(int) * 2
+        self.x = rng.normal(size=(n, 2))
+        b = np.array([[1.0, 2.0], [-1.0, 0.5], [0.5, -2.0], [2.0, 1.0]])[regime]
+        self.y = (1 + regime + (self.x * b).sum(1) + 0.3 * rng.normal(size=n)).reshape(-1, 1)
+        self.data = np.hstack((self.x, self.y))
+        self.wr = libpysal.weights.lat2W(8, 8)
+        self.wr.transform = "r"
+
+    def _fit(self, data_reg, **kwargs):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            res = Skater_reg().fit(3, self.w, self.data, data_reg, quorum=8, **kwargs)
+        return res.current_labels_.tolist()
+
+    def test_ols(self):
+        data_reg = {"reg": OLS, "y": self.y, "x": self.x}
+        self.assertEqual(self._fit(data_reg), LABELS_OLS)
+        self.assertEqual(self._fit(data_reg, workers=2), LABELS_OLS)
+
+    def test_no_regression(self):
+        self.assertEqual(self._fit(None), LABELS_NONE)
+        self.assertEqual(self._fit(None, workers=2), LABELS_NONE)
+
+    def test_lag(self):
+        data_reg = {"reg": GM_Lag, "y": self.y, "x": self.x, "w": self.wr}
+        self.assertEqual(self._fit(data_reg), LABELS_LAG)
+        self.assertEqual(self._fit(data_reg, workers=2), LABELS_LAG)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,6 +4,7 @@ from warnings import warn as Warn, filterwarnings
 import unittest as ut
 import numpy as np
 import scipy.sparse as spar
+import libpysal as lps
 
 filterwarnings("ignore", category=spar.SparseEfficiencyWarning)
 
@@ -21,6 +22,13 @@ COVERAGE = [
     "sphstack",
     "spmultiply",
     "spdot",
+    "sptrace_wtw_ww",
+    "sptrace_wpow",
+    "sptrace_d",
+    "spw_evals",
+    "splogdet_spline",
+    "spmultiplier",
+    "i_multipliers",
 ]
 
 NOT_COVERED = set(ALL_FUNCS).difference(COVERAGE)
@@ -72,6 +80,128 @@ class Test_Sparse_Utils(ut.TestCase):
         np.testing.assert_array_equal(dd, sd)
         np.testing.assert_array_equal(dd, ss.toarray())
 
+    def test_trace_wtw_ww(self):
+        d = self.dense0.astype(float)
+        exp = np.trace(d.T.dot(d) + d.dot(d))
+        np.testing.assert_allclose(spu.sptrace_wtw_ww(self.sparse0), exp)
+        np.testing.assert_allclose(
+            spu.sptrace_wtw_ww(self.sparse0, separate=True),
+            (np.trace(d.dot(d)), np.trace(d.T.dot(d))),
+        )
+
+    def test_trace_wpow(self):
+        w = lps.weights.lat2W(10, 10)
+        w.transform = "r"
+        d = w.full()[0]
+        exp = [np.trace(np.linalg.matrix_power(d, p)) for p in range(6)]
+        trw = spu.sptrace_wpow(w, order=5, nprobe=200)
+        np.testing.assert_allclose(trw[:3], exp[:3])
+        np.testing.assert_allclose(trw, exp, rtol=0.1, atol=1.0)
+        np.testing.assert_array_equal(spu.sptrace_wpow(w, order=3, nprobe=200), trw[:4])
+
+    def test_trace_d(self):
+        w = lps.weights.lat2W(6, 6)
+        w.transform = "r"
+        n = w.n
+        W = w.full()[0]
+        WS = w.sparse.tocsc()
+        I = spar.identity(n, format="csc")
+        rhos = [0.3, -0.2, 0.6]
+        LUs = [spar.linalg.splu((I - r * WS).tocsc()) for r in rhos]
+        D = [W @ np.linalg.inv(np.eye(n) - r * W) for r in rhos]
+        trD, trDD, trDTD = spu.sptrace_d(WS, LUs)
+        np.testing.assert_allclose(trD.ravel(), [np.trace(d) for d in D])
+        np.testing.assert_allclose(trDD.ravel(), [np.trace(d @ d) for d in D])
+        np.testing.assert_allclose(
+            trDTD, [[np.trace(a.T @ b) for b in D] for a in D]
+        )
+        trD1, trDD1, trDTD1 = spu.sptrace_d(WS, LUs, ntrace=2000)
+        np.testing.assert_allclose(trD1, trD, rtol=0.1, atol=0.05)
+        np.testing.assert_allclose(trDTD1, trDTD, rtol=0.1)
+
+    def test_evals_ldet(self):
+        w = lps.weights.lat2W(6, 6)
+        w.transform = "r"
+        W = w.full()[0]
+        evals = spu.spw_evals(w)
+        np.testing.assert_allclose(
+            np.sort(evals), np.sort(np.real(np.linalg.eigvals(W))), atol=1e-10
+        )
+        self.assertIs(spu.spw_evals(w), evals)
+        grid = spu.splogdet_spline(w)
+        for rho in [-0.55, 0.25, 0.9]:
+            exp = np.linalg.slogdet(np.eye(w.n) - rho * W)[1]
+            np.testing.assert_allclose(grid(rho), exp, rtol=1e-6)
+            np.testing.assert_allclose(np.log(1.0 - rho * evals).sum(), exp)
+        self.assertIs(spu.splogdet_spline(w), grid)
+        # binary and row-standardized asymmetric weights are left unchanged
+        w = lps.weights.lat2W(6, 6)
+        evals = spu.spw_evals(w)
+        self.assertEqual(w.transform, "O")
+        np.testing.assert_allclose(
+            np.sort(evals), np.sort(np.linalg.eigvalsh(w.full()[0])), atol=1e-10
+        )
+        w = lps.weights.KNN.from_array(np.random.default_rng(1).random((30, 2)), k=3)
+        w.transform = "r"
+        evals = spu.spw_evals(w)
+        self.assertEqual(w.transform, "R")
+        np.testing.assert_allclose(
+            np.sort_complex(evals), np.sort_complex(np.linalg.eigvals(w.full()[0])),
+            atol=1e-10,
+        )
+
+    def test_spmultiplier_mc(self):
+        w = lps.weights.lat2W(10, 10)
+        w.transform = "r"
+        full = spu.spmultiplier(w, 0.5, method="full")
+        mc = spu.spmultiplier(w, 0.5, method="mc")
+        np.testing.assert_allclose(mc["adi"], full["adi"], rtol=0.01)
+        np.testing.assert_allclose(mc["ati"], full["ati"])
+        self.assertTrue(mc["pow"] > 2)
+        for rho in [0.9, 0.95, 0.995]:
+            full = spu.spmultiplier(w, rho, method="full")
+            mc = spu.spmultiplier(w, rho, method="mc")
+            np.testing.assert_allclose(mc["adi"], full["adi"], rtol=0.02)
+        # exact traces up to W^4 only, without filling in the higher powers
+        trw = spu.sptrace_wpow(w, order=10)
+        W = w.full()[0]
+        np.testing.assert_allclose(
+            trw[:5], [np.trace(np.linalg.matrix_power(W, p)) for p in range(5)]
+        )
+
+    def test_spmultiplier_mc_probes(self):
+        # traces beyond W^2 from the random probes only
+        w = lps.weights.lat2W(40, 40, rook=False)
+        w.transform = "r"
+        for rho in [0.9, 0.98]:
+            full = spu.spmultiplier(w, rho, method="full")
+            adi, pow, conv = spu._mc_adi(w, rho, maxpow=1)
+            np.testing.assert_allclose(adi, full["adi"], rtol=0.005)
+            self.assertTrue(conv)
+
+    def test_i_multipliers_lu(self):
+        w = lps.weights.lat2W(10, 10, rook=False)
+        w.transform = "r"
+        full = spu.i_multipliers(w, 0.5, method="full")
+        lu = spu.i_multipliers(w, 0.5, method="lu")
+        np.testing.assert_allclose(lu.values, full.values, atol=1e-4)
+        lu = spu.i_multipliers(w.sparse, 0.5)
+        np.testing.assert_allclose(lu.values, full.values, atol=1e-4)
+
+    def test_i_multipliers_high_rho(self):
+        w = lps.weights.lat2W(40, 40, rook=False)
+        w.transform = "r"
+        for rho, tol in [(0.9, 0.005), (0.98, 0.25)]:
+            full = spu.i_multipliers(w, rho, method="full")
+            np.testing.assert_array_equal(spu.i_multipliers(w.sparse, rho).values, full.values)
+            lu = spu.i_multipliers(w, rho, method="lu")
+            err = np.abs(lu["Direct"] - full["Direct"])
+            self.assertTrue(err.max() < tol)
+            self.assertTrue(err.mean() < tol / 5)
+            # row and column sums are exact solves
+            for c in ["EofNbrs", "EonNbrs"]:
+                np.testing.assert_allclose(lu["Direct"] + lu[c], full["Direct"] + full[c])
+
     def test_logdet(self):
         dld = spu.splogdet(self.d0td0)
         sld = spu.splogdet(self.s0ts0)
@@ -1,7 +1,10 @@
 import unittest
 import numpy as np
-from spreg.sur_utils import sur_dictxy, sur_dictZ
-from spreg.sur import SUR, ThreeSLS
+from scipy import sparse as SP
+from spreg.sur_utils import sur_dictxy, sur_dictZ, sur_stack, sur_est, _sur_est
+from spreg.sur import SUR, ThreeSLS, BaseSUR
+from spreg.diagnostics_sur import surLMe, surLMlag
+from spreg.sputils import sptrace_wtw_ww
 import libpysal
 import geopandas as gpd
 from libpysal.common import RTOL
@@ -594,6 +597,101 @@ class Test_SUR(unittest.TestCase):
     # """
 
 
+class Test_SUR_stacked(unittest.TestCase):
+    def setUp(self):
+        db = libpysal.io.open(libpysal.examples.get_path("columbus.dbf"), "r")
+        self.bigy, self.bigX, _, _ = sur_dictxy(
+            db, ["HOVAL", "CRIME"], [["INC"], ["INC", "DISCBD"]]
+        )
+        self.regimes = db.by_col("NSA")
+
+    def test_sur_stack(self):
+        X = sur_stack(self.bigX)
+        np.testing.assert_array_equal(X, np.hstack((self.bigX[0], self.bigX[1])))
+        sX = sur_stack({0: SP.csr_matrix(self.bigX[0]), 1: self.bigX[1]})
+        self.assertTrue(SP.issparse(sX))
+        np.testing.assert_array_equal(sX.toarray(), X)
+
+    def test_sur_est(self):
+        X = sur_stack(self.bigX)
+        Y = sur_stack(self.bigy)
+        bigK = np.array([[2], [3]])
+        E = np.random.default_rng(12345).normal(size=Y.shape)
+        beta, varb, sig = _sur_est(X.T @ X, X.T @ Y, E, bigK)
+        # GLS on the equations stacked one below the other
+        n = Y.shape[0]
+        Xs = np.zeros((2 * n, 5))
+        Xs[:n, :2], Xs[n:, 2:] = self.bigX[0], self.bigX[1]
+        omegai = np.kron(np.linalg.inv(E.T @ E / n), np.eye(n))
+        varb0 = np.linalg.inv(Xs.T @ omegai @ Xs)
+        beta0 = varb0 @ Xs.T @ omegai @ Y.T.reshape(-1, 1)
+        np.testing.assert_allclose(varb, varb0, RTOL, atol=1e-12)
+        np.testing.assert_allclose(beta, beta0, RTOL)
+        bSUR, varb1, sig1 = sur_est(X.T @ X, X.T @ Y, E, bigK)
+        np.testing.assert_allclose(np.vstack((bSUR[0], bSUR[1])), beta0, RTOL)
+
+    def test_sur_regimes(self):
+        reg = SUR(self.bigy, self.bigX, regimes=self.regimes, iter=True)
+        self.assertTrue(SP.issparse(reg.bigX[0]))
+        bigX = {r: reg.bigX[r].toarray() for r in range(reg.n_eq)}
+        reg0 = BaseSUR(self.bigy, bigX, iter=True)
+        np.testing.assert_allclose(reg.varb, reg0.varb, RTOL, atol=1e-12)
+        np.testing.assert_allclose(reg.sig, reg0.sig, RTOL)
+        np.testing.assert_allclose(reg.bigYP, reg0.bigYP, RTOL)
+        for r in range(reg.n_eq):
+            np.testing.assert_allclose(reg.bSUR[r], reg0.bSUR[r], RTOL)
+
+
+class Test_SUR_spdiag(unittest.TestCase):
+    def setUp(self):
+        db = libpysal.io.open(libpysal.examples.get_path("columbus.dbf"), "r")
+        self.bigy, self.bigX, _, _ = sur_dictxy(
+            db, ["HOVAL", "CRIME"], [["INC"], ["INC", "DISCBD"]]
+        )
+        self.w = libpysal.weights.Rook.from_shapefile(
+            libpysal.examples.get_path("columbus.shp")
+        )
+        self.w.transform = "r"
+
+    def test_wtraces(self):
+        W = self.w.full()[0]
+        np.testing.assert_allclose(
+            sptrace_wtw_ww(self.w, separate=True),
+            (np.trace(W @ W), np.trace(W.T @ W)),
+            RTOL,
+        )
+
+    def test_LMtests(self):
+        reg = SUR(self.bigy, self.bigX, w=self.w, spat_diag=True)
+        np.testing.assert_allclose(
+            reg.lmEtest, (4.322126534400284, 2, 0.11520256478607803), RTOL
+        )
+        np.testing.assert_allclose(
+            reg.lmlagtest, (3.7321506566840665, 2, 0.1547297351239003), RTOL
+        )
+        WS = self.w.sparse
+        np.testing.assert_allclose(
+            surLMe(reg.n_eq, WS, reg.bigE, reg.sig), reg.lmEtest, RTOL
+        )
+        np.testing.assert_allclose(
+            surLMlag(
+                reg.n_eq, WS, reg.bigy, reg.bigX, reg.bigE, reg.bigYP, reg.sig, reg.varb
+            ),
+            reg.lmlagtest,
+            RTOL,
+        )
+
+    def test_LMtests_iter(self):
+        reg = SUR(
+            self.bigy, self.bigX, w=self.w, spat_diag=True, nonspat_diag=False, iter=True
+        )
+        np.testing.assert_allclose(
+            reg.lmEtest, (4.472254919421188, 2, 0.10687156851415175), RTOL
+        )
+        np.testing.assert_allclose(
+            reg.lmlagtest, (3.880311093227027, 2, 0.14368159885331686), RTOL
+        )
+
 if __name__ == "__main__":
     unittest.main()
     """
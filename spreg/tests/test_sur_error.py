@@ -3,7 +3,7 @@ import numpy as np
 import libpysal
 import geopandas as gpd
 from spreg.sur_utils import sur_dictxy
-from spreg.sur_error import SURerrorML, SURerrorGM
+from spreg.sur_error import SURerrorML, SURerrorGM, BaseSURerrorML
 from libpysal.common import RTOL
 
 ATOL = 0.0001
@@ -151,6 +151,18 @@ class Test_SUR_error(unittest.TestCase):
             atol=ATOL,
         )
 
+    def test_error_methods(self):  # log Jacobian from eigenvalues and grid
+        y_var0 = ["HR80", "HR90"]
+        x_var0 = [["PS80", "UE80"], ["PS90", "UE90"]]
+        reg = SURerrorML(y_var0, x_var0, self.w, df=self.dbs)
+        for method in ["ord", "grid"]:
+            reg1 = SURerrorML(y_var0, x_var0, self.w, df=self.dbs, method=method)
+            dict_compare(reg1.bSUR, reg.bSUR, RTOL, atol=ATOL)
+            np.testing.assert_allclose(reg1.lamsur, reg.lamsur, RTOL, atol=ATOL)
+            np.testing.assert_allclose(
+                reg1.cliksurerr, reg.cliksurerr, RTOL, atol=ATOL
+            )
+
     def test_error_3eq(self):  # Three equation example, unequal K
         bigy1b, bigX1b, bigyvars1, bigXvars1 = sur_dictxy(self.dbs, ["HR60", "HR70", "HR80"], [["RD60", "PS60"], ["RD70", "PS70", "UE70"], ["RD80", "PS80"]])
         reg = SURerrorML(
@@ -241,6 +253,53 @@ class Test_SUR_error(unittest.TestCase):
         )
 
 
+class Test_SUR_error_lattice(unittest.TestCase):
+    def setUp(self):
+        # row-standardized lattice, with eigenvalues of W just beyond -1 and 1
+        self.w = libpysal.weights.lat2W(14, 14)
+        self.w.transform = "r"
+        n = self.w.n
+        W = self.w.full()[0]
+        rng = np.random.default_rng(7)
+        self.bigy, self.bigX = {}, {}
+        for r, lam in enumerate([0.2, -0.1, 0.4]):
+            x = np.hstack((np.ones((n, 1)), rng.normal(size=(n, 2))))
+            u = np.linalg.solve(np.eye(n) - lam * W, rng.normal(size=(n, 1)))
+            self.bigX[r] = x
+            self.bigy[r] = x @ np.array([[1.0], [1.0], [-1.0]]) + u
+
+    def test_error_methods(self):
+        reg = BaseSURerrorML(self.bigy, self.bigX, self.w, method="LU")
+        for method in ["ORD", "GRID"]:
+            reg1 = BaseSURerrorML(self.bigy, self.bigX, self.w, method=method)
+            self.assertTrue(np.isfinite(reg1.cliksurerr))
+            np.testing.assert_allclose(reg1.lamsur, reg.lamsur, atol=ATOL)
+            np.testing.assert_allclose(reg1.cliksurerr, reg.cliksurerr, RTOL)
+
+    def test_vm_ntrace(self):
+        reg = SURerrorML(self.bigy, self.bigX, self.w, vm=True)
+        reg1 = SURerrorML(self.bigy, self.bigX, self.w, vm=True, ntrace=500)
+        np.testing.assert_allclose(reg1.vm, reg.vm, rtol=0.05, atol=1e-4)
+
+    def test_error_methods_binary(self):
+        # binary weights, with eigenvalues of W in (-4, 4)
+        w = libpysal.weights.lat2W(12, 12)
+        n = w.n
+        W = w.full()[0]
+        rng = np.random.default_rng(7)
+        bigy, bigX = {}, {}
+        for r, lam in enumerate([0.1, -0.05]):
+            x = np.hstack((np.ones((n, 1)), rng.normal(size=(n, 2))))
+            u = np.linalg.solve(np.eye(n) - lam * W, rng.normal(size=(n, 1)))
+            bigX[r] = x
+            bigy[r] = x @ np.array([[1.0], [1.0], [-1.0]]) + u
+        reg = BaseSURerrorML(bigy, bigX, w, method="LU")
+        reg1 = BaseSURerrorML(bigy, bigX, w, method="ORD")
+        self.assertEqual(w.transform, "O")
+        np.testing.assert_allclose(reg1.lamsur, reg.lamsur, atol=ATOL)
+        np.testing.assert_allclose(reg1.cliksurerr, reg.cliksurerr, RTOL)
+
+
 class Test_SUR_error_gm(unittest.TestCase):
     def setUp(self):
         nat = libpysal.examples.load_example('NCOVR')
@@ -427,6 +427,45 @@ class TestGMLag(unittest.TestCase):
         cfh_test = np.array([0.10818 , 0.947347])
         np.testing.assert_allclose(reg.cfh_test, cfh_test,RTOL)
 
+    def test_impacts_draws(self):
+        y = np.array(self.db.by_col("CRIME")).reshape(-1, 1)
+        X = np.array([self.db.by_col("INC"), self.db.by_col("HOVAL")]).T
+        reg = GM_Lag(y, X, w=self.w, slx_lags=1, spat_impacts=["full", "mc"])
+        # draws of rho outside (1/lambda_min, 1/lambda_max) are discarded
+        rng = np.random.default_rng(12345)
+        draws = rng.multivariate_normal(reg.betas.flatten(), reg.vm, size=1000)
+        evals = np.linalg.eigvals(self.w.full()[0]).real
+        rho = draws[:, -1]
+        nfull = ((rho > 1 / evals.min()) & (rho < 1 / evals.max())).sum()
+        full, mc = reg.sp_impacts["full"], reg.sp_impacts["mc"]
+        self.assertEqual(full.attrs["ndraws"], nfull)
+        self.assertTrue(mc.attrs["ndraws"] <= ((rho > -1) & (rho < 1)).sum())
+        self.assertIn("simulated from %d of 1000 draws" % nfull, reg.summary)
+        self.assertTrue((full["direct_q025"] < full["direct"]).all())
+        self.assertTrue((full["direct_q975"] > full["direct"]).all())
+
+    def test_impacts_draws_power(self):
+        y = np.array(self.db.by_col("CRIME")).reshape(-1, 1)
+        X = np.array([self.db.by_col("INC"), self.db.by_col("HOVAL")]).T
+        w = self.w
+        reg = GM_Lag(y, X, w=w, spat_impacts="power")
+        # the draws use the traces of the point estimate, not the eigenvalues
+        self.assertIn("spreg_trWpow_power", w._cache)
+        self.assertFalse(any(key.startswith("spreg_evals") for key in w._cache))
+        rng = np.random.default_rng(12345)
+        draws = rng.multivariate_normal(reg.betas.flatten(), reg.vm, size=1000)
+        rho = draws[:, -1]
+        power = reg.sp_impacts["power"]
+        self.assertEqual(power.attrs["ndraws"], ((rho > -1) & (rho < 1)).sum())
+        trw = w._cache["spreg_trWpow_power"]
+        W = w.full()[0]
+        for p in range(2, 6):
+            np.testing.assert_allclose(
+                trw[p], np.trace(np.linalg.matrix_power(W, p)) / w.n
+            )
+        self.assertTrue((power["direct_q025"] < power["direct"]).all())
+        self.assertTrue((power["direct_q975"] > power["direct"]).all())
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+import warnings
+import libpysal
+import numpy as np
+from spreg.utils import make_wk, make_wnslx, inverse_prod
+from spreg import OLS
+from libpysal.common import RTOL
+
+
+class Test_Kernel_Weights(unittest.TestCase):
+    def setUp(self):
+        db = libpysal.io.open(libpysal.examples.get_path("columbus.dbf"), "r")
+        self.y = np.array(db.by_col("HOVAL")).reshape(-1, 1)
+        self.X = np.array([db.by_col("INC"), db.by_col("CRIME")]).T
+        self.coords = np.array([db.by_col("X"), db.by_col("Y")]).T
+
+    def test_make_wk(self):
+        for fixed in [True, False]:
+            for function in ["triangular", "quartic", "gaussian"]:
+                wk = libpysal.weights.Kernel(
+                    self.coords, k=5, function=function, fixed=fixed, diagonal=True
+                )
+                wk2 = make_wk(
+                    self.coords, k=5, function=function, fixed=fixed, chunk=10, workers=2
+                )
+                np.testing.assert_allclose(wk2.toarray(), wk.full()[0], RTOL)
+        wk = make_wk(self.coords, k=5, function="bisquare", bandwidth=2.0)
+        wk2 = libpysal.weights.Kernel(
+            self.coords, k=5, function="quartic", bandwidth=2.0, diagonal=True
+        )
+        np.testing.assert_allclose(wk.toarray(), wk2.full()[0], RTOL)
+
+    def test_make_wnslx(self):
+        for params in [(6, np.inf, "exponential"), (6, 1.5, "power")]:
+            wd = make_wnslx(self.coords, params, chunk=10, workers=2)
+            wd2 = make_wnslx(self.coords, params, chunk=100, workers=1)
+            np.testing.assert_array_equal(wd.toarray(), wd2.toarray())
+        self.assertTrue(wd.has_sorted_indices)
+        self.assertTrue((wd.getnnz(axis=1) <= 6).all())
+
+    def test_ols_hac(self):
+        wk = libpysal.weights.Kernel(
+            self.coords, k=5, function="triangular", fixed=False, diagonal=True
+        )
+        reg = OLS(self.y, self.X, robust="hac", gwk=wk)
+        wk2 = make_wk(self.coords, k=5, function="triangular", fixed=False)
+        reg2 = OLS(self.y, self.X, robust="hac", gwk=wk2)
+        np.testing.assert_allclose(reg2.vm, reg.vm, RTOL)
+
+
+class Test_Inverse_Prod(unittest.TestCase):
+    def setUp(self):
+        self.w = libpysal.weights.lat2W(6, 6)
+        self.w.transform = "r"
+        rng = np.random.default_rng(10)
+        self.data = rng.normal(size=(self.w.n, 3))
+
+    def test_lu(self):
+        for data in [self.data[:, :1], self.data]:
+            for post in [False, True]:
+                exp = inverse_prod(
+                    self.w, data, 0.6, post_multiply=post, inv_method="true_inv"
+                )
+                lu = inverse_prod(self.w, data, 0.6, post_multiply=post, inv_method="lu")
+                self.assertEqual(lu.shape, exp.shape)
+                np.testing.assert_allclose(lu, exp, RTOL)
+
+    def test_lu_cache(self):
+        inverse_prod(self.w, self.data, 0.6, inv_method="lu")
+        LU = self.w._cache["spreg_inverse_lu"][0.6]
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", DeprecationWarning)
+            inverse_prod(self.w, self.data, np.array([[0.6]]), inv_method="lu")
+        self.assertIs(self.w._cache["spreg_inverse_lu"][0.6], LU)
+        # alternating rho and lambda keeps both factorizations
+        inverse_prod(self.w, self.data, 0.3, inv_method="lu")
+        inverse_prod(self.w, self.data, 0.6, inv_method="lu")
+        self.assertIs(self.w._cache["spreg_inverse_lu"][0.6], LU)
+        inverse_prod(self.w, self.data, 0.1, inv_method="lu")
+        self.assertEqual(list(self.w._cache["spreg_inverse_lu"]), [0.6, 0.1])
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -254,8 +254,14 @@ class GM_Lag(BaseGM_Lag):
     spat_impacts : string or list
                    Include average direct impact (ADI), average indirect impact (AII),
                     and average total impact (ATI) in summary results.
-                    Options are 'simple', 'full', 'power', 'all' or None.
+                    Options are 'simple', 'full', 'power', 'mc', 'all' or None.
                     See sputils.spmultiplier for more information.
+    impacts_nprobe: int
+                    Number of random probe vectors for the traces of the
+                    'mc' impacts (see sputils.sptrace_wpow)
+    impacts_order: int
+                    Highest power of W in the 'mc' impacts; by default it
+                    grows with rho (see sputils.spmultiplier)
     vm           : boolean
                    If True, include variance-covariance matrix in summary
                    results
@@ -382,6 +388,10 @@ class GM_Lag(BaseGM_Lag):
                    n(zthhthi)'varb
     sp_multipliers: dict
                    Dictionary of spatial multipliers (if spat_impacts is not None)
+    sp_impacts   : dict
+                   Dictionary with a DataFrame of direct, indirect and total
+                   impacts for each method, with their simulated standard
+                   errors and 95% intervals (if spat_impacts is not None)
 
     Examples
     --------
@@ -524,6 +534,8 @@ class GM_Lag(BaseGM_Lag):
             sig2n_k=False,
             spat_diag=True,
             spat_impacts="simple",
+            impacts_nprobe=50,
+            impacts_order=None,
             vm=False,
             name_y=None,
             name_x=None,
@@ -554,6 +566,8 @@ class GM_Lag(BaseGM_Lag):
                 sig2n_k=sig2n_k,
                 spat_diag=spat_diag,
                 spat_impacts=spat_impacts,
+                impacts_nprobe=impacts_nprobe,
+                impacts_order=impacts_order,
                 vm=vm,
                 name_y=name_y,
                 name_x=name_x,
@@ -667,7 +681,8 @@ class GM_Lag(BaseGM_Lag):
             if spat_diag:
                 diag_out = _spat_diag_out(self, w, 'yend')
             if spat_impacts:
-                self.sp_multipliers, impacts_str = _summary_impacts(self, w, spat_impacts, slx_lags,slx_vars)
+                self.sp_multipliers, impacts_str = _summary_impacts(self, w, spat_impacts, slx_lags,slx_vars,
+                                                                      nprobe=impacts_nprobe, order=impacts_order)
                 try:
                     diag_out += impacts_str
                 except TypeError:
@@ -90,8 +90,14 @@ class GM_Lag_Regimes(TSLS_Regimes, REGI.Regimes_Frame):
     spat_impacts : string or list
                    Include average direct impact (ADI), average indirect impact (AII),
                     and average total impact (ATI) in summary results.
-                    Options are 'simple', 'full', 'power', 'all' or None.
+                    Options are 'simple', 'full', 'power', 'mc', 'all' or None.
                     See sputils.spmultiplier for more information.
+    impacts_nprobe: int
+                    Number of random probe vectors for the traces of the
+                    'mc' impacts (see sputils.sptrace_wpow)
+    impacts_order: int
+                    Highest power of W in the 'mc' impacts; by default it
+                    grows with rho (see sputils.spmultiplier)
     spat_diag    : boolean
                    If True, then compute Anselin-Kelejian test and Common Factor Hypothesis test (if applicable)
     vm           : boolean
@@ -268,6 +274,12 @@ class GM_Lag_Regimes(TSLS_Regimes, REGI.Regimes_Frame):
                    Dictionary of spatial multipliers (if spat_impacts is not None)
                    Only available in dictionary 'multi' when multiple regressions
                    (see 'multi' below for details)
+    sp_impacts   : dict
+                   Dictionary with a DataFrame of direct, indirect and total
+                   impacts for each method, with their simulated standard
+                   errors and 95% intervals (if spat_impacts is not None)
+                   Only available in dictionary 'multi' when multiple regressions
+                   (see 'multi' below for details)
     regimes      : list
                    List of n values with the mapping of each
                    observation to a regime. Assumed to be aligned with 'x'.
@@ -461,6 +473,8 @@ class GM_Lag_Regimes(TSLS_Regimes, REGI.Regimes_Frame):
         sig2n_k=False,
         spat_diag=True,
         spat_impacts="simple",
+        impacts_nprobe=50,
+        impacts_order=None,
         constant_regi="many",
         cols2regi="all",
         regime_lag_sep=False,
@@ -578,6 +592,8 @@ class GM_Lag_Regimes(TSLS_Regimes, REGI.Regimes_Frame):
                 sig2n_k=sig2n_k,
                 cols2regi=cols2regi,
                 spat_impacts=spat_impacts,
+                impacts_nprobe=impacts_nprobe,
+                impacts_order=impacts_order,
                 spat_diag=spat_diag,
                 vm=vm,
                 name_y=name_y,
@@ -646,7 +662,8 @@ class GM_Lag_Regimes(TSLS_Regimes, REGI.Regimes_Frame):
             if spat_diag:
                 diag_out = _spat_diag_out(self, w, 'yend')
             if spat_impacts:
-                self.sp_multipliers, impacts_str = _summary_impacts(self, w, spat_impacts, slx_lags, regimes=True)
+                self.sp_multipliers, impacts_str = _summary_impacts(self, w, spat_impacts, slx_lags, regimes=True,
+                                                                      nprobe=impacts_nprobe, order=impacts_order)
                 try:
                     diag_out += impacts_str
                 except TypeError:
@@ -671,6 +688,8 @@ class GM_Lag_Regimes(TSLS_Regimes, REGI.Regimes_Frame):
         sig2n_k=False,
         cols2regi="all",
         spat_impacts=False,
+        impacts_nprobe=50,
+        impacts_order=None,
         spat_diag=False,
         vm=False,
         name_y=None,
@@ -850,7 +869,8 @@ class GM_Lag_Regimes(TSLS_Regimes, REGI.Regimes_Frame):
             if spat_diag:
                 results[r].other_mid += _spat_diag_out(results[r], results[r].w, 'yend')
             if spat_impacts:
-                results[r].sp_multipliers, impacts_str = _summary_impacts(results[r], results[r].w, spat_impacts, slx_lags)
+                results[r].sp_multipliers, impacts_str = _summary_impacts(results[r], results[r].w, spat_impacts, slx_lags,
+                                                                            nprobe=impacts_nprobe, order=impacts_order)
                 results[r].other_mid += impacts_str
             counter += 1
         self.multi = results
@@ -646,9 +646,15 @@ def check_robust(robust, wk):
     """
     if robust:
         if robust.lower() == "hac":
-            if not isinstance(wk, weights.Kernel):
-                raise Exception("HAC requires that wk be a Kernel Weights object")
-            diag = wk.sparse.diagonal()
+            from .robust import KernelOperator
+
+            if isinstance(wk, (weights.Kernel, KernelOperator)):
+                wk = wk.sparse
+            elif not issparse(wk):
+                raise Exception(
+                    "HAC requires that wk be a Kernel Weights object, a sparse array or a KernelOperator"
+                )
+            diag = wk.diagonal()
             # check to make sure all entries equal 1
             if diag.min() < 1.0:
                 print(diag.min())
@@ -661,16 +667,12 @@ def check_robust(robust, wk):
                     "All entries on diagonal of kernel weights matrix must equal 1."
                 )
             # ensure off-diagonal entries are in the set of real numbers [0,1)
-            wegt = wk.weights
-            for i in wk.id_order:
-                vals = wegt[i]
-                vmin = min(vals)
-                vmax = max(vals)
-                if vmin < 0.0:
+            if wk.nnz > 0:
+                if wk.data.min() < 0.0:
                     raise Exception(
                         "Off-diagonal entries must be greater than or equal to 0."
                     )
-                if vmax > 1.0:
+                if wk.data.max() > 1.0:
                     # NOTE: we are not checking for the case of exactly 1.0 ###
                     raise Exception("Off-diagonal entries must be less than 1.")
         elif robust.lower() == "white" or robust.lower() == "ogmm":
@@ -10,12 +10,17 @@ __author__ = "Luc Anselin lanselin@gmail.com, \
 
 import numpy as np
 from scipy import sparse as SP
+from scipy.sparse import linalg as SPla
 import scipy.optimize as op
 import numpy.linalg as la
 from libpysal.weights.spatial_lag import lag_spatial
 from libpysal.cg import KDTree        # new for make_wnslx
-from scipy.sparse import coo_array,csr_array    # new for make_wnslx
+from scipy.sparse import csr_array    # new for make_wnslx
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import os
 from .sputils import *
+from .panel_utils import panel_lag
 import copy
 
 
@@ -466,11 +471,12 @@ def get_spFilter(w, lamb, sf):
         ws = w.sparse
     except:
         ws = w
-    T = sf.shape[0] // ws.shape[0]
+    N = ws.shape[0]
+    T = sf.shape[0] // N
     if T == 1:
         result = sf - lamb * (ws * sf)
     else:
-        result = sf - lamb * SP.kron(SP.identity(T), ws).dot(sf)
+        result = sf - lamb * panel_lag(ws, sf, N, T)
     return result
 
 
@@ -556,7 +562,8 @@ def inverse_prod(
                       nxn Pysal spatial weights object
 
     data            : Numpy array
-                      nx1 vector of data
+                      nx1 vector of data, or nxr array with r vectors that
+                      are all transformed at once
 
     scalar          : float
                       Scalar value (typically rho or lambda)
@@ -567,7 +574,10 @@ def inverse_prod(
                       pre-multiplies.
     inv_method      : string
                       If "true_inv" uses the true inverse of W (slow);
-                      If "power_exp" uses the power expansion method (default)
+                      If "power_exp" uses the power expansion method (default);
+                      If "lu" solves with a sparse LU factorization of
+                      (I - scalar W), which is cached with w and reused for
+                      every later call with the same scalar
 
     threshold       : float
                       Test value to stop the iterations. Test is against
@@ -602,6 +612,9 @@ def inverse_prod(
     >>> inv_reg = inverse_prod(w, data, rho, inv_method="true_inv", post_multiply=True)
     >>> np.allclose(inv_pow, inv_reg, atol=0.0001)
     True
+    >>> inv_lu = inverse_prod(w, data, rho, inv_method="lu", post_multiply=True)
+    >>> inv_lu.shape == inv_reg.shape and np.allclose(inv_lu, inv_reg)
+    True
 
     """
     if inv_method == "power_exp":
@@ -613,6 +626,13 @@ def inverse_prod(
             threshold=threshold,
             max_iterations=max_iterations,
         )
+    elif inv_method == "lu":
+        LU = _inverse_lu(w, scalar)
+        if post_multiply:
+            # data' (I - scalar W)^-1 = ((I - scalar W)'^-1 data)'
+            inv_prod = LU.solve(np.asarray(data, dtype=float), trans="T").T
+        else:
+            inv_prod = LU.solve(np.asarray(data, dtype=float))
     elif inv_method == "true_inv":
         try:
             matrix = la.inv(np.eye(w.n) - (scalar * w.full()[0]))
@@ -629,6 +649,35 @@ def inverse_prod(
     return inv_prod
 
 
+def _inverse_lu(w, scalar):
+    """
+    Sparse LU factorization of (I - scalar W). When w is a PySAL W object the
+    factorizations of the two latest scalars are stored in its cache, so
+    repeated simulations with the same weights and parameters (e.g., rho and
+    lambda of a model with both) factorize only once.
+    """
+    scalar = float(np.asarray(scalar).item())
+    cache = getattr(w, "_cache", None)
+    lus = {}
+    if cache is not None:
+        lus = cache.setdefault("spreg_inverse_lu", {})
+        if scalar in lus:
+            # most recently used last
+            lus[scalar] = lus.pop(scalar)
+            return lus[scalar]
+    try:
+        ws = w.sparse
+    except AttributeError:
+        ws = w
+    n = ws.shape[0]
+    a = SP.csc_matrix(SP.identity(n) - scalar * ws)
+    LU = SPla.splu(a)
+    if len(lus) >= 2:
+        del lus[next(iter(lus))]
+    lus[scalar] = LU
+    return LU
+
+
 def power_expansion(
     w, data, scalar, post_multiply=False, threshold=0.0000000001, max_iterations=None
 ):
@@ -861,7 +910,7 @@ def optim_k(trace, window_size=None):
     return i+window_size
 
 
-def make_wnslx(coords,params,leafsize=30,distance_metric='Euclidean'):
+def make_wnslx(coords,params,leafsize=30,distance_metric='Euclidean',chunk=None,workers=None):
     '''
     
     Computes transformed distances as triangular kernel weights for transform = 'power', or fraction of maximum distance 
@@ -892,6 +941,8 @@ def make_wnslx(coords,params,leafsize=30,distance_metric='Euclidean'):
     distance_metric      : type of distance, default is "Euclidean", other option is "Arc" for arc-distance, to be used with long,lat
                            (note: long should be x and lat is y), both are supported by libpysal.cg.KDTree, but not
                            by its scipy and sklearn counterparts
+    chunk                : number of points in each KDTree query, default None sets it from k
+    workers              : number of threads running the queries, default None uses all processors
 
 
     Returns
@@ -902,48 +953,224 @@ def make_wnslx(coords,params,leafsize=30,distance_metric='Euclidean'):
     k = params[0]
     distance_upper_bound = params[1]
     transform = params[2]
+    if transform.lower() not in ('power','exponential'):
+        raise Exception("Method not supported")
     kdt = KDTree(coords,leafsize=leafsize,distance_metric=distance_metric)
-    dis,nbrs = kdt.query(coords,k=k+1,distance_upper_bound=distance_upper_bound) 
-    # get rid of diagonals
-    dis = dis[:,1:]
-    nbrs = nbrs[:,1:]
-    n = dis.shape[0]
-
-    # maximum distance in each row
-    if (np.isinf(distance_upper_bound)): # no fixed bandwidth
-        mxrow = dis[:,-1].reshape(-1,1)
-    else:
-        dis = np.nan_to_num(dis,copy=True,posinf=0)   # turn inf to zero
-        mxrow = np.amax(dis,axis=1).reshape(-1,1)
-
-    # rescaled distance
-    fdis = dis / mxrow
+    coords = np.asarray(coords)
+
+    def rows(start,stop):
+        dis,nbrs = kdt.query(coords[start:stop],k=k+1,distance_upper_bound=distance_upper_bound)
+        # get rid of diagonals
+        dis = dis[:,1:]
+        nbrs = nbrs[:,1:]
+        # maximum distance in each row
+        if (np.isinf(distance_upper_bound)): # no fixed bandwidth
+            mxrow = dis[:,-1].reshape(-1,1)
+        else:
+            dis = np.nan_to_num(dis,copy=True,posinf=0)   # turn inf to zero
+            mxrow = np.amax(dis,axis=1).reshape(-1,1)
+        # rescaled distance
+        fdis = dis / mxrow
+        if transform.lower() == 'power':   # triangular kernel weights
+            fdis = -fdis + 1.0
+        return fdis,nbrs   # neighbors outside bandwidth have ID n
 
-    if transform.lower() == 'power':   # triangular kernel weights
-        fdis = -fdis + 1.0
-    elif transform.lower() == 'exponential':   # distance fraction
-        fdis = fdis
-    else:
-        raise Exception("Method not supported")
+    spdis = _chunked_csr(coords.shape[0],k,rows,chunk=chunk,workers=workers)
 
-    # turn into COO sparse format and then into CSR
-    kk = fdis.shape[1]
-    rowids = np.repeat(np.arange(n),kk)
-    if (np.isinf(distance_upper_bound)):
-        colids = nbrs.flatten()
-        fdis = fdis.flatten()
-    else: # neighbors outside bandwidth have ID n
-        pickgd = (nbrs != n)
-        rowids = rowids[pickgd.flatten()]
-        colids = nbrs[pickgd].flatten()
-        fdis = fdis[pickgd].flatten()
-    
-    spdis = coo_array((fdis,(rowids,colids)))
-    spdis = spdis.tocsr(copy=True)
-    
     return spdis
 
 
+def make_wk(coords,k=2,function='triangular',fixed=True,bandwidth=None,eps=1.0000001,
+            diagonal=True,leafsize=30,distance_metric='Euclidean',chunk=None,workers=None):
+    '''
+    Computes kernel weights for HAC standard errors as a CSR sparse array. The weights are
+    the same as those of libpysal.weights.Kernel, but the k-nearest neighbor queries are run
+    on chunks of points in a pool of threads (the KDTree query releases the GIL) and each chunk
+    is written directly into the buffers of the CSR array, so that no neighbor lists, COO triplets
+    or dense n by k arrays for all points are created. This makes kernel weights for millions
+    of points feasible.
+
+    With fixed=False (adaptive bandwidth), the bandwidth of each point is the distance to its
+    k-th nearest neighbor, and the point and its k nearest neighbors are kept. With fixed=True,
+    the bandwidth is the largest of these distances over all points. When a bandwidth is passed,
+    it is used instead, and all points within the bandwidth are neighbors.
+
+    Parameters
+    ----------
+    coords               : n by 2 numpy array of x,y coordinates
+    k                    : number of nearest neighbors used to set the bandwidth, not including
+                           the point itself, as in libpysal.weights.Kernel
+    function             : kernel function, one of 'triangular', 'uniform', 'quadratic',
+                           'quartic' (or 'bisquare') and 'gaussian'
+    fixed                : True for a fixed bandwidth, False for an adaptive bandwidth
+    bandwidth            : bandwidth as a scalar or as an array with a value for each point,
+                           default is None to derive it from k
+    eps                  : adjustment to the bandwidth so that the k-th nearest neighbor
+                           has a non-zero weight
+    diagonal             : if True (default, as required by HAC), the diagonal weights are
+                           set to 1.0, otherwise they follow from the kernel function
+    leafsize             : argument to construct KDTree, default is 30
+    distance_metric      : type of distance, default is "Euclidean", other option is "Arc" for
+                           arc-distance, to be used with long,lat
+    chunk                : number of points in each query, default None sets it from k
+    workers              : number of threads, default None uses all processors
+
+    Returns
+    -------
+    wk                   : kernel weights as n by n CSR sparse array, which can be passed as
+                           gwk to the regression classes
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from spreg import make_wk
+    >>> coords = np.array([[0.0, 0.0], [1.0, 0.0], [0.0, 2.0], [3.0, 3.0]])
+    >>> wk = make_wk(coords, k=1, function='triangular')
+    >>> np.round(wk.toarray(), 4)
+    array([[1.    , 0.6838, 0.3675, 0.    ],
+           [0.6838, 1.    , 0.2929, 0.    ],
+           [0.3675, 0.2929, 1.    , 0.    ],
+           [0.    , 0.    , 0.    , 1.    ]])
+
+    '''
+    function = function.lower()
+    if function == 'bisquare':
+        function = 'quartic'
+    if function not in ('triangular','uniform','quadratic','quartic','gaussian'):
+        raise Exception("Unsupported kernel function")
+    kdt = KDTree(coords,leafsize=leafsize,distance_metric=distance_metric)
+    coords = np.asarray(coords)
+    n = coords.shape[0]
+
+    def kernel(z):
+        # functions follow Anselin and Rey (2010) table 5.4
+        if function == 'triangular':
+            return 1.0 - z
+        elif function == 'uniform':
+            return np.full(z.shape,0.5)
+        elif function == 'quadratic':
+            return 0.75 * (1.0 - z**2)
+        elif function == 'quartic':
+            return (15.0 / 16.0) * (1.0 - z**2) ** 2
+        return (2.0 * np.pi) ** (-0.5) * np.exp(-(z**2) / 2.0)
+
+    def finish(start,stop,z,nbrs):
+        kz = kernel(z)
+        if diagonal:
+            kz[nbrs == np.arange(start,stop).reshape(-1,1)] = 1.0
+        return kz,nbrs
+
+    kq = min(k + 1,n)   # the point itself is its first neighbor
+
+    if bandwidth is None and not fixed:
+        def rows(start,stop):
+            dis,nbrs = kdt.query(coords[start:stop],k=kq)
+            bw = dis.max(axis=1).reshape(-1,1) * eps
+            return finish(start,stop,dis / bw,nbrs)
+        return _chunked_csr(n,kq,rows,chunk=chunk,workers=workers)
+
+    if bandwidth is None:
+        bws = _run_chunks(n,_chunk_size(n,kq,chunk),workers,
+                          lambda start,stop: kdt.query(coords[start:stop],k=kq)[0].max())
+        bandwidth = max(bws) * eps
+    bandwidth = np.broadcast_to(np.asarray(bandwidth,dtype=float).reshape(-1,1),(n,1))
+
+    def rows(start,stop):
+        bw = bandwidth[start:stop]
+        # make the upper bound of the query inclusive, as in query_ball_point
+        upper = np.nextafter(bw.max(),np.inf)
+        if distance_metric.lower() == 'euclidean':
+            # size the query by the largest number of points within the bandwidth
+            kc = int(kdt.query_ball_point(coords[start:stop],bw.ravel() * (1 + 1e-12),
+                                          return_length=True).max())
+        else:
+            kc = kq
+        kc = min(max(kc,1),n)
+        while True:
+            dis,nbrs = kdt.query(coords[start:stop],k=kc,distance_upper_bound=upper)
+            dis,nbrs = dis.reshape(stop-start,-1),nbrs.reshape(stop-start,-1)
+            # more neighbors may be within the bandwidth when the last one is
+            if kc == n or not np.isfinite(dis[:,-1]).any():
+                break
+            kc = min(2 * kc,n)
+        nbrs = np.where(dis <= bw,nbrs,n)
+        return finish(start,stop,np.where(nbrs < n,dis,0.0) / bw,nbrs)
+
+    return _chunked_csr(n,kq,rows,chunk=chunk,workers=workers)
+
+
+def _chunk_size(n,k,chunk):
+    if chunk is None:
+        chunk = max(1000,2**20 // max(k,1))
+    return max(1,min(n,chunk))
+
+
+def _run_chunks(n,chunk,workers,fun):
+    """
+    Applies fun(start,stop) to consecutive chunks of rows, in a pool of threads when
+    there is more than one chunk, and yields the results in the order of the rows. At
+    most two chunks per thread are pending at any time, which bounds the memory used.
+    """
+    starts = range(0,n,chunk)
+    if workers == 1 or len(starts) == 1:
+        for start in starts:
+            yield fun(start,min(start + chunk,n))
+        return
+    workers = workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for start in starts:
+            pending.append(pool.submit(fun,start,min(start + chunk,n)))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _chunked_csr(n,k,rows,chunk=None,workers=None):
+    """
+    Builds a n by n CSR array from rows(start,stop), which returns the values and the
+    column ids of the neighbors of the rows in a chunk as two arrays with one row per
+    point; column id n marks entries that are not neighbors. The chunks are computed in
+    threads and copied into buffers preallocated for k neighbors per row, which are only
+    enlarged when a chunk has more neighbors.
+    """
+    chunk = _chunk_size(n,k,chunk)
+    cap = n * k
+    idx_dtype = np.int32 if max(n,cap) < np.iinfo(np.int32).max else np.int64
+    data = np.empty(cap)
+    indices = np.empty(cap,dtype=idx_dtype)
+    indptr = np.empty(n + 1,dtype=idx_dtype)
+    indptr[0] = 0
+    nnz = 0
+    start = 0
+    for vals,nbrs in _run_chunks(n,chunk,workers,rows):
+        stop = start + nbrs.shape[0]
+        # sort the neighbors of each row by column id, non-neighbors go last
+        order = np.argsort(nbrs,axis=1,kind='stable')
+        nbrs = np.take_along_axis(nbrs,order,axis=1)
+        vals = np.take_along_axis(vals,order,axis=1)
+        keep = nbrs < n
+        counts = keep.sum(axis=1)
+        m = counts.sum()
+        if nnz + m > cap:
+            cap = max(2 * cap,nnz + m)
+            if cap >= np.iinfo(idx_dtype).max:
+                idx_dtype = np.int64
+                indptr = indptr.astype(idx_dtype)
+            data = np.resize(data,cap)
+            indices = np.resize(indices,cap).astype(idx_dtype,copy=False)
+        data[nnz:nnz + m] = vals[keep]
+        indices[nnz:nnz + m] = nbrs[keep]
+        indptr[start + 1:stop + 1] = nnz + np.cumsum(counts)
+        nnz += m
+        start = stop
+    if nnz < data.shape[0]:
+        data = data[:nnz].copy()
+        indices = indices[:nnz].copy()
+    return csr_array((data,indices,indptr),shape=(n,n))
+
+
 def _test():
     import doctest
 